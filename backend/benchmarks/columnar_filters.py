@@ -0,0 +1,76 @@
+"""
+Filtros combinados del listado de eventos: predicado fila a fila frente a la réplica por columnas
+
+Uso (desde backend/): python -m benchmarks.columnar_filters [filas]
+"""
+
+import os
+import statistics
+import sys
+import time
+from typing import Any, Callable
+from unittest import mock
+from benchmarks.compact_records import CSV_FILE, build_events
+from db.ORMcsv import CSVModel
+from models.evento import Evento
+
+COLUMNS = {
+    "status": "category",
+    "visibility": "category",
+    "country": "category",
+    "date": "date",
+}
+QUERY = [
+    [
+        ("visibility", "eq", "public"),
+        ("status", "ne", "deleted"),
+        ("country", "eq", "Chile"),
+        ("date", "gte", "2026-03-01"),
+        ("date", "lte", "2026-05-31"),
+    ]
+]
+
+
+def predicate(event: Any) -> bool:
+    """La misma consulta escrita como predicado sobre cada registro"""
+    return (
+        event.get("visibility") == "public"
+        and event.get("status") != "deleted"
+        and event.get("country") == "Chile"
+        and "2026-03-01" <= (event.get("date") or "") <= "2026-05-31"
+    )
+
+
+def timed(run: Callable[[], Any], repeat: int = 5) -> float:
+    """Mediana en milisegundos de varias ejecuciones"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main(rows: int):
+    build_events(rows)
+    model = CSVModel(Evento, CSV_FILE, columnar=COLUMNS)
+    try:
+        expected = model.find_where(predicate)
+        assert model.find_matching(QUERY) == expected
+        # Solo la selección de IDs: la copia de los registros pesa igual en ambos caminos
+        ids = len(model._columnar.select(QUERY))
+        print(f"filas: {rows}, coincidencias: {ids}")
+        print(f"predicado por fila:        {timed(lambda: model.find_where(predicate)):8.1f} ms")
+        print(f"máscaras (selección):      {timed(lambda: model._columnar.select(QUERY)):8.1f} ms")
+        print(f"máscaras (registros):      {timed(lambda: model.find_matching(QUERY)):8.1f} ms")
+        with mock.patch("db.columnar.numpy", None):
+            python = timed(lambda: model._columnar.select(QUERY))
+        print(f"columnas sin NumPy:        {python:8.1f} ms")
+    finally:
+        for suffix in ["", ".lock", ".snapshot", ".offsets"]:
+            if os.path.exists(model.full_path + suffix):
+                os.remove(model.full_path + suffix)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
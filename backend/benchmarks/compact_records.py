@@ -0,0 +1,92 @@
+"""
+Memoria retenida por la caché de eventos: un dict por fila frente a filas compactas
+
+Uso (desde backend/): python -m benchmarks.compact_records [filas]
+"""
+
+import csv
+import gc
+import io
+import os
+import random
+import sys
+import tracemalloc
+from typing import Any, Callable, Tuple
+from db.ORMcsv import CSVModel
+from models.evento import Evento
+
+CSV_FILE = "bench_eventos.csv"
+# Los mismos campos compartidos que el modelo de eventos registrado (db/database.py)
+CATEGORICAL = ["time", "country", "city", "category_id", "subcategory_id"]
+
+
+def build_events(rows: int) -> CSVModel:
+    """Escribe un CSV de eventos con valores repetidos como los de la aplicación"""
+    rng = random.Random(42)
+    users = [f"user-{i}" for i in range(500)]
+    places = [("Chile", "Santiago"), ("Chile", "Valparaíso"), ("Perú", "Lima"), ("México", "CDMX")]
+    categories = [f"cat-{i}" for i in range(30)]
+    model = CSVModel(Evento, CSV_FILE)
+    events = []
+    for i in range(rows):
+        country, city = rng.choice(places)
+        events.append(
+            {
+                "user_id": rng.choice(users),
+                "title": f"Evento {i}",
+                "description": f"Descripción del evento número {i}",
+                "date": f"2026-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+                "time": f"{rng.randint(8, 23):02d}:00",
+                "country": country,
+                "city": city,
+                "category_id": rng.choice(categories),
+                "subcategory_id": rng.choice(categories),
+                "visibility": rng.choice(["public", "private", "only_me"]),
+                "status": rng.choice(["active", "archived"]),
+            }
+        )
+    model.create_many(events)
+    return model
+
+
+def retained(build: Callable[[], Any]) -> Tuple[Any, int]:
+    """Bytes que siguen reservados tras construir el resultado"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def dict_rows(model: CSVModel) -> list:
+    """Caché como antes: un dict por fila y sin compartir valores repetidos"""
+    with open(model.full_path, encoding="utf-8", newline="") as file:
+        reader = csv.reader(io.StringIO(file.read()))
+        decode = model._codec(next(reader)).decode
+        return [decode(values)[1] for values in reader if values]
+
+
+def main(rows: int):
+    model = build_events(rows)
+    try:
+        # Sin instantánea binaria: las dos variantes parsean el mismo CSV
+        CSVModel.SNAPSHOT_MIN_ROWS = rows + 1
+        plain, plain_bytes = retained(lambda: dict_rows(CSVModel(Evento, CSV_FILE)))
+        compact_model = CSVModel(Evento, CSV_FILE, categorical=CATEGORICAL)
+        compact, compact_bytes = retained(compact_model._load)
+        assert [dict(record) for record in compact] == plain
+        print(f"filas: {rows}")
+        print(f"dict por fila:      {plain_bytes / 2**20:8.1f} MiB")
+        print(f"filas compactas:    {compact_bytes / 2**20:8.1f} MiB")
+        print(f"reducción:          {plain_bytes / compact_bytes:8.1f}x")
+    finally:
+        for suffix in ["", ".lock", ".snapshot", ".offsets"]:
+            if os.path.exists(model.full_path + suffix):
+                os.remove(model.full_path + suffix)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
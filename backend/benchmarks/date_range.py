@@ -0,0 +1,39 @@
+"""
+Eventos de un día: recorrido con predicado frente al rango del índice ordenado (fecha, hora)
+
+Uso (desde backend/): python -m benchmarks.date_range [filas]
+"""
+
+import os
+import sys
+from benchmarks.columnar_filters import timed
+from benchmarks.compact_records import CSV_FILE, build_events
+from db.ORMcsv import CSVModel
+from models.evento import Evento
+
+DAY = "2026-03-15"
+
+
+def main(rows: int):
+    build_events(rows)
+    model = CSVModel(Evento, CSV_FILE, sorted_indexes={"date": ["date", "time"]})
+    try:
+        today = model.query().where(date=DAY).order_by("date", "time")
+        expected = sorted(
+            model.find_where(lambda event: event.get("date") == DAY),
+            key=lambda event: (event.get("time") or "", event.get("id")),
+        )
+        assert today.all() == expected
+        print(f"filas: {rows}, eventos del día: {len(expected)}, plan: {today.explain()['path']}")
+        scan = timed(lambda: model.find_where(lambda event: event.get("date") == DAY))
+        print(f"predicado por fila:        {scan:8.1f} ms")
+        print(f"rango del índice:          {timed(today.all):8.1f} ms")
+        print(f"rango (primera página):    {timed(today.limit(20).all):8.1f} ms")
+    finally:
+        for suffix in ["", ".lock", ".snapshot", ".offsets"]:
+            if os.path.exists(model.full_path + suffix):
+                os.remove(model.full_path + suffix)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100_000)
@@ -1,184 +1,1866 @@
 import csv
+import glob
+import io
+import mmap
 import os
-from typing import Any, Dict, List, Optional, Type, Union
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    IO,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
 from pydantic import BaseModel
-import json
 from libs.utils import generate_id
 
+try:
+    import fcntl
+except ImportError:  # Windows: sin cerrojos entre procesos
+    fcntl = None  # type: ignore
+from db.codecs import (
+    RowCodec,
+    compile_decoder,
+    compile_encoder,
+    decode_text,
+    interned,
+    serialize_value,
+)
+from db.indexes import (
+    HashIndex,
+    RangeBounds,
+    Selector,
+    SortedIndex,
+    UniqueConstraintError,
+    UniqueIndex,
+    ViewIndex,
+)
+from db.locks import ReadWriteLock
+from db.columnar import ColumnarIndex, Condition
+from db.offsets import OffsetIndex, RowView
+from db.query import Query, QueryPlan
+from db.records import CompactRecord, apply_changes, new_record, record_class, typed_record
+from db.search import FullTextIndex, TrigramIndex
+from db.snapshot import read_snapshot, snapshot_records, write_snapshot
+from db.sqlite_backend import SQLiteModel
+from db.transaction import (
+    STAGED_SUFFIX,
+    Transaction,
+    current_transaction,
+    open_transaction,
+    recover_transactions,
+)
+from db.journal import (
+    copy_mode,
+    DURABILITY_LEVELS,
+    GroupCommitter,
+    Journal,
+    fsync_directory,
+    fsync_path,
+)
+
+# Archivos auxiliares que el ORM mantiene junto a cada CSV
+SIDECAR_SUFFIXES = (".lock", ".journal", ".snapshot", ".offsets")
+
+
+def table_files(full_path: str) -> List[str]:
+    """
+    Archivos existentes de una tabla: el CSV, sus auxiliares y los temporales que dejó una
+    escritura interrumpida (.<archivo>.*.tmp o .txn)
+    """
+    directory, name = os.path.split(full_path)
+    paths = [full_path + suffix for suffix in ("", *SIDECAR_SUFFIXES)]
+    for pattern in (".tmp", STAGED_SUFFIX):
+        paths.extend(glob.glob(os.path.join(directory, f".{glob.escape(name)}.*{pattern}")))
+    return [path for path in paths if os.path.exists(path)]
+
 
 class CSVModel:
     """Clase base para modelos que se almacenan en CSV"""
 
-    def __init__(self, model_class: Type[BaseModel], csv_file: str):
+    # Contador de escrituras por archivo, compartido entre instancias del mismo proceso.
+    # Complementa la firma del archivo cuando dos escrituras caen en el mismo tick de mtime.
+    _generations: Dict[str, int] = {}
+    # Cerrojo lector/escritor por archivo, compartido entre instancias del mismo proceso
+    _table_locks: Dict[str, ReadWriteLock] = {}
+    # Estado por hilo del cerrojo de archivo, para que sea reentrante dentro de una escritura
+    _lock_states: Dict[str, threading.local] = {}
+
+    # Modos de almacenamiento: "table" reescribe el archivo en cada cambio y
+    # "log" agrega versiones y lápidas al final y compacta de vez en cuando
+    STORAGE_MODES = ("table", "log")
+    # Columna extra de los archivos en formato log con la operación de cada fila
+    LOG_OP_FIELD = "_op"
+    LOG_PUT = "put"
+    LOG_DELETE = "delete"
+    # Filas mínimas en el log antes de considerar una compactación automática
+    COMPACT_MIN_ROWS = 64
+    # Operaciones acumuladas en el diario antes de consolidarlo en el CSV
+    JOURNAL_CHECKPOINT_ENTRIES = 1000
+    # Filas parseadas del CSV en una carga a partir de las que se guarda una instantánea
+    SNAPSHOT_MIN_ROWS = 1000
+    # Cargas completas entre dos instantáneas cuando las reescrituras de la tabla invalidan
+    # la anterior: cada reescritura cambia el prefijo del CSV que cubría
+    SNAPSHOT_RELOADS = 8
+    # Claves que lee _sorted_walk del índice ordenado cada vez que toma el cerrojo
+    WALK_CHUNK = 256
+    # Agrupadores de fsync por archivo y archivos ya recuperados (diario y temporales) en
+    # este proceso
+    _committers: Dict[str, GroupCommitter] = {}
+    _recovered_tables: Set[str] = set()
+
+    def __init__(
+        self,
+        model_class: Type[BaseModel],
+        csv_file: str,
+        indexes: Optional[List[str]] = None,
+        unique: Optional[List[str]] = None,
+        storage: str = "table",
+        compact_ratio: float = 0.5,
+        durability: str = "flush",
+        journal: bool = False,
+        cache: bool = True,
+        sorted_indexes: Optional[Dict[str, List[str]]] = None,
+        views: Optional[Dict[str, Callable[[Dict[str, Any]], Optional[Hashable]]]] = None,
+        text_indexes: Optional[Dict[str, Dict[str, float]]] = None,
+        substring_indexes: Optional[List[List[str]]] = None,
+        typed: bool = False,
+        categorical: Optional[List[str]] = None,
+        columnar: Optional[Dict[str, str]] = None,
+    ):
+        if storage not in self.STORAGE_MODES:
+            raise ValueError(f"Modo de almacenamiento '{storage}' no soportado")
+        if durability not in DURABILITY_LEVELS:
+            raise ValueError(f"Nivel de durabilidad '{durability}' no soportado")
         self.model_class = model_class
         self.csv_file = csv_file
+        self.storage = storage
+        # Proporción de filas obsoletas del log que dispara la compactación en segundo plano
+        self.compact_ratio = compact_ratio
+        self.durability = durability
+        # Sin caché las lecturas recorren el archivo en streaming y las escrituras
+        # descartan la instantánea temporal que necesitan al terminar
+        self.cache = cache
+        # Con typed=True las lecturas devuelven instancias del modelo en lugar de dicts
+        self.typed = typed
         self.data_dir = "db/data"
         self.full_path = os.path.join(self.data_dir, csv_file)
+        # Diario de escritura anticipada opcional junto al CSV
+        self._journal = Journal(self.full_path + ".journal") if journal else None
+        sync_path = self._journal.path if self._journal else self.full_path
+        self._committer = CSVModel._committers.setdefault(sync_path, GroupCommitter(sync_path))
+        # Instantánea en memoria de la tabla ya deserializada, con cada fila en forma
+        # compacta (tupla de valores). Modificaciones y bajas publican una copia
+        # (copy-on-write), así los iteradores pueden recorrerla sin mantener el cerrojo
+        self._records: Optional[List[CompactRecord]] = None
+        self._signature: Optional[Tuple[int, int, int, int]] = None
+        # Índice de clave primaria: id -> posición en la instantánea (se construye bajo demanda)
+        self._id_index: Optional[Dict[str, int]] = None
+        # Índices secundarios declarados al registrar el modelo
+        self._indexes: Dict[str, HashIndex] = {field: HashIndex(field) for field in indexes or []}
+        self._indexes.update({field: UniqueIndex(field) for field in unique or []})
+        # Índices ordenados por nombre, para recorridos por rango y paginación por clave
+        self._sorted_indexes: Dict[str, SortedIndex] = {
+            name: SortedIndex(fields) for name, fields in (sorted_indexes or {}).items()
+        }
+        # Vistas materializadas: función de partición -> IDs de cada partición en orden
+        self._views: Dict[str, ViewIndex] = {
+            name: ViewIndex(partition) for name, partition in (views or {}).items()
+        }
+        # Índices de texto completo: nombre -> {campo: peso en la relevancia}
+        self._text_indexes: Dict[str, FullTextIndex] = {
+            name: FullTextIndex(fields) for name, fields in (text_indexes or {}).items()
+        }
+        # Índices de trigramas opcionales para find_containing, por campos buscados
+        self._substring_indexes: Dict[Tuple[str, ...], TrigramIndex] = {
+            tuple(fields): TrigramIndex(fields) for fields in substring_indexes or []
+        }
+        # Réplica por columnas para filtros vectorizados: campo -> "category" o "date"
+        self._columnar = ColumnarIndex(columnar) if columnar else None
+        self._indexes_ready = False
+        self._rwlock = CSVModel._table_locks.setdefault(self.full_path, ReadWriteLock())
+        # Protege la recarga de la instantánea y la construcción perezosa de índices,
+        # que pueden ocurrir con varios lectores concurrentes
+        self._cache_lock = threading.RLock()
+        # Cerrojo entre procesos (flock) sobre un archivo auxiliar de inodo estable
+        self.lock_path = self.full_path + ".lock"
+        # Instantánea binaria por columnas que evita parsear el CSV en una carga en frío;
+        # se invalida si cambian los tipos del modelo
+        self._snapshot_path = self.full_path + ".snapshot"
+        self._snapshot_schema = [
+            (name, repr(field.annotation)) for name, field in model_class.model_fields.items()
+        ]
+        # Cargas completas desde que se guardó la última instantánea; la primera carga del
+        # proceso siempre puede guardarla
+        self._loads_since_snapshot = self.SNAPSHOT_RELOADS
+        # Codificadores por campo compilados una vez a partir del modelo, y decodificadores
+        # de fila por cabecera del archivo
+        self._decoders = {
+            name: compile_decoder(field.annotation)
+            for name, field in model_class.model_fields.items()
+        }
+        self._encoders = {
+            name: compile_encoder(field.annotation)
+            for name, field in model_class.model_fields.items()
+        }
+        # Sin compartir objetos: convierten los valores de las consultas sin llenar las reservas
+        self._value_decoders = dict(self._decoders)
+        # Los campos con pocos valores distintos comparten un objeto por valor en la caché.
+        # Las reservas se rehacen en cada lectura completa y al compactar, así que solo
+        # retienen valores de registros vivos; sin caché no hay nada que compartir
+        self._pools: Dict[str, Dict[Any, Any]] = {
+            field: {} for field in (categorical or []) if cache
+        }
+        for field, pool in self._pools.items():
+            self._decoders[field] = interned(self._decoders.get(field, decode_text), pool)
+        self._codecs: Dict[Tuple[str, ...], RowCodec] = {}
+        # Índice auxiliar de desplazamientos de filas para leer sin caché por posición o ID
+        self._offsets = OffsetIndex(self.full_path + ".offsets", self.full_path)
+        self._lock_state = CSVModel._lock_states.setdefault(self.full_path, threading.local())
+        self._lock_metrics: Dict[str, Dict[str, float]] = {
+            mode: {"acquired": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0}
+            for mode in ("shared", "exclusive")
+        }
+        self._metrics_lock = threading.Lock()
+        # Formato real del archivo (se detecta por la cabecera) y filas físicas que contiene
+        self._log_format = storage == "log"
+        self._log_rows = 0
+        # Filas del log sin caché a partir de las que se vuelve a medir la basura
+        self._garbage_check_rows = 0
+        self._compaction_thread: Optional[threading.Thread] = None
         self._ensure_directory()
         self._ensure_file()
+        if self.full_path not in CSVModel._recovered_tables:
+            CSVModel._recovered_tables.add(self.full_path)
+            self._remove_stale_files()
+            self.replay_journal()
+        if not cache:
+            # Sin caché el formato real se lee de la cabecera, sin cargar la tabla
+            rows = self._stream_rows()
+            self._log_format = self.LOG_OP_FIELD in (next(rows, None) or [])
+            rows.close()
+        elif storage == "log":
+            self._load()
+        if storage == "log" and not self._log_format:
+            # Migrar un archivo en formato tabla al formato log
+            self.compact()
 
     def _ensure_directory(self):
         """Crea el directorio de datos si no existe"""
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
 
+    @contextmanager
+    def _file_lock(self, exclusive: bool) -> Iterator[None]:
+        """Cerrojo entre procesos: compartido para leer y exclusivo para escribir"""
+        if fcntl is None or getattr(self._lock_state, "held", False):
+            # Sin soporte de flock, o el hilo ya tiene el cerrojo dentro de una escritura
+            yield
+            return
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            started = time.perf_counter()
+            fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            self._record_lock_wait(exclusive, time.perf_counter() - started)
+            self._lock_state.held = True
+            try:
+                yield
+            finally:
+                self._lock_state.held = False
+        finally:
+            # Cerrar el descriptor libera el flock
+            os.close(fd)
+
+    @contextmanager
+    def _exclusive(self) -> Iterator[None]:
+        """Acceso exclusivo a la tabla dentro del proceso y entre procesos"""
+        transaction = current_transaction()
+        if transaction is not None:
+            # Dentro de una transacción el cerrojo se retiene hasta confirmarla
+            transaction.enlist(self)
+        with self._write_lock():
+            yield
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[None]:
+        """Cerrojo de escritura en memoria más el cerrojo exclusivo de archivo"""
+        with self._rwlock.write(), self._file_lock(exclusive=True):
+            yield
+
+    def _record_lock_wait(self, exclusive: bool, waited: float):
+        """Acumula el tiempo de espera por el cerrojo de archivo"""
+        with self._metrics_lock:
+            metrics = self._lock_metrics["exclusive" if exclusive else "shared"]
+            metrics["acquired"] += 1
+            metrics["wait_seconds"] += waited
+            metrics["max_wait_seconds"] = max(metrics["max_wait_seconds"], waited)
+
+    def lock_metrics(self) -> Dict[str, Dict[str, float]]:
+        """Devuelve las adquisiciones y el tiempo de espera de los cerrojos de archivo"""
+        with self._metrics_lock:
+            return {mode: dict(metrics) for mode, metrics in self._lock_metrics.items()}
+
     def _ensure_file(self):
         """Crea el archivo CSV si no existe con los headers del modelo"""
-        if not os.path.exists(self.full_path):
+        if os.path.exists(self.full_path):
+            return
+        with self._exclusive():
+            # Otro proceso pudo crearlo mientras se esperaba el cerrojo
+            if os.path.exists(self.full_path):
+                return
             # Obtener los campos del modelo Pydantic
-            fields = list(self.model_class.model_fields.keys())
-            with open(self.full_path, "w", newline="", encoding="utf-8") as file:
-                writer = csv.DictWriter(file, fieldnames=fields)
-                writer.writeheader()
-
-    def _serialize_value(self, value: Any) -> str:
-        """Convierte valores complejos a string para CSV"""
-        if value is None:
-            return ""
-        elif isinstance(value, str):
-            return value
-        elif isinstance(value, (dict, list)):
-            return json.dumps(value)
-        elif isinstance(value, (int, float, bool)):
-            return str(value)
-        else:
-            return str(value)
+            self._log_format = self.storage == "log"
+            self._replace_file([])
+            self._bump_generation()
+            self.invalidate_cache()
+
+    def _fieldnames(self) -> List[str]:
+        """Columnas del archivo según su formato"""
+        fields = list(self.model_class.model_fields.keys())
+        if self._log_format:
+            fields.append(self.LOG_OP_FIELD)
+        return fields
+
+    def _serialize_row(self, record: Dict[str, Any], op: str = LOG_PUT) -> Dict[str, str]:
+        """Serializa un registro como fila del CSV"""
+        encoders = self._encoders
+        row = {k: encoders.get(k, serialize_value)(v) for k, v in record.items()}
+        if self._log_format:
+            row[self.LOG_OP_FIELD] = op
+        return row
 
-    def _deserialize_value(self, field_name: str, value: str) -> Any:
-        """Convierte strings de CSV a valores Python"""
-        if not value or value == "":
+    def _append_rows(self, rows: List[Dict[str, str]]):
+        """Agrega filas ya serializadas al final del archivo"""
+        # Las filas se escriben con una sola llamada para no dejar filas a medias
+        buffer = io.StringIO()
+        csv.DictWriter(buffer, fieldnames=self._fieldnames()).writerows(rows)
+        with open(self.full_path, "a", newline="", encoding="utf-8") as file:
+            file.write(buffer.getvalue())
+            if self.durability != "none":
+                file.flush()
+            if self.durability == "fsync" and not self._journal:
+                os.fsync(file.fileno())
+        self._log_rows += len(rows)
+
+    def _journal_write(self, entries: List[Dict[str, Any]]):
+        """Registra las operaciones en el diario antes de aplicarlas al CSV"""
+        if self._journal:
+            self._journal.append(entries, sync=self.durability == "fsync")
+
+    def _durability_ticket(self) -> int:
+        """Pide turno al agrupador de fsync en el modo de durabilidad 'group'"""
+        if self.durability != "group" or current_transaction() is not None:
+            return 0
+        return self._committer.ticket()
+
+    def _await_durability(self, ticket: int):
+        """Espera, fuera del cerrojo de escritura, a que el fsync del grupo cubra la escritura"""
+        if ticket:
+            self._committer.wait(ticket)
+
+    def _checkpoint_journal(self, force: bool = False):
+        """Consolida el diario cuando sus operaciones ya están a salvo en el CSV"""
+        if not self._journal:
+            return
+        if not force and self._journal.entries < self.JOURNAL_CHECKPOINT_ENTRIES:
+            return
+        if not force:
+            fsync_path(self.full_path)
+        self._journal.truncate()
+
+    def _remove_stale_files(self):
+        """Elimina los temporales que dejó una reescritura del CSV interrumpida por una caída"""
+        # Solo los de _stage_file (.<archivo>.XXXXXXXX.tmp): la instantánea y el índice de
+        # desplazamientos usan otros nombres, y los .txn los recupera recover_transactions
+        pattern = re.compile(rf"\.{re.escape(self.csv_file)}\.[a-z0-9_]{{8}}\.tmp")
+        directory = os.path.dirname(self.full_path) or "."
+        # Con el cerrojo exclusivo ningún otro proceso está reescribiendo la tabla
+        with self._write_lock():
+            for name in os.listdir(directory):
+                if pattern.fullmatch(name):
+                    os.remove(os.path.join(directory, name))
+
+    def replay_journal(self) -> int:
+        """
+        Aplica al CSV las operaciones pendientes del diario y lo vacía. El archivo solo se
+        reescribe si alguna operación no estaba ya aplicada.
+        """
+        if not self._journal:
+            return 0
+        entries = self._journal.read()
+        if not entries:
+            return 0
+        with self._exclusive():
+            # Las operaciones son idempotentes: las altas y cambios llevan la fila completa
+            latest = {str(r.get("id")): r for r in self._load()}
+            changed = False
+            for entry in entries:
+                if entry.get("op") == self.LOG_DELETE:
+                    changed = latest.pop(str(entry.get("id")), None) is not None or changed
+                    continue
+                row = entry.get("row") or {}
+                record = self._parse_row(list(row), list(row.values()))[1]
+                record_id = str(record.get("id"))
+                changed = changed or latest.get(record_id) != record
+                latest[record_id] = record
+            if not changed:
+                # El CSV ya tenía todas las operaciones: basta con vaciar el diario
+                fsync_path(self.full_path)
+                self._journal.truncate()
+                return len(entries)
+            self._write_all_records(list(latest.values()))
+            self.invalidate_cache()
+        return len(entries)
+
+    def _bump_generation(self):
+        """Registra una escritura para que las demás instancias recarguen su caché"""
+        CSVModel._generations[self.full_path] = CSVModel._generations.get(self.full_path, 0) + 1
+
+    def _file_signature(self) -> Optional[Tuple[int, int, int, int]]:
+        """Firma (mtime_ns, tamaño, inodo, generación) usada para validar la caché"""
+        try:
+            stat = os.stat(self.full_path)
+        except FileNotFoundError:
             return None
+        generation = CSVModel._generations.get(self.full_path, 0)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino, generation)
 
-        # Obtener el tipo del campo del modelo
-        field_info = self.model_class.model_fields.get(field_name)
-        if not field_info:
-            return value
+    def invalidate_cache(self):
+        """Descarta la instantánea en memoria; la siguiente lectura recarga el archivo"""
+        self._records = None
+        self._signature = None
+        self._id_index = None
+        self._indexes_ready = False
 
-        # Intentar deserializar JSON (listas y diccionarios)
-        if value.startswith(("[", "{")):
-            try:
-                return json.loads(value)
-            except Exception:
-                pass
+    def _load(self) -> List[CompactRecord]:
+        """Devuelve la instantánea en memoria, recargándola si el archivo cambió"""
+        # La firma se toma antes de leer: si el archivo cambia durante la lectura,
+        # la siguiente llamada detecta la diferencia y vuelve a cargar
+        signature = self._file_signature()
+        if self._records is not None and signature == self._signature:
+            return self._records
+        with self._cache_lock:
+            # Otro lector pudo recargar mientras se esperaba el cerrojo
+            if self._records is None or self._file_signature() != self._signature:
+                with self._file_lock(exclusive=False):
+                    signature = self._file_signature()
+                    records = self._read_records()
+                self._id_index = None
+                self._indexes_ready = False
+                self._records = records
+                self._signature = signature
+            return self._records
 
-        # Convertir tipos básicos
-        if field_info.annotation in (int, Optional[int]):
-            try:
-                return int(value)
-            except Exception:
-                return None if field_info.annotation == Optional[int] else 0
+    def _id_positions(self) -> Dict[str, int]:
+        """Índice de clave primaria de la instantánea actual, construyéndolo si hace falta"""
+        records = self._load()
+        id_index = self._id_index
+        if id_index is None:
+            with self._cache_lock:
+                id_index = {}
+                for i, record in enumerate(records):
+                    # Ante IDs duplicados prevalece el primero, como en la búsqueda lineal
+                    id_index.setdefault(str(record.get("id")), i)
+                if records is self._records:
+                    self._id_index = id_index
+        return id_index
 
-        # Para todos los demás casos, devolver el string tal como está
-        return value
+    def _position(self, record_id: Union[int, str]) -> Optional[int]:
+        """Devuelve la posición del registro con el ID dado en la instantánea"""
+        return self._id_positions().get(str(record_id))
 
-    def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
-        """Crea un nuevo registro"""
-        # Generar ID automático como string para compatibilidad
-        data["id"] = generate_id()
+    def _positions(self, record_ids: Iterable[Union[int, str]]) -> List[int]:
+        """Posiciones, en orden de archivo y sin repetir, de los IDs dados que existen"""
+        id_index = self._id_positions()
+        found = (id_index.get(str(record_id)) for record_id in record_ids)
+        return sorted({position for position in found if position is not None})
 
-        # Validar con Pydantic
-        validated = self.model_class.model_validate(data)
-        record = validated.model_dump()
+    def _ensure_indexes(self):
+        """Reconstruye los índices secundarios si la instantánea se recargó"""
+        self._load()
+        if self._indexes_ready:
+            return
+        with self._cache_lock:
+            records = self._load()
+            if self._indexes_ready:
+                return
+            for index in self._maintained_indexes():
+                index.clear()
+                for record in records:
+                    index.add(str(record.get("id")), record)
+            self._indexes_ready = True
 
-        # Escribir al CSV
-        fieldnames = list(self.model_class.model_fields.keys())
-        with open(self.full_path, "a", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            # Serializar valores complejos
-            serialized_record = {k: self._serialize_value(v) for k, v in record.items()}
-            writer.writerow(serialized_record)
+    def _maintained_indexes(
+        self,
+    ) -> List[
+        Union[HashIndex, SortedIndex, ViewIndex, FullTextIndex, TrigramIndex, ColumnarIndex]
+    ]:
+        """Índices secundarios, ordenados, vistas y de texto que se actualizan al escribir"""
+        return [
+            *self._indexes.values(),
+            *self._sorted_indexes.values(),
+            *self._views.values(),
+            *self._text_indexes.values(),
+            *self._substring_indexes.values(),
+            *([self._columnar] if self._columnar else []),
+        ]
+
+    def _check_unique(
+        self, record: Dict[str, Any], previous: Optional[Dict[str, Any]] = None
+    ):
+        """Lanza UniqueConstraintError si el registro duplica un valor de un campo único"""
+        record_id = str(record.get("id"))
+        for field, index in self._indexes.items():
+            if not isinstance(index, UniqueIndex):
+                continue
+            if previous is not None and previous.get(field) == record.get(field):
+                continue
+            if index.conflicts(record_id, record):
+                raise UniqueConstraintError(field, record.get(field))
+
+    def _index_add(self, record: Dict[str, Any]):
+        """Agrega un registro a los índices secundarios ya construidos"""
+        if self._indexes_ready:
+            for index in self._maintained_indexes():
+                index.add(str(record.get("id")), record)
+
+    def _index_remove(self, record: Dict[str, Any]):
+        """Quita un registro de los índices secundarios ya construidos"""
+        if self._indexes_ready:
+            for index in self._maintained_indexes():
+                index.remove(str(record.get("id")), record)
+
+    def _release_snapshot(self):
+        """Descarta la instantánea tras una escritura cuando el modelo no usa caché"""
+        if not self.cache:
+            self.invalidate_cache()
+
+    def _sync_signature(self):
+        """Marca la caché como sincronizada con el archivo tras una escritura propia"""
+        self._bump_generation()
+        self._signature = self._file_signature()
+
+    def _normalize(self, record: Dict[str, Any]) -> CompactRecord:
+        """Devuelve el registro compacto tal como quedaría al releerlo desde el CSV"""
+        encoders, decoders = self._encoders, self._decoders
+        values = tuple(
+            decoders.get(k, decode_text)(encoders.get(k, serialize_value)(v))
+            for k, v in record.items()
+        )
+        return record_class(tuple(record))(values)
+
+    def create(self, data: Union[Dict[str, Any], BaseModel]) -> Dict[str, Any]:
+        """Crea un nuevo registro a partir de un dict o de una instancia ya validada"""
+        return self.create_many([data])[0]
+
+    def create_many(self, items: List[Union[Dict[str, Any], BaseModel]]) -> List[Dict[str, Any]]:
+        """Crea varios registros con una sola escritura al final del archivo"""
+        created: List[Dict[str, Any]] = []
+        for data in items:
+            # Generar ID automático como string y validar con Pydantic una sola vez
+            created.append(new_record(self.model_class, data, generate_id()))
+        if not created:
+            return []
 
-        return record
+        # La comprobación de unicidad y el alta se hacen de forma atómica
+        with self._exclusive():
+            rows = [self._serialize_row(record) for record in created]
+            entries = [{"op": self.LOG_PUT, "row": row} for row in rows]
+            if self._streaming_writes():
+                # Sin caché el alta no carga la tabla: solo la recorre si hay campos únicos
+                self._check_unique_streaming([(None, self._normalize(r)) for r in created])
+                self._persist(entries, None, rows)
+            else:
+                self._ensure_indexes()
+                records = self._load()
+                normalized = [self._normalize(record) for record in created]
+                self._apply_index_changes([(None, record) for record in normalized])
+
+                if self._id_index is not None:
+                    for position, record in enumerate(created, start=len(records)):
+                        self._id_index.setdefault(str(record["id"]), position)
+                # Las altas solo extienden la lista: los iteradores ya abiertos se limitan a
+                # la longitud que tenía al empezar
+                records.extend(normalized)
+                # Escribir al diario y al final del CSV
+                self._persist(entries, records, rows)
+            ticket = self._durability_ticket()
+        self._await_durability(ticket)
+        return [self._public(record) for record in created]
+
+    def _public(self, record: Mapping) -> Any:
+        """Copia de un registro para el llamador: dict o, con typed=True, instancia del modelo"""
+        if self.typed:
+            # Los registros los escribió el propio ORM: no se vuelven a validar
+            return typed_record(self.model_class, record)
+        return record.as_dict() if isinstance(record, CompactRecord) else dict(record)
 
     def find_all(self) -> List[Dict[str, Any]]:
         """Obtiene todos los registros"""
-        records: List[Dict[str, Any]] = []
+        return list(self.iter_all())
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """Recorre los registros uno a uno sin materializar la tabla completa"""
+        return map(self._public, self._iter_records())
+
+    def _iter_records(self) -> Iterator[Mapping]:
+        """Recorre los registros tal como están en la caché, sin copiarlos"""
+        if self.cache or self._log_format:
+            # Con caché se recorre la instantánea publicada, que nunca se modifica en sitio.
+            # Un log sin caché necesita resolver versiones y se resuelve en memoria
+            with self._rwlock.read():
+                records = self._load() if self.cache else self._read_records()
+                total = len(records)
+            for position in range(total):
+                yield records[position]
+            return
+        rows = self._stream_rows()
+        header = next(rows, None)
+        for values in rows:
+            yield self._parse_row(header, values)[1]
+
+    def iter_where(self, predicate: Callable[[Dict[str, Any]], bool]) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre perezosamente los registros que cumplen el predicado. El predicado recibe
+        el registro guardado y no debe modificarlo; solo se copian los que lo cumplen.
+        """
+        return (self._public(record) for record in self._iter_records() if predicate(record))
+
+    def find_where(
+        self, predicate: Callable[[Dict[str, Any]], bool], limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Busca registros que cumplen el predicado, deteniéndose tras los primeros 'limit'"""
+        return list(islice(self.iter_where(predicate), limit))
+
+    def _stream_rows(self) -> Iterator[List[str]]:
+        """Recorre las filas crudas del archivo, empezando por la cabecera, tal como estaban"""
+        # Se abre el archivo bajo el cerrojo compartido y se fija su tamaño: las
+        # reescrituras renombran otro inodo y las altas quedan más allá de ese tamaño,
+        # así que la lectura puede continuar sin mantener ningún cerrojo
+        with self._rwlock.read(), self._file_lock(exclusive=False):
+            try:
+                file = open(self.full_path, "rb")
+            except FileNotFoundError:
+                return
+            size = os.fstat(file.fileno()).st_size
+
+        def lines() -> Iterator[str]:
+            remaining = size
+            for line in file:
+                remaining -= len(line)
+                # Una última fila sin salto de línea está a medio escribir
+                if remaining < 0 or not line.endswith(b"\n"):
+                    return
+                yield line.decode("utf-8")
+
+        with file:
+            # Las líneas en blanco no son filas
+            yield from (values for values in csv.reader(lines()) if values)
+
+    def _parse_row(
+        self, header: List[str], values: List[str]
+    ) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Separa la operación de log de una fila cruda y deserializa sus valores"""
+        return self._codec(header).decode(values)
+
+    def _codec(self, header: List[str]) -> RowCodec:
+        """Decodificador de filas para la cabecera dada, compilado una sola vez"""
+        key = tuple(header)
+        codec = self._codecs.get(key)
+        if codec is None:
+            codec = self._codecs[key] = RowCodec(header, self._decoders, self.LOG_OP_FIELD)
+        return codec
+
+    def _row_view(self) -> Optional[RowView]:
+        """
+        Filas del archivo mapeado en memoria con su índice de desplazamientos, para leer sin
+        caché solo los bytes necesarios. En formato log devuelve None.
+        """
+        if self._log_format:
+            return None
+        # Como en _stream_rows, se fija el tamaño bajo el cerrojo y las reescrituras
+        # posteriores renombran otro inodo sin afectar al mapeo
+        with self._rwlock.read(), self._file_lock(exclusive=False):
+            try:
+                file = open(self.full_path, "rb")
+            except FileNotFoundError:
+                return self._offsets.view(None, 0, 0)
+            with file:
+                stat = os.fstat(file.fileno())
+                data = None
+                if stat.st_size:
+                    data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        with self._cache_lock:
+            rows = self._offsets.view(data, stat.st_size, stat.st_ino)
+        if self.LOG_OP_FIELD in rows.header:
+            rows.close()
+            return None
+        return rows
+
+    def _view_record(self, rows: RowView, row: int) -> Dict[str, Any]:
+        """Deserializa una fila de la vista mapeada"""
+        return self._parse_row(rows.header, rows.values(row))[1]
+
+    def _intern_columns(self, snapshot: Dict[str, Any]):
+        """Comparte los valores de los campos categóricos de la instantánea con las filas nuevas"""
+        for field, column in zip(snapshot["fields"], snapshot["columns"]):
+            pool = self._pools.get(field)
+            if pool is not None:
+                intern = pool.setdefault
+                column[:] = [intern(v, v) if isinstance(v, str) else v for v in column]
+
+    def _rebuild_pools(self, records: List[CompactRecord]):
+        """Deja en las reservas de valores compartidos solo los de los registros dados"""
+        for field, pool in self._pools.items():
+            pool.clear()
+            for record in records:
+                value = record.get(field)
+                if isinstance(value, str):
+                    pool.setdefault(value, value)
+
+    def _read_records(self) -> List[CompactRecord]:
+        """Lee y deserializa todos los registros desde el disco"""
+        # Una lectura completa sustituye a la caché: los valores anteriores ya no se comparten
+        for pool in self._pools.values():
+            pool.clear()
         try:
-            with open(self.full_path, "r", newline="", encoding="utf-8") as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    # Deserializar valores
-                    record = {k: self._deserialize_value(k, v) for k, v in row.items()}
-                    records.append(record)
+            with open(self.full_path, "rb") as file:
+                data = file.read()
         except FileNotFoundError:
-            pass
+            self._log_rows = 0
+            return []
+        # Ignorar una última fila a medio escribir por un alta concurrente
+        if data and not data.endswith(b"\n"):
+            data = data[: data.rfind(b"\n") + 1]
+
+        records: List[CompactRecord] = []
+        # En formato log cada ID conserva la posición de su primera versión
+        latest: Dict[str, CompactRecord] = {}
+        rows = 0
+        header: Optional[List[str]] = None
+        # La instantánea binaria cubre un prefijo del archivo; solo se parsea el resto
+        snapshot = read_snapshot(self._snapshot_path, self._snapshot_schema, data)
+        if snapshot is not None:
+            header = snapshot["header"]
+            rows = snapshot["rows"]
+            self._intern_columns(snapshot)
+            records = snapshot_records(snapshot)
+            if self.LOG_OP_FIELD in header:
+                latest = {str(record.get("id")): record for record in records}
+        start = snapshot["size"] if snapshot is not None else 0
+        reader = csv.reader(io.StringIO(data[start:].decode("utf-8"), newline=""))
+        if header is None:
+            header = next(reader, [])
+        log_format = self.LOG_OP_FIELD in header
+        decode = self._codec(header).decode_compact
+        for values in reader:
+            if not values:
+                continue
+            rows += 1
+            op, record = decode(values)
+            if not log_format:
+                records.append(record)
+            elif op == self.LOG_DELETE:
+                latest.pop(str(record.get("id")), None)
+            else:
+                latest[str(record.get("id"))] = record
+        self._log_format = log_format
+        self._log_rows = rows
+        if log_format:
+            records = list(latest.values())
+        parsed = rows - (snapshot["rows"] if snapshot is not None else 0)
+        self._loads_since_snapshot += 1
+        # Una instantánea que ya no coincide indica una tabla que se reescribe: guardar otra
+        # en cada recarga costaría un volcado completo por escritura
+        stale = snapshot is None and os.path.exists(self._snapshot_path)
+        throttled = stale and self._loads_since_snapshot < self.SNAPSHOT_RELOADS
+        if parsed >= self.SNAPSHOT_MIN_ROWS and not throttled:
+            self._loads_since_snapshot = 0
+            try:
+                write_snapshot(
+                    self._snapshot_path,
+                    self.full_path,
+                    self._snapshot_schema,
+                    data,
+                    header,
+                    rows,
+                    records,
+                )
+            except OSError:
+                # Sin instantánea la próxima carga en frío vuelve a parsear el CSV
+                pass
         return records
 
     def find_by_id(self, record_id: Union[int, str]) -> Optional[Dict[str, Any]]:
         """Busca un registro por ID"""
-        records = self.find_all()
-        for record in records:
-            if str(record.get("id")) == str(record_id):
-                return record
-        return None
+        if not self.cache:
+            rows = self._row_view()
+            if rows is None:
+                return next(self.iter_where(lambda r: str(r.get("id")) == str(record_id)), None)
+            with rows:
+                row = rows.find(str(record_id))
+                return None if row is None else self._public(self._view_record(rows, row))
+        with self._rwlock.read():
+            position = self._position(record_id)
+            if position is None:
+                return None
+            return self._public(self._load()[position])
+
+    def find_by_ids(self, record_ids: List[Union[int, str]]) -> Dict[str, Dict[str, Any]]:
+        """Busca varios registros por ID en una sola lectura; los que no existen se omiten"""
+        wanted = {str(record_id) for record_id in record_ids}
+        rows = None if self.cache else self._row_view()
+        if rows is not None:
+            with rows:
+                positions = {record_id: rows.find(record_id) for record_id in wanted}
+                return {
+                    record_id: self._public(self._view_record(rows, row))
+                    for record_id, row in positions.items()
+                    if row is not None
+                }
+        if not self.cache:
+            found: Dict[str, Dict[str, Any]] = {}
+            for record in self._iter_records():
+                # Ante IDs duplicados prevalece el primero, como en find_by_id
+                if str(record.get("id")) in wanted and str(record.get("id")) not in found:
+                    found[str(record.get("id"))] = self._public(record)
+            return found
+        with self._rwlock.read():
+            records = self._load()
+            positions = {record_id: self._position(record_id) for record_id in wanted}
+            return {
+                record_id: self._public(records[p])
+                for record_id, p in positions.items()
+                if p is not None
+            }
 
     def find_by_field(self, field: str, value: Any) -> List[Dict[str, Any]]:
         """Busca registros por un campo específico"""
-        records = self.find_all()
-        return [r for r in records if r.get(field) == value]
+        if self.cache and field in self._indexes and isinstance(value, Hashable):
+            with self._rwlock.read():
+                self._ensure_indexes()
+                ids = self._indexes[field].lookup(value)
+                records = self._load()
+                return [self._public(records[p]) for p in self._positions(ids)]
+        return list(self.iter_where(lambda r: r.get(field) == value))
 
     def find_one_by_field(self, field: str, value: Any) -> Optional[Dict[str, Any]]:
         """Busca un solo registro por un campo específico"""
-        results = self.find_by_field(field, value)
-        return results[0] if results else None
+        if self.cache and field in self._indexes:
+            results = self.find_by_field(field, value)
+            return results[0] if results else None
+        return next(self.iter_where(lambda r: r.get(field) == value), None)
 
     def update_by_id(
         self, record_id: Union[int, str], data: Dict[str, Any]
     ) -> Optional[Dict[str, Any]]:
         """Actualiza un registro por ID"""
-        records = self.find_all()
-        updated_record = None
-
-        for i, record in enumerate(records):
-            if str(record.get("id")) == str(record_id):
-                # Actualizar solo los campos proporcionados
-                record.update(data)
-                # Validar con Pydantic
-                validated = self.model_class.model_validate(record)
-                records[i] = validated.model_dump()
-                updated_record = records[i]
-                break
-
-        if updated_record:
-            self._write_all_records(records)
-            return updated_record
-        return None
+        updated = self.update_many([record_id], data)
+        return updated[0] if updated else None
 
     def delete_by_id(self, record_id: Union[int, str]) -> bool:
         """Elimina un registro por ID"""
-        records = self.find_all()
-        original_length = len(records)
-        records = [r for r in records if str(r.get("id")) != str(record_id)]
+        return self.delete_many([record_id]) > 0
+
+    def _select_positions(self, selector: Selector) -> List[int]:
+        """Posiciones, en orden de archivo, de los registros elegidos por IDs o por predicado"""
+        if callable(selector):
+            return [i for i, record in enumerate(self._load()) if selector(record)]
+        positions = {self._position(record_id) for record_id in selector}
+        return sorted(p for p in positions if p is not None)
+
+    def _streaming_writes(self) -> bool:
+        """
+        Sin caché, y fuera de una transacción (que confirma la tabla desde la caché), las
+        escrituras recorren el archivo en lugar de cargarlo
+        """
+        return not self.cache and current_transaction() is None
+
+    def _stream_latest(self, selector: Selector) -> Dict[str, Mapping]:
+        """
+        Versión vigente, por ID y en orden de archivo, de los registros elegidos por IDs o por
+        predicado, recorriendo el archivo sin cargarlo: solo se retienen los elegidos
+        """
+        ids = None if callable(selector) else {str(record_id) for record_id in selector}
+        found: Dict[str, Mapping] = {}
+        rows = self._stream_rows()
+        header = next(rows, None)
+        if header is None or "id" not in header:
+            return found
+        id_position = header.index("id")
+        log_format = self.LOG_OP_FIELD in header
+        for values in rows:
+            record_id = values[id_position] if id_position < len(values) else ""
+            # Con IDs solo se deserializan sus filas
+            if ids is not None and record_id not in ids:
+                continue
+            op, record = self._parse_row(header, values)
+            if op == self.LOG_DELETE or not (ids is not None or selector(record)):
+                # Una versión posterior que ya no cumple el predicado también lo descarta
+                if log_format:
+                    found.pop(record_id, None)
+            elif log_format:
+                found[record_id] = record
+            else:
+                # Ante IDs duplicados prevalece el primero, como en find_by_id
+                found.setdefault(record_id, record)
+        return found
+
+    def _check_unique_streaming(self, changes: List[Tuple[Optional[Mapping], Mapping]]):
+        """
+        _apply_index_changes sin caché: del archivo solo se retienen los registros que ya
+        ocupan alguno de los valores únicos nuevos, y los cambios (anterior, nuevo) se aplican
+        en orden como en los índices. Lanza UniqueConstraintError antes de escribir nada.
+        """
+        fields = [field for field, index in self._indexes.items() if isinstance(index, UniqueIndex)]
+        wanted: Dict[str, Set[Any]] = {field: set() for field in fields}
+        for _, record in changes:
+            for field in fields:
+                if isinstance(record.get(field), Hashable):
+                    wanted[field].add(record.get(field))
+                wanted[field].discard(None)
+        if not any(wanted.values()):
+            return
+
+        def occupies(record: Mapping) -> bool:
+            return any(
+                isinstance(record.get(field), Hashable) and record.get(field) in wanted[field]
+                for field in fields
+            )
+
+        holders: Dict[str, Dict[Any, Set[str]]] = {field: {} for field in fields}
+        for record_id, record in self._stream_latest(occupies).items():
+            for field in fields:
+                if isinstance(record.get(field), Hashable) and record.get(field) in wanted[field]:
+                    holders[field].setdefault(record.get(field), set()).add(record_id)
+        for previous, record in changes:
+            record_id = str(record.get("id"))
+            for field in fields:
+                value = record.get(field)
+                if previous is not None and isinstance(previous.get(field), Hashable):
+                    holders[field].get(previous.get(field), set()).discard(str(previous.get("id")))
+                if not isinstance(value, Hashable) or value not in wanted[field]:
+                    continue
+                owners = holders[field].setdefault(value, set())
+                unchanged = previous is not None and previous.get(field) == value
+                if owners - {record_id} and not unchanged:
+                    raise UniqueConstraintError(field, value)
+                owners.add(record_id)
+
+    def _apply_index_changes(
+        self, changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]
+    ):
+        """
+        Aplica a los índices una lista de cambios (anterior, nuevo) comprobando la unicidad.
+        Si un cambio viola una restricción se deshacen los ya aplicados.
+        """
+        applied: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]] = []
+        try:
+            for previous, record in changes:
+                if previous is not None:
+                    self._index_remove(previous)
+                applied.append((previous, None))
+                if record is not None:
+                    self._check_unique(record, previous)
+                    self._index_add(record)
+                    applied[-1] = (previous, record)
+        except Exception:
+            for previous, record in reversed(applied):
+                if record is not None:
+                    self._index_remove(record)
+                if previous is not None:
+                    self._index_add(previous)
+            raise
+        if self._indexes_ready:
+            # Con el lote aplicado, las bajas ya no pueden volver a su posición: la vista y
+            # la réplica por columnas descartan las acumuladas, como la compactación del log
+            for index in [*self._views.values(), *([self._columnar] if self._columnar else [])]:
+                index.shrink()
+
+    def update_many(self, selector: Selector, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Aplica los mismos cambios a los registros elegidos con una sola escritura"""
+        with self._exclusive():
+            if self._streaming_writes():
+                updated = self._update_streaming(selector, data)
+            else:
+                updated = self._update_cached(selector, data)
+            ticket = self._durability_ticket() if updated else 0
+        self._await_durability(ticket)
+        return [self._public(record) for record in updated]
+
+    def _update_cached(self, selector: Selector, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """update_many sobre la caché (con el cerrojo exclusivo tomado)"""
+        self._ensure_indexes()
+        records = self._load()
+        positions = self._select_positions(selector)
+        if not positions:
+            return []
+
+        updated: List[Dict[str, Any]] = []
+        changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]] = []
+        for position in positions:
+            # Actualizar solo los campos proporcionados, validando únicamente esos
+            updated.append(apply_changes(self.model_class, records[position], data))
+            changes.append((records[position], self._normalize(updated[-1])))
+        self._apply_index_changes(changes)
+
+        records = list(records)
+        for position, (_, normalized) in zip(positions, changes):
+            records[position] = normalized
+        self._records = records
+        id_changed = any(
+            str(previous.get("id")) != str(record.get("id")) for previous, record in changes
+        )
+        if id_changed:
+            # El ID cambió con la actualización: reconstruir el índice
+            self._id_index = None
+        rows = [self._serialize_row(record) for record in updated]
+        entries = [{"op": self.LOG_PUT, "row": row} for row in rows]
+        # En formato log basta con agregar las nuevas versiones
+        self._persist(entries, records, rows if self._log_format and not id_changed else None)
+        return updated
+
+    def _update_streaming(self, selector: Selector, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """update_many sin caché: recorre el archivo en lugar de cargarlo"""
+        current = self._stream_latest(selector)
+        updated = [apply_changes(self.model_class, record, data) for record in current.values()]
+        if not updated:
+            return []
+        previous = list(current.values())
+        self._check_unique_streaming(
+            [(old, self._normalize(record)) for old, record in zip(previous, updated)]
+        )
+        rows = [self._serialize_row(record) for record in updated]
+        entries = [{"op": self.LOG_PUT, "row": row} for row in rows]
+        if not self._log_format:
+            self._persist(entries, None, replacements=dict(zip(current, rows)))
+            return updated
+        # En formato log se agregan las nuevas versiones, y lápidas si cambió el ID
+        renamed = [
+            record_id
+            for record_id, record in zip(current, updated)
+            if str(record.get("id")) != record_id
+        ]
+        entries += [{"op": self.LOG_DELETE, "id": record_id} for record_id in renamed]
+        rows += [self._serialize_row({"id": record_id}, self.LOG_DELETE) for record_id in renamed]
+        self._persist(entries, None, rows)
+        return updated
+
+    def delete_many(self, selector: Selector) -> int:
+        """Elimina los registros elegidos con una sola escritura y devuelve cuántos borró"""
+        with self._exclusive():
+            if self._streaming_writes():
+                ids = list(self._stream_latest(selector))
+                records = None
+            else:
+                self._ensure_indexes()
+                records = self._load()
+                positions = self._select_positions(selector)
+                self._apply_index_changes([(records[position], None) for position in positions])
+                doomed = set(positions)
+                ids = [str(records[position].get("id")) for position in positions]
+                records = [record for i, record in enumerate(records) if i not in doomed]
+                if positions:
+                    self._records = records
+                    # Las posiciones posteriores se desplazan: el índice se reconstruye al buscar
+                    self._id_index = None
+            if not ids:
+                return 0
+
+            entries = [{"op": self.LOG_DELETE, "id": record_id} for record_id in ids]
+            if self._log_format:
+                # En formato log se agregan lápidas en lugar de reescribir el archivo
+                tombstones = [
+                    self._serialize_row({"id": record_id}, self.LOG_DELETE) for record_id in ids
+                ]
+                self._persist(entries, records, tombstones)
+            elif records is None:
+                self._persist(entries, None, replacements=dict.fromkeys(ids))
+            else:
+                self._persist(entries, records)
+            ticket = self._durability_ticket()
+        self._await_durability(ticket)
+        return len(ids)
+
+    def _persist(
+        self,
+        entries: List[Dict[str, Any]],
+        records: Optional[List[Dict[str, Any]]],
+        rows: Optional[List[Dict[str, str]]] = None,
+        replacements: Optional[Dict[str, Optional[Dict[str, str]]]] = None,
+    ):
+        """
+        Lleva al disco una escritura ya aplicada a la caché: agrega 'rows' al final del
+        archivo o, si no se dan, lo reescribe con 'records' o, sin caché, recorriéndolo con
+        las filas de 'replacements' (ver _replace_rows). Dentro de una transacción solo la
+        anota; el archivo se escribe una vez al confirmar.
+        """
+        transaction = current_transaction()
+        if transaction is not None:
+            transaction.stage(self)
+            return
+        try:
+            self._journal_write(entries)
+            if rows is not None:
+                self._append_rows(rows)
+            elif replacements is not None:
+                self._log_rows = self._replace_rows(replacements)
+            else:
+                self._replace_file(records)
+                self._log_rows = len(records)
+        except Exception:
+            # La caché ya refleja un cambio que no llegó al disco
+            self.invalidate_cache()
+            raise
+        self._sync_signature()
+        # Un archivo reescrito ya contiene todas las operaciones del diario
+        self._checkpoint_journal(force=rows is None)
+        if rows is not None and self._log_format:
+            self._maybe_compact()
+        self._release_snapshot()
+
+    def _prepare_commit(self, suffix: str) -> str:
+        """Escribe la versión de la tabla de una transacción en un archivo preparado"""
+        return self._stage_file(self._load(), suffix)
+
+    def _finish_transaction(self):
+        """Sincroniza el estado del modelo tras confirmar una transacción que lo reescribió"""
+        self._log_rows = len(self._records or [])
+        self._sync_signature()
+        self._checkpoint_journal(force=True)
+        self._release_snapshot()
+
+    def garbage_ratio(self) -> float:
+        """Proporción de filas del archivo que ya no corresponden a registros vivos"""
+        with self._rwlock.read():
+            if self.cache:
+                live = len(self._load())
+            else:
+                live, self._log_rows = self._count_live()
+            if not self._log_rows:
+                return 0.0
+            return max(self._log_rows - live, 0) / self._log_rows
 
-        if len(records) < original_length:
+    def _count_live(self) -> Tuple[int, int]:
+        """Registros vivos y filas físicas del archivo, recorriéndolo sin deserializarlo"""
+        live: Set[str] = set()
+        rows = self._stream_rows()
+        header = next(rows, None)
+        if header is None or "id" not in header:
+            return 0, 0
+        id_position = header.index("id")
+        op_position = header.index(self.LOG_OP_FIELD) if self.LOG_OP_FIELD in header else None
+        total = 0
+        for values in rows:
+            total += 1
+            record_id = values[id_position] if id_position < len(values) else ""
+            if op_position is not None and op_position < len(values):
+                if values[op_position] == self.LOG_DELETE:
+                    live.discard(record_id)
+                    continue
+            live.add(record_id)
+        return len(live), total
+
+    def _maybe_compact(self):
+        """Lanza la compactación en segundo plano al superar el umbral de basura"""
+        if self._log_rows < self.COMPACT_MIN_ROWS:
+            return
+        if not self.cache:
+            # Sin caché medir la basura obliga a recorrer el archivo: se vuelve a medir
+            # cuando el log duplica las filas de la última medición
+            if self._log_rows < self._garbage_check_rows:
+                return
+            ratio = self.garbage_ratio()
+            self._garbage_check_rows = 2 * self._log_rows
+        else:
+            ratio = self.garbage_ratio()
+        if ratio < self.compact_ratio:
+            return
+        if self._compaction_thread is not None and self._compaction_thread.is_alive():
+            return
+        self._compaction_thread = threading.Thread(
+            target=self.compact, name=f"compact-{self.csv_file}", daemon=True
+        )
+        self._compaction_thread.start()
+
+    def compact(self) -> int:
+        """Reescribe el archivo solo con la última versión de cada registro vivo"""
+        with self._exclusive():
+            records = self._load()
+            removed = max(self._log_rows - len(records), 0)
+            self._log_format = self.storage == "log"
             self._write_all_records(records)
-            return True
-        return False
+            self._release_snapshot()
+            # Sin las versiones descartadas, las reservas tampoco retienen valores borrados
+            self._rebuild_pools(records)
+        return removed
 
     def _write_all_records(self, records: List[Dict[str, Any]]):
         """Reescribe todo el archivo CSV con los registros dados"""
-        fieldnames = list(self.model_class.model_fields.keys())
-        with open(self.full_path, "w", newline="", encoding="utf-8") as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
+        try:
+            self._replace_file(records)
+        except Exception:
+            # La caché pudo quedar modificada sin llegar al disco
+            self.invalidate_cache()
+            raise
+        self._log_rows = len(records)
+        self._sync_signature()
+        # El archivo reescrito ya contiene todas las operaciones del diario
+        self._checkpoint_journal(force=True)
+
+    def _replace_file(self, records: List[Dict[str, Any]]):
+        """Sustituye el archivo CSV de forma atómica por uno con los registros dados"""
+        self._install(self._stage_file(records))
+
+    def _replace_rows(self, replacements: Dict[str, Optional[Dict[str, str]]]) -> int:
+        """
+        Reescribe el archivo recorriéndolo fila a fila, sin cargarlo ni deserializarlo: la
+        primera fila de cada ID de 'replacements' se sustituye por la dada, o se omite si es
+        None. Devuelve las filas escritas.
+        """
+        pending = dict(replacements)
+        fieldnames = self._fieldnames()
+        id_position = fieldnames.index("id")
+        written = 0
+
+        def write(file: IO[str]):
+            nonlocal written
+            writer = csv.writer(file)
+            writer.writerow(fieldnames)
+            rows = self._stream_rows()
+            header = next(rows, fieldnames)
+            for values in rows:
+                if header != fieldnames:
+                    # Archivo con otras columnas que el modelo: se reordenan por nombre
+                    values = [dict(zip(header, values)).get(field, "") for field in fieldnames]
+                record_id = values[id_position] if id_position < len(values) else ""
+                if record_id in pending:
+                    row = pending.pop(record_id)
+                    if row is None:
+                        continue
+                    values = [row.get(field, "") for field in fieldnames]
+                writer.writerow(values)
+                written += 1
+
+        self._install(self._stage(write))
+        return written
+
+    def _install(self, temp_path: str):
+        """Renombra un archivo preparado sobre el CSV de forma atómica"""
+        # El archivo temporal está en el mismo directorio: un lector o una caída nunca ven
+        # la tabla a medio escribir
+        try:
+            os.replace(temp_path, self.full_path)
+            if self.durability in ("fsync", "group"):
+                fsync_directory(os.path.dirname(self.full_path) or ".")
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def _stage_file(self, records: List[Dict[str, Any]], suffix: str = ".tmp") -> str:
+        """Escribe los registros en un archivo temporal junto al CSV y devuelve su ruta"""
+
+        def write(file: IO[str]):
+            writer = csv.DictWriter(file, fieldnames=self._fieldnames())
             writer.writeheader()
             for record in records:
-                # Serializar valores complejos
-                serialized_record = {k: self._serialize_value(v) for k, v in record.items()}
-                writer.writerow(serialized_record)
+                writer.writerow(self._serialize_row(record))
+
+        return self._stage(write, suffix)
+
+    def _stage(self, write: Callable[[IO[str]], None], suffix: str = ".tmp") -> str:
+        """Crea un archivo temporal junto al CSV con lo que escribe 'write' y devuelve su ruta"""
+        directory = os.path.dirname(self.full_path) or "."
+        fd, temp_path = tempfile.mkstemp(prefix=f".{self.csv_file}.", suffix=suffix, dir=directory)
+        try:
+            with os.fdopen(fd, "w", newline="", encoding="utf-8") as file:
+                write(file)
+                file.flush()
+                if self.durability != "none":
+                    os.fsync(file.fileno())
+            copy_mode(self.full_path, temp_path)
+        except Exception:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return temp_path
+
+    def find_after(
+        self,
+        index_name: str,
+        cursor: Optional[str] = None,
+        limit: int = 10,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Paginación por clave: devuelve hasta 'limit' registros tras el cursor y el siguiente"""
+        if index_name not in self._sorted_indexes:
+            raise ValueError(f"Índice ordenado '{index_name}' no registrado")
+        index = self._sorted_indexes[index_name]
+        after = index.decode_cursor(cursor) if cursor else None
+
+        results: List[Dict[str, Any]] = []
+        with self._rwlock.read():
+            if self.cache:
+                self._ensure_indexes()
+                records = self._load()
+                positions = (self._position(record_id) for record_id in index.ids_after(after))
+                candidates = (records[p] for p in positions if p is not None)
+            else:
+                # Sin caché no hay índice en memoria: se ordena una lectura completa
+                candidates = iter(
+                    sorted(self._iter_records(), key=lambda r: index.key(str(r.get("id")), r))
+                )
+            try:
+                for record in candidates:
+                    if after is not None and not index.key(str(record.get("id")), record) > after:
+                        continue
+                    if predicate is None or predicate(record):
+                        results.append(record)
+                        # Se lee un registro de más para saber si hay otra página
+                        if len(results) > limit:
+                            break
+            except TypeError as e:
+                raise ValueError("Cursor inválido") from e
+
+        if len(results) <= limit:
+            return [self._public(record) for record in results], None
+        results = results[:limit]
+        last = results[-1]
+        cursor = index.encode_cursor(index.key(str(last.get("id")), last))
+        return [self._public(record) for record in results], cursor
+
+    def find_in_view(
+        self,
+        view_name: str,
+        partitions: List[Hashable],
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Obtiene en orden de archivo los registros de las particiones dadas de una vista"""
+        if view_name not in self._views:
+            raise ValueError(f"Vista '{view_name}' no registrada")
+        view = self._views[view_name]
+        stop = None if limit is None else max(offset + limit, 0)
+        if not self.cache:
+            wanted = set(partitions)
+            matches = self.iter_where(lambda r: view.partition(r) in wanted)
+            return list(islice(matches, max(offset, 0), stop))
+        with self._rwlock.read():
+            self._ensure_indexes()
+            records = self._load()
+            ids = islice(view.ids(partitions), max(offset, 0), stop)
+            positions = (self._position(record_id) for record_id in ids)
+            return [self._public(records[p]) for p in positions if p is not None]
+
+    def paginate_view(
+        self, view_name: str, partitions: List[Hashable], page: int = 1, per_page: int = 10
+    ) -> Dict[str, Any]:
+        """Paginación sobre las particiones de una vista, con el mismo formato que paginate"""
+        if view_name not in self._views:
+            raise ValueError(f"Vista '{view_name}' no registrada")
+        with self._rwlock.read():
+            if self.cache:
+                self._ensure_indexes()
+                total = self._views[view_name].size(partitions)
+            else:
+                total = len(self.find_in_view(view_name, partitions))
+            data = self.find_in_view(view_name, partitions, (page - 1) * per_page, per_page)
+        return {
+            "data": data,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
+
+    def _matching(self, groups: List[List[Condition]]) -> List[Mapping]:
+        """Registros guardados que cumplen la consulta por columnas (con el cerrojo tomado)"""
+        if self._columnar is None:
+            raise ValueError("El modelo no tiene réplica por columnas")
+        if not self.cache:
+            return list(filter(self._columnar.predicate(groups), self._iter_records()))
+        self._ensure_indexes()
+        records = self._load()
+        return [records[p] for p in self._positions(self._columnar.select(groups))]
+
+    def find_matching(
+        self, groups: List[List[Condition]], offset: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Registros, en orden de archivo, que cumplen todas las condiciones (campo, operador,
+        valor) de alguno de los grupos, evaluadas sobre la réplica por columnas
+        """
+        stop = None if limit is None else max(offset + limit, 0)
+        with self._rwlock.read():
+            matches = self._matching(groups)
+        return [self._public(record) for record in matches[max(offset, 0) : stop]]
+
+    def paginate_matching(
+        self, groups: List[List[Condition]], page: int = 1, per_page: int = 10
+    ) -> Dict[str, Any]:
+        """Paginación sobre find_matching, con el mismo formato que paginate"""
+        with self._rwlock.read():
+            matches = self._matching(groups)
+        total = len(matches)
+        start = (page - 1) * per_page
+        end = start + per_page
+        return {
+            "data": [self._public(record) for record in matches[max(start, 0) : max(end, 0)]],
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
+
+    def query(self) -> Query:
+        """Consulta componible sobre el modelo: where, order_by, only, limit, offset..."""
+        return Query(self)
+
+    def _stored_by_ids(self, record_ids: Iterable[Union[int, str]]) -> Iterator[Mapping]:
+        """Recorre en orden de archivo los registros guardados con los IDs dados"""
+        wanted = {str(record_id) for record_id in record_ids}
+        if self.cache:
+            with self._rwlock.read():
+                records = self._load()
+                positions = self._positions(wanted)
+            for position in positions:
+                yield records[position]
+            return
+        rows = self._row_view()
+        if rows is None:
+            # Ante IDs duplicados prevalece el primero, como en find_by_ids
+            for record in self._iter_records():
+                if str(record.get("id")) in wanted:
+                    wanted.discard(str(record.get("id")))
+                    yield record
+            return
+        with rows:
+            found = (rows.find(record_id) for record_id in wanted)
+            for row in sorted(row for row in found if row is not None):
+                yield self._view_record(rows, row)
+
+    def _index_ids(self, condition: Condition) -> Optional[Set[str]]:
+        """IDs que cumplen una condición eq/in según su índice hash, o None si no se puede"""
+        field, op, value = condition
+        index = self._indexes.get(field)
+        if index is None or op not in ("eq", "in"):
+            return None
+        values = [value] if op == "eq" else value
+        if not all(isinstance(item, Hashable) for item in values):
+            return None
+        # Se copia: el conjunto del índice cambia con las escrituras posteriores
+        return set().union(*(index.lookup(item) for item in values))
+
+    def _sorted_walk(
+        self,
+        index: SortedIndex,
+        bounds: Optional[RangeBounds] = None,
+        after: Optional[Tuple[Any, ...]] = None,
+    ) -> Iterator[Mapping]:
+        """
+        Recorre los registros en el orden de un índice ordenado: desde la clave 'after' o solo
+        entre los límites dados (ver SortedIndex.span). El índice se lee por tramos con el
+        cerrojo tomado y los registros se entregan sin él, así que se puede escribir en la
+        tabla durante el recorrido.
+        """
+        key = after
+        while True:
+            with self._rwlock.read():
+                self._ensure_indexes()
+                records = self._load()
+                id_index = self._id_positions()
+                keys = index.keys_after(key, bounds, self.WALK_CHUNK)
+                positions = [id_index.get(found[-1]) for found in keys]
+            for position in positions:
+                if position is not None:
+                    yield records[position]
+            if len(keys) < self.WALK_CHUNK:
+                return
+            # Se retoma tras la última clave leída, aunque el índice haya cambiado entretanto
+            key = keys[-1]
+
+    def _query_condition(self, condition: Condition) -> Condition:
+        """
+        Condición con el valor convertido como quedaría guardado en el CSV, para que todos los
+        caminos comparen igual (where(id=5) encuentra el ID "5" por cualquier camino)
+        """
+        field, op, value = condition
+        if field not in self._encoders:
+            return condition
+        encode, decode = self._encoders[field], self._value_decoders[field]
+        if op in ("in", "nin"):
+            return field, op, [decode(encode(item)) for item in value]
+        return field, op, decode(encode(value))
+
+    @staticmethod
+    def _range_bounds(
+        index: SortedIndex, conditions: List[Condition]
+    ) -> Optional[Tuple[RangeBounds, List[Condition]]]:
+        """
+        Límites de SortedIndex.span para las condiciones de rango (o eq) sobre el primer campo
+        del índice, y las condiciones que resuelven; None si no hay ninguna aplicable
+        """
+        low: Optional[Tuple[Any, bool]] = None
+        high: Optional[Tuple[Any, bool]] = None
+        used: List[Condition] = []
+
+        def tighter(
+            current: Optional[Tuple[Any, bool]], bound: Tuple[Any, bool], upper: bool
+        ) -> Tuple[Any, bool]:
+            # El límite más restrictivo; a igual valor, el exclusivo
+            if current is None or bound[0] == current[0] and not bound[1]:
+                return bound
+            if bound[0] == current[0]:
+                return current
+            return bound if (bound[0] < current[0]) == upper else current
+
+        try:
+            for condition in conditions:
+                field, op, value = condition
+                if field != index.fields[0] or op not in ("eq", "gt", "gte", "lt", "lte"):
+                    continue
+                # Solo valores escalares: la clave los compara con los guardados
+                if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+                    continue
+                if op in ("eq", "gt", "gte"):
+                    low = tighter(low, (value, op != "gt"), upper=False)
+                if op in ("eq", "lt", "lte"):
+                    high = tighter(high, (value, op != "lt"), upper=True)
+                used.append(condition)
+        except TypeError:
+            # Límites de tipos no comparables entre sí: se resuelven en Python
+            return None
+        if not used:
+            return None
+        bounds = (
+            None if low is None else (low[0],),
+            None if high is None else (high[0],),
+            True if low is None else low[1],
+            True if high is None else high[1],
+        )
+        return bounds, used
+
+    def _plan_query(self, query: Query) -> QueryPlan:
+        """
+        Elige el camino de acceso de una consulta: clave primaria, réplica por columnas,
+        rango de un índice ordenado, índice hash, vista, recorrido de un índice ordenado o
+        recorrido completo. Las condiciones y vistas que el camino no resuelve quedan como
+        residuo y se comprueban sobre cada candidato.
+        """
+        conditions = [self._query_condition(condition) for condition in query.conditions]
+        views = list(query.views)
+        for i, (field, op, value) in enumerate(conditions):
+            if field == "id" and op in ("eq", "in"):
+                ids = [value] if op == "eq" else value
+                residual = conditions[:i] + conditions[i + 1 :]
+                return QueryPlan(
+                    "primary_key",
+                    lambda: self._stored_by_ids(ids),
+                    residual,
+                    views=views,
+                    ids=len(ids),
+                )
+        if not self.cache or (not conditions and not views and not query.ordering):
+            return QueryPlan("scan", self._iter_records, conditions, views=views)
+        if query.cursor is not None:
+            # Paginación por clave: el índice se recorre desde el cursor y se corta al llenar
+            # la página
+            name, after = query.cursor
+            index = self._sorted_indexes[name]
+            # Un rango sobre el primer campo acota el recorrido, como en sorted_range
+            bounds, used = self._range_bounds(index, conditions) or (None, [])
+            if bounds is not None:
+                try:
+                    with self._rwlock.read():
+                        self._ensure_indexes()
+                        index.span(*bounds)
+                except TypeError:
+                    # Valores guardados de otro tipo que el límite: se resuelve en Python
+                    bounds, used = None, []
+            return QueryPlan(
+                "sorted_index",
+                lambda: self._sorted_walk(index, bounds, after),
+                [c for c in conditions if c not in used],
+                ordered=True,
+                views=views,
+                index=name,
+                bounded=bounds is not None,
+            )
+
+        # Un orden ascendente igual a la clave de un índice ordenado evita ordenar
+        fields = tuple(field for field, _ in query.ordering)
+        descending = any(descending for _, descending in query.ordering)
+
+        def index_order(index: SortedIndex) -> bool:
+            return bool(fields) and not descending and index.fields == fields
+
+        with self._rwlock.read():
+            self._ensure_indexes()
+            columnar = self._columnar
+            covered = [c for c in conditions if columnar is not None and columnar.covers(c)]
+            rest = [c for c in conditions if c not in covered]
+
+            def select_columns() -> List[str]:
+                with self._rwlock.read():
+                    self._ensure_indexes()
+                    return columnar.select([covered])
+
+            # Candidatos de cada camino por índice: (filas, prioridad, camino)
+            options: List[Tuple[int, int, QueryPlan]] = []
+            for name, index in self._sorted_indexes.items():
+                found = self._range_bounds(index, conditions)
+                if found is None:
+                    continue
+                bounds, used = found
+                try:
+                    start, stop = index.span(*bounds)
+                except TypeError:
+                    # Valores guardados de otro tipo que el límite: se resuelve en Python
+                    continue
+
+                def range_records(index=index, bounds=bounds) -> Iterator[Mapping]:
+                    if index_order(index):
+                        return self._sorted_walk(index, bounds)
+                    # Sin ese orden se devuelven en orden de archivo, como en los demás caminos
+                    with self._rwlock.read():
+                        self._ensure_indexes()
+                        ids = list(index.ids_between(*bounds))
+                    return self._stored_by_ids(ids)
+
+                def range_size(index=index, bounds=bounds) -> int:
+                    with self._rwlock.read():
+                        self._ensure_indexes()
+                        start, stop = index.span(*bounds)
+                        return stop - start
+
+                plan = QueryPlan(
+                    "sorted_range",
+                    range_records,
+                    [c for c in conditions if c not in used],
+                    ordered=index_order(index),
+                    count=range_size,
+                    views=views,
+                    index=name,
+                    candidates=stop - start,
+                )
+                # Ante igual tamaño se prefiere el rango que ya entrega el orden pedido
+                options.append((stop - start, 0 if plan.ordered else 1, plan))
+
+            # Vistas: sus particiones ya agrupan los IDs en orden de archivo
+            for i, (name, partitions) in enumerate(views):
+                others = views[:i] + views[i + 1 :]
+                # Sin nada más que comprobar ni ordenar, solo se leen los IDs de la página
+                sliced = not conditions and not others and not fields
+
+                def select_view(name=name, partitions=partitions, sliced=sliced) -> List[str]:
+                    with self._rwlock.read():
+                        self._ensure_indexes()
+                        ids = self._views[name].ids(partitions)
+                        if sliced:
+                            limit, offset = query.limit_value, query.offset_value
+                            ids = islice(ids, offset, None if limit is None else offset + limit)
+                        return list(ids)
+
+                def view_size(name=name, partitions=partitions) -> int:
+                    with self._rwlock.read():
+                        self._ensure_indexes()
+                        return self._views[name].size(partitions)
+
+                size = self._views[name].size(partitions)
+                plan = QueryPlan(
+                    "view",
+                    lambda select_view=select_view: self._stored_by_ids(select_view()),
+                    list(conditions),
+                    sliced=sliced,
+                    count=view_size,
+                    views=others,
+                    view=name,
+                    candidates=size,
+                )
+                options.append((size, 2, plan))
+
+            if covered and not rest and not options:
+                return QueryPlan(
+                    "columnar",
+                    lambda: self._stored_by_ids(select_columns()),
+                    [],
+                    count=lambda: len(select_columns()),
+                    columns=[field for field, _, _ in covered],
+                )
+
+            # Índice hash con menos candidatos entre las condiciones eq/in indexadas
+            for i, ids in enumerate(map(self._index_ids, conditions)):
+                if ids is None:
+                    continue
+                condition = conditions[i]
+
+                def select_index(condition=condition) -> Set[str]:
+                    with self._rwlock.read():
+                        self._ensure_indexes()
+                        return self._index_ids(condition) or set()
+
+                plan = QueryPlan(
+                    "hash_index",
+                    lambda select_index=select_index: self._stored_by_ids(select_index()),
+                    conditions[:i] + conditions[i + 1 :],
+                    count=lambda select_index=select_index: len(select_index()),
+                    views=views,
+                    index=condition[0],
+                    candidates=len(ids),
+                )
+                options.append((len(ids), 2, plan))
+            if options:
+                return min(options, key=lambda option: option[:2])[2]
+
+            if covered:
+                return QueryPlan(
+                    "columnar",
+                    lambda: self._stored_by_ids(select_columns()),
+                    rest,
+                    columns=[field for field, _, _ in covered],
+                )
+
+            for name, index in self._sorted_indexes.items():
+                if index_order(index):
+                    return QueryPlan(
+                        "sorted_index",
+                        lambda: self._sorted_walk(index),
+                        conditions,
+                        ordered=True,
+                        index=name,
+                    )
+
+        return QueryPlan("scan", self._iter_records, conditions, views=views)
+
+    def search(
+        self, index_name: str, query: str, page: int = 1, per_page: int = 10
+    ) -> Dict[str, Any]:
+        """Búsqueda de texto ordenada por relevancia, con el mismo formato que paginate"""
+        if index_name not in self._text_indexes:
+            raise ValueError(f"Índice de texto '{index_name}' no registrado")
+        with self._rwlock.read():
+            if self.cache:
+                self._ensure_indexes()
+                index = self._text_indexes[index_name]
+                records = self._load()
+                position = self._position
+            else:
+                # Sin caché se indexa una lectura completa solo para esta búsqueda
+                index = FullTextIndex(self._text_indexes[index_name].fields)
+                records = list(self._iter_records())
+                positions = {}
+                for i, record in enumerate(records):
+                    positions.setdefault(str(record.get("id")), i)
+                    index.add(str(record.get("id")), record)
+                position = positions.get
+            hits = ((position(rid), score) for rid, score in index.search(query).items())
+            # Mayor puntuación primero; a igualdad, el orden del archivo
+            ranked = sorted((-score, p) for p, score in hits if p is not None)
+            start = (page - 1) * per_page
+            end = start + per_page
+            data = [self._public(records[p]) for _, p in ranked[max(start, 0) : max(end, 0)]]
+
+        total = len(ranked)
+        return {
+            "data": data,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
+
+    def find_containing(
+        self, fields: List[str], text: str, page: int = 1, per_page: int = 10
+    ) -> Dict[str, Any]:
+        """Registros con el texto como subcadena (sin distinguir mayúsculas) en algún campo"""
+        index = self._substring_indexes.get(tuple(fields))
+        checker = index or TrigramIndex(fields)
+        with self._rwlock.read():
+            candidates = None
+            if index is not None and self.cache:
+                self._ensure_indexes()
+                candidates = index.candidates(text)
+            if candidates is None:
+                # Sin índice, o con un texto de menos de tres caracteres, se recorre la tabla
+                matches = [r for r in self._iter_records() if checker.matches(r, text)]
+            else:
+                # Los candidatos se verifican en el orden del archivo
+                records = self._load()
+                positions = sorted(p for p in map(self._position, candidates) if p is not None)
+                matches = [records[p] for p in positions if checker.matches(records[p], text)]
+
+        total = len(matches)
+        start = (page - 1) * per_page
+        end = start + per_page
+        return {
+            "data": [self._public(record) for record in matches[max(start, 0) : max(end, 0)]],
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
+
+    def index_stats(self) -> Dict[str, Dict[str, int]]:
+        """Tamaño en memoria de los índices de trigramas, por campos indexados"""
+        with self._rwlock.read():
+            if self.cache:
+                self._ensure_indexes()
+            return {
+                ",".join(fields): index.memory_usage()
+                for fields, index in self._substring_indexes.items()
+            }
 
     def count(self) -> int:
         """Cuenta el total de registros"""
-        return len(self.find_all())
+        if not self.cache and not self._log_format:
+            rows = self._row_view()
+            if rows is not None:
+                with rows:
+                    return len(rows)
+        with self._rwlock.read():
+            if not self.cache:
+                # Basta llevar la cuenta de los IDs vivos, sin deserializar las filas
+                return self._count_live()[0]
+            return len(self._load())
 
     def paginate(self, page: int = 1, per_page: int = 10) -> Dict[str, Any]:
         """Paginación de registros"""
-        records = self.find_all()
-        total = len(records)
         start = (page - 1) * per_page
         end = start + per_page
+        rows = None if self.cache else self._row_view()
+        if rows is not None:
+            # Sin caché solo se leen los bytes de las filas de la página
+            with rows:
+                total = len(rows)
+                page_rows = range(max(start, 0), min(end, total))
+                data = [self._public(self._view_record(rows, row)) for row in page_rows]
+            return {
+                "data": data,
+                "page": page,
+                "per_page": per_page,
+                "total": total,
+                "pages": (total + per_page - 1) // per_page,
+            }
+        total = self.count()
 
         return {
-            "data": records[start:end],
+            # La lectura se detiene al completar la página
+            "data": list(islice(self.iter_all(), max(start, 0), max(end, 0))),
             "page": page,
             "per_page": per_page,
             "total": total,
@@ -190,18 +1872,111 @@ class ORMManager:
     """Gestor principal del ORM para diferentes modelos"""
 
     def __init__(self):
-        self.models: Dict[str, CSVModel] = {}
+        self.models: Dict[str, Union[CSVModel, SQLiteModel]] = {}
+        self.data_dir = "db/data"
+        # Completar una transacción confirmada que quedó a medias en una ejecución anterior
+        recover_transactions(self.data_dir)
+        # Valores por defecto de durabilidad para los modelos registrados
+        self.durability = os.environ.get("ORM_DURABILITY", "flush")
+        self.journal = os.environ.get("ORM_JOURNAL", "false").lower() == "true"
+        # Formato por defecto de los CSV: el log solo se usa si se pide expresamente
+        self.storage = os.environ.get("ORM_STORAGE", "table")
+        # Motor de almacenamiento por defecto ("csv" o "sqlite") y base de datos de SQLite
+        self.backend = os.environ.get("ORM_BACKEND", "csv")
+        database_url = os.environ.get("DATABASE_URL", "sqlite:///db/data/app.db")
+        self.database = database_url.removeprefix("sqlite:///")
 
-    def register_model(self, name: str, model_class: Type[BaseModel], csv_file: str):
-        """Registra un modelo en el ORM"""
-        self.models[name] = CSVModel(model_class, csv_file)
+    def register_model(
+        self,
+        name: str,
+        model_class: Type[BaseModel],
+        csv_file: str,
+        indexes: Optional[List[str]] = None,
+        unique: Optional[List[str]] = None,
+        storage: Optional[str] = None,
+        durability: Optional[str] = None,
+        journal: Optional[bool] = None,
+        cache: bool = True,
+        sorted_indexes: Optional[Dict[str, List[str]]] = None,
+        views: Optional[Dict[str, Callable[[Dict[str, Any]], Optional[Hashable]]]] = None,
+        text_indexes: Optional[Dict[str, Dict[str, float]]] = None,
+        substring_indexes: Optional[List[List[str]]] = None,
+        backend: Optional[str] = None,
+        typed: bool = False,
+        categorical: Optional[List[str]] = None,
+        columnar: Optional[Dict[str, str]] = None,
+    ):
+        """Registra un modelo en el ORM, con índices opcionales y campos únicos"""
+        backend = backend or self.backend
+        if backend == "sqlite":
+            # La tabla se llama como el CSV; 'storage', 'journal', 'cache' y 'categorical'
+            # no aplican
+            self.models[name] = SQLiteModel(
+                model_class,
+                csv_file,
+                database=self.database,
+                indexes=indexes,
+                unique=unique,
+                durability=durability or self.durability,
+                sorted_indexes=sorted_indexes,
+                views=views,
+                text_indexes=text_indexes,
+                substring_indexes=substring_indexes,
+                typed=typed,
+                columnar=columnar,
+            )
+            return
+        if backend != "csv":
+            raise ValueError(f"Motor de almacenamiento '{backend}' no soportado")
+        self.models[name] = CSVModel(
+            model_class,
+            csv_file,
+            indexes=indexes,
+            unique=unique,
+            storage=storage or self.storage,
+            durability=durability or self.durability,
+            journal=self.journal if journal is None else journal,
+            cache=cache,
+            sorted_indexes=sorted_indexes,
+            views=views,
+            text_indexes=text_indexes,
+            substring_indexes=substring_indexes,
+            typed=typed,
+            categorical=categorical,
+            columnar=columnar,
+        )
 
-    def get_model(self, name: str) -> CSVModel:
+    def get_model(self, name: str) -> Union[CSVModel, SQLiteModel]:
         """Obtiene un modelo registrado"""
         if name not in self.models:
             raise ValueError(f"Modelo '{name}' no registrado")
         return self.models[name]
 
+    @contextmanager
+    def transaction(self, *names: str) -> Iterator[Transaction]:
+        """
+        Agrupa las escrituras del hilo sobre varios modelos y las confirma juntas al salir;
+        si el bloque lanza una excepción no se escribe nada. Los modelos nombrados se
+        bloquean de entrada; los demás, al escribir en ellos por primera vez.
+        """
+        models = [self.get_model(name) for name in names]
+        with open_transaction(self.data_dir, models) as transaction:
+            yield transaction
+
+    def join(
+        self, records: List[Dict[str, Any]], field: str, name: str, inner: bool = True
+    ) -> List[Tuple[Dict[str, Any], Optional[Dict[str, Any]]]]:
+        """
+        Une cada registro con el registro del modelo 'name' cuyo ID está en 'field'.
+        Resuelve todos los IDs en una sola búsqueda; con inner=False conserva los
+        registros sin pareja, emparejados con None.
+        """
+        related = self.get_model(name).find_by_ids(
+            [record[field] for record in records if record.get(field) is not None]
+        )
+        pairs = [(record, related.get(str(record.get(field)))) for record in records]
+        return [pair for pair in pairs if pair[1] is not None] if inner else pairs
+
 
 # Instancia global del ORM
 orm = ORMManager()
@@ -0,0 +1,144 @@
+"""
+Codificadores y decodificadores de valores del CSV compilados por campo a partir del modelo
+"""
+
+import json
+import types
+from operator import call
+from typing import Any, Callable, Dict, List, Literal, Optional, Tuple, Union, get_args, get_origin
+from db.records import CompactRecord, record_class
+
+Decoder = Callable[[Optional[str]], Any]
+Encoder = Callable[[Any], str]
+
+
+def serialize_value(value: Any) -> str:
+    """Convierte valores complejos a string para CSV"""
+    if value is None:
+        return ""
+    elif isinstance(value, str):
+        return value
+    elif isinstance(value, (dict, list)):
+        return json.dumps(value)
+    else:
+        return str(value)
+
+
+def decode_text(value: Optional[str]) -> Optional[str]:
+    """Cadenas: la celda vacía es None"""
+    return value or None
+
+
+def decode_any(value: Optional[str]) -> Any:
+    """Campos sin tipo conocido: JSON si lo parece, si no la cadena tal como está"""
+    if not value:
+        return None
+    if value.startswith(("[", "{")):
+        try:
+            return json.loads(value)
+        except ValueError:
+            pass
+    return value
+
+
+def _unwrap_optional(annotation: Any) -> Tuple[Any, bool]:
+    """Separa Optional[X] (o X | None) en X y si admite None"""
+    if get_origin(annotation) in (Union, types.UnionType):
+        args = [arg for arg in get_args(annotation) if arg is not type(None)]
+        if len(args) == 1 and len(args) < len(get_args(annotation)):
+            return args[0], True
+    return annotation, False
+
+
+def _int_decoder(optional: bool) -> Decoder:
+    """Enteros; un valor no numérico se lee como None si el campo es opcional o 0 si no"""
+    fallback = None if optional else 0
+
+    def decode(value: Optional[str]) -> Optional[int]:
+        if not value:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return fallback
+
+    return decode
+
+
+def _literal_decoder(choices: Tuple[Any, ...]) -> Decoder:
+    """Valores de un Literal: se devuelve siempre el mismo objeto para cada opción"""
+    canonical = {choice: choice for choice in choices if isinstance(choice, str)}
+
+    def decode(value: Optional[str]) -> Optional[str]:
+        return canonical.get(value, value) if value else None
+
+    return decode
+
+
+def compile_decoder(annotation: Any) -> Decoder:
+    """Decodificador de las celdas de un campo con la anotación dada"""
+    annotation, optional = _unwrap_optional(annotation)
+    origin = get_origin(annotation)
+    if annotation is str:
+        return decode_text
+    if annotation is int:
+        return _int_decoder(optional)
+    if origin is Literal:
+        return _literal_decoder(get_args(annotation))
+    # Listas, diccionarios y tipos sin decodificador propio: JSON si lo parece
+    return decode_any
+
+
+def interned(decoder: Decoder, pool: Dict[Any, Any]) -> Decoder:
+    """
+    Envuelve un decodificador para que los valores repetidos compartan un mismo objeto;
+    pensado para campos con pocos valores distintos (países, ciudades, categorías)
+    """
+    intern = pool.setdefault
+
+    def decode(value: Optional[str]) -> Any:
+        decoded = decoder(value)
+        return intern(decoded, decoded) if isinstance(decoded, str) else decoded
+
+    return decode
+
+
+def compile_encoder(annotation: Any) -> Encoder:
+    """Codificador de los valores de un campo con la anotación dada"""
+    annotation, _ = _unwrap_optional(annotation)
+    origin = get_origin(annotation)
+    if annotation is str or origin is Literal:
+        return lambda value: value if isinstance(value, str) else serialize_value(value)
+    if annotation is int:
+        return lambda value: str(value) if type(value) is int else serialize_value(value)
+    return serialize_value
+
+
+class RowCodec:
+    """Decodifica las filas de un CSV por posición de columna según su cabecera"""
+
+    def __init__(self, header: List[str], decoders: Dict[str, Decoder], op_field: str):
+        self.header = header
+        self.fields = [field for field in header if field != op_field]
+        self._op_position = header.index(op_field) if op_field in header else None
+        self._decoders = [decoders.get(field, decode_text) for field in header]
+        self._record_class = record_class(tuple(self.fields))
+
+    def _values(self, values: List[str]) -> Tuple[Optional[str], List[Any]]:
+        """Operación de log y valores deserializados de una fila"""
+        decoded = list(map(call, self._decoders, values))
+        if len(decoded) < len(self._decoders):
+            # Como csv.DictReader, las columnas que faltan se leen como vacías
+            decoded.extend([None] * (len(self._decoders) - len(decoded)))
+        op = None if self._op_position is None else decoded.pop(self._op_position)
+        return op, decoded
+
+    def decode(self, values: List[str]) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Devuelve la operación de log (si la hay) y el registro de una fila"""
+        op, decoded = self._values(values)
+        return op, dict(zip(self.fields, decoded))
+
+    def decode_compact(self, values: List[str]) -> Tuple[Optional[str], CompactRecord]:
+        """Como decode, pero el registro queda en forma compacta para guardarlo en caché"""
+        op, decoded = self._values(values)
+        return op, self._record_class(tuple(decoded))
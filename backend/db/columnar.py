@@ -0,0 +1,262 @@
+"""
+Réplica por columnas de algunos campos de una tabla, para filtrar con máscaras vectorizadas
+"""
+
+import operator
+from array import array
+from datetime import date
+from itertools import compress, repeat
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Sequence, Set, Tuple
+
+try:
+    import numpy
+except ImportError:  # Sin NumPy las máscaras se evalúan recorriendo las columnas en Python
+    numpy = None  # type: ignore
+
+# Tipos de columna: categórica (codificada con un diccionario de valores) o fecha (en días)
+COLUMN_KINDS = ("category", "date")
+# Operadores de las condiciones; los de rango solo se admiten en columnas de fecha
+EQUALITY_OPERATORS = ("eq", "ne", "in", "nin")
+RANGE_OPERATORS = {"gt": operator.gt, "gte": operator.ge, "lt": operator.lt, "lte": operator.le}
+REVERSED_OPERATORS = {"gt": operator.lt, "gte": operator.le, "lt": operator.gt, "lte": operator.ge}
+# Código de una fecha vacía o no válida; nunca cumple una condición de rango
+MISSING_DAY = 0
+# Códigos de un valor no indexable guardado y de un valor buscado que no está en la columna
+UNHASHABLE_CODE = -1
+UNKNOWN_CODE = -2
+
+# Condición (campo, operador, valor); una consulta es una lista de grupos de condiciones
+Condition = Tuple[str, str, Any]
+
+
+def date_days(value: Any) -> int:
+    """Días de una fecha 'YYYY-MM-DD' (o date) desde el año 1; MISSING_DAY si no es válida"""
+    if isinstance(value, date):
+        return value.toordinal()
+    if isinstance(value, str):
+        try:
+            return date.fromisoformat(value[:10]).toordinal()
+        except ValueError:
+            pass
+    return MISSING_DAY
+
+
+def _check(op: str, value: int, target: Any) -> bool:
+    """Evalúa una condición sobre un valor ya codificado"""
+    if op == "eq":
+        return value == target
+    if op == "ne":
+        return value != target
+    if op == "in":
+        return value in target
+    if op == "nin":
+        return value not in target
+    return value != MISSING_DAY and RANGE_OPERATORS[op](value, target)
+
+
+class ColumnarIndex:
+    """
+    Réplica por columnas de algunos campos: los categóricos se codifican con un diccionario
+    de valores y las fechas como días. Cada filtro se evalúa como una máscara sobre todas las
+    filas a la vez (con NumPy si está instalado) y devuelve los IDs en orden de archivo.
+    """
+
+    # Filas borradas a partir de las que se descartan, si además superan a las vivas
+    SHRINK_MIN_DEAD = 64
+
+    def __init__(self, columns: Dict[str, str]):
+        for kind in columns.values():
+            if kind not in COLUMN_KINDS:
+                raise ValueError(f"Tipo de columna '{kind}' no soportado")
+        self.columns = dict(columns)
+        self.clear()
+
+    def clear(self):
+        """Vacía la réplica"""
+        # Fila de cada ID, estable ante modificaciones como el orden de ViewIndex
+        self._slots: Dict[str, int] = {}
+        self._ids: List[str] = []
+        self._live = array("b")
+        self._dead = 0
+        self._data: Dict[str, array] = {field: array("i") for field in self.columns}
+        self._codes: Dict[str, Dict[Hashable, int]] = {field: {} for field in self.columns}
+
+    def _encode(self, field: str, value: Any) -> int:
+        """Código con el que se guarda un valor en su columna"""
+        if self.columns[field] == "date":
+            return date_days(value)
+        if not isinstance(value, Hashable):
+            return UNHASHABLE_CODE
+        codes = self._codes[field]
+        return codes.setdefault(value, len(codes))
+
+    def _lookup(self, field: str, value: Any) -> int:
+        """Código de un valor buscado, sin agregarlo al diccionario de la columna"""
+        if self.columns[field] == "date":
+            days = date_days(value)
+            if days == MISSING_DAY:
+                raise ValueError(f"Fecha inválida para '{field}': {value!r}")
+            return days
+        if not isinstance(value, Hashable):
+            return UNKNOWN_CODE
+        return self._codes[field].get(value, UNKNOWN_CODE)
+
+    def _target(self, field: str, op: str, value: Any) -> Any:
+        """Valida una condición y codifica su valor"""
+        if field not in self.columns:
+            raise ValueError(f"Campo '{field}' sin columna en la réplica")
+        if op in ("in", "nin"):
+            return [self._lookup(field, item) for item in value]
+        if op in EQUALITY_OPERATORS:
+            return self._lookup(field, value)
+        if op in RANGE_OPERATORS and self.columns[field] == "date":
+            return self._lookup(field, value)
+        raise ValueError(f"Operador '{op}' no soportado para '{field}'")
+
+    def supports(self, field: str, op: str) -> bool:
+        """Indica si la réplica puede evaluar el operador sobre el campo"""
+        if field not in self.columns:
+            return False
+        return op in EQUALITY_OPERATORS or (
+            op in RANGE_OPERATORS and self.columns[field] == "date"
+        )
+
+    def covers(self, condition: Condition) -> bool:
+        """
+        Indica si la réplica evalúa la condición como la comparación de Python del
+        planificador de consultas: en fechas, solo con valores de fecha válidos
+        """
+        field, op, value = condition
+        if not self.supports(field, op):
+            return False
+        if self.columns[field] != "date":
+            return True
+        values = value if op in ("in", "nin") else [value]
+        return all(date_days(item) != MISSING_DAY for item in values)
+
+    def add(self, record_id: str, record: Dict[str, Any]):
+        """Agrega o reactiva la fila de un registro"""
+        slot = self._slots.get(record_id)
+        if slot is None:
+            slot = self._slots[record_id] = len(self._ids)
+            self._ids.append(record_id)
+            self._live.append(0)
+            for column in self._data.values():
+                column.append(0)
+        elif self._live[slot]:
+            # Ante IDs duplicados prevalece el primero, como en el índice de clave primaria
+            return
+        else:
+            self._dead -= 1
+        for field, column in self._data.items():
+            column[slot] = self._encode(field, record.get(field))
+        self._live[slot] = 1
+
+    def remove(self, record_id: str, record: Dict[str, Any]):
+        """Marca como borrada la fila de un registro; conserva su posición por si vuelve"""
+        slot = self._slots.get(record_id)
+        if slot is not None and self._live[slot]:
+            self._live[slot] = 0
+            self._dead += 1
+
+    def shrink(self):
+        """
+        Descarta las filas borradas cuando ya son mayoría, conservando el orden de las demás
+        """
+        if self._dead < self.SHRINK_MIN_DEAD or self._dead <= len(self._ids) // 2:
+            return
+        kept = list(compress(range(len(self._ids)), self._live))
+        self._ids = [self._ids[slot] for slot in kept]
+        self._slots = {record_id: slot for slot, record_id in enumerate(self._ids)}
+        self._live = array("b", [1]) * len(kept)
+        self._data = {
+            field: array("i", map(column.__getitem__, kept))
+            for field, column in self._data.items()
+        }
+        self._dead = 0
+
+    def select(self, groups: List[List[Condition]]) -> List[str]:
+        """IDs, en orden de archivo, de las filas que cumplen todas las condiciones de un grupo"""
+        compiled = [[(f, op, self._target(f, op, value)) for f, op, value in g] for g in groups]
+        if numpy is None:
+            return self._select_python(compiled)
+        size = len(self._ids)
+        live = numpy.frombuffer(self._live, dtype=numpy.int8, count=size) != 0
+        mask = numpy.zeros(size, dtype=bool)
+        for group in compiled:
+            group_mask = live.copy()
+            for field, op, target in group:
+                column = numpy.frombuffer(self._data[field], dtype=numpy.intc, count=size)
+                group_mask &= self._mask(column, op, target)
+            mask |= group_mask
+        ids = self._ids
+        return [ids[slot] for slot in numpy.flatnonzero(mask).tolist()]
+
+    @staticmethod
+    def _mask(column: Any, op: str, target: Any) -> Any:
+        """Máscara de NumPy de una condición sobre una columna"""
+        if op == "eq":
+            return column == target
+        if op == "ne":
+            return column != target
+        if op == "in":
+            return numpy.isin(column, target)
+        if op == "nin":
+            return ~numpy.isin(column, target)
+        return RANGE_OPERATORS[op](column, target) & (column != MISSING_DAY)
+
+    def _select_python(self, groups: List[List[Condition]]) -> List[str]:
+        """
+        Como select sin NumPy: cada condición filtra las filas que dejó la anterior, con
+        máscaras perezosas que se recorren desde C
+        """
+        matched: Set[int] = set()
+        for group in groups:
+            # Las bajas se descartan al final, sobre las filas que quedan
+            slots: Sequence[int] = range(len(self._ids))
+            for field, op, target in group:
+                values: Sequence[int] = self._data[field]
+                if not isinstance(slots, range):
+                    values = list(map(values.__getitem__, slots))
+                slots = list(compress(slots, self._python_mask(values, op, target)))
+            matched.update(compress(slots, map(self._live.__getitem__, slots)))
+        ids = self._ids
+        return [ids[slot] for slot in sorted(matched)]
+
+    @staticmethod
+    def _python_mask(column: Sequence[int], op: str, target: Any) -> Iterator[Any]:
+        """Máscara perezosa de una condición sobre los valores de una columna"""
+        if op == "eq":
+            return map(target.__eq__, column)
+        if op == "ne":
+            return map(target.__ne__, column)
+        if op in ("in", "nin"):
+            contains = map(frozenset(target).__contains__, column)
+            return contains if op == "in" else map(operator.not_, contains)
+        # valor > objetivo equivale a objetivo < valor, con el objetivo como primer operando
+        within = map(REVERSED_OPERATORS[op], repeat(target), column)
+        return map(operator.and_, within, map(MISSING_DAY.__ne__, column))
+
+    def predicate(self, groups: List[List[Condition]]) -> Callable[[Dict[str, Any]], bool]:
+        """Función que evalúa la consulta sobre un registro suelto, para leer sin caché"""
+        compiled = []
+        for group in groups:
+            conditions = []
+            for field, op, value in group:
+                target = self._target(field, op, value)
+                if self.columns[field] == "category":
+                    # Se comparan los valores sin codificar: la réplica puede estar vacía
+                    target = list(value) if op in ("in", "nin") else value
+                conditions.append((field, self.columns[field] == "date", op, target))
+            compiled.append(conditions)
+
+        def matches(record: Dict[str, Any]) -> bool:
+            return any(
+                all(
+                    _check(op, date_days(record.get(field)) if is_date else record.get(field), t)
+                    for field, is_date, op, t in conditions
+                )
+                for conditions in compiled
+            )
+
+        return matches
@@ -3,19 +3,104 @@ Inicializador de la base de datos CSV
 Registra todos los modelos en el ORM
 """
 
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from models.usuario import Usuario
 from models.evento import Evento
+from db.columnar import Condition
 from db.ORMcsv import orm
+from db.query import compile_predicate
+
+# Campos de los eventos en los que busca /search
+EVENT_SEARCH_FIELDS = ["title", "description", "city", "country"]
+
+# Estados en los que se listan los eventos; los eliminados no pertenecen a ninguno
+EVENT_STATES: Dict[str, Condition] = {
+    "active": ("status", "nin", ["deleted", "archived"]),
+    "archived": ("status", "eq", "archived"),
+}
+# Visibilidades de los eventos que cualquiera puede ver y de los que solo ve su autor
+PUBLIC_VISIBILITY: Condition = ("visibility", "eq", "public")
+OWNER_VISIBILITY: Condition = ("visibility", "in", ["private", "only_me"])
+
+# Predicados compilados una sola vez: la vista los evalúa en cada escritura
+_is_public = compile_predicate([PUBLIC_VISIBILITY])
+_is_owned = compile_predicate([OWNER_VISIBILITY])
+_state_predicates = [
+    (state, compile_predicate([condition])) for state, condition in EVENT_STATES.items()
+]
+
+
+def visibility_groups(
+    user_id: Optional[str], states: Iterable[str] = ("active",)
+) -> List[Tuple[Tuple[str, ...], List[Condition]]]:
+    """
+    Reglas de visibilidad de los eventos: cada partición de la vista con las condiciones
+    por columnas que la definen, para los estados pedidos.
+    - ("public", estado): eventos públicos, visibles para cualquiera
+    - ("owner", user_id, estado): eventos private/only_me, visibles solo para su autor
+    """
+    groups: List[Tuple[Tuple[str, ...], List[Condition]]] = []
+    for state in states:
+        groups.append((("public", state), [PUBLIC_VISIBILITY, EVENT_STATES[state]]))
+        if user_id:
+            owner = [("user_id", "eq", str(user_id)), OWNER_VISIBILITY, EVENT_STATES[state]]
+            groups.append((("owner", str(user_id), state), owner))
+    return groups
+
+
+def event_visibility_partition(event: Dict[str, Any]) -> Optional[Tuple[str, ...]]:
+    """Partición de la vista de visibilidad a la que pertenece un evento (None si ninguna)"""
+    if _is_public(event):
+        scope: Tuple[str, ...] = ("public",)
+    elif event.get("user_id") and _is_owned(event):
+        scope = ("owner", str(event["user_id"]))
+    else:
+        return None
+    for state, matches in _state_predicates:
+        if matches(event):
+            return scope + (state,)
+    return None
 
 
 # Función para obtener instancias de los modelos
 def get_user_model():
     if "usuario" not in orm.models:
-        orm.register_model("usuario", Usuario, "usuarios.csv")
+        orm.register_model("usuario", Usuario, "usuarios.csv", unique=["email", "username"])
     return orm.get_model("usuario")
 
 
 def get_event_model():
-    if "evento" not in orm.models:
-        orm.register_model("evento", Evento, "eventos.csv")
-    return orm.get_model("evento")
+    # Un único modelo sobre eventos.csv: una segunda instancia duplicaría la caché y
+    # se quedaría obsoleta con cada escritura de la otra
+    if "event" not in orm.models:
+        orm.register_model(
+            "event",
+            Evento,
+            "eventos.csv",
+            indexes=["user_id", "category_id", "city", "country", "status"],
+            # Formato según ORM_STORAGE: con "log" el CSV se migra al cargarlo (ver README)
+            # Orden estable (fecha, hora, id) para la paginación por cursor y los rangos de fechas
+            sorted_indexes={"date": ["date", "time"]},
+            # Vista precalculada de visibilidad: públicos y privados de cada autor, por estado
+            views={"visibility": event_visibility_partition},
+            # Índice invertido para /search; el título pesa más que la descripción
+            text_indexes={
+                "search": {"title": 3.0, "description": 1.0, "city": 2.0, "country": 2.0}
+            },
+            # Trigramas para la búsqueda por subcadena de /search
+            substring_indexes=[EVENT_SEARCH_FIELDS],
+            # Valores muy repetidos entre eventos: la caché guarda un solo objeto por valor.
+            # Solo campos con pocos valores distintos; user_id y date crecen sin límite
+            categorical=["time", "country", "city", "category_id", "subcategory_id"],
+            # Réplica por columnas para combinar visibilidad, estado y filtros del listado
+            columnar={
+                "status": "category",
+                "visibility": "category",
+                "user_id": "category",
+                "country": "category",
+                "city": "category",
+                "category_id": "category",
+                "date": "date",
+            },
+        )
+    return orm.get_model("event")
@@ -0,0 +1,269 @@
+"""
+Índices en memoria que CSVModel mantiene sobre su instantánea de registros
+"""
+
+import base64
+import binascii
+import heapq
+import json
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Optional, Set, Tuple, Union
+
+# Registros a modificar en bloque: una lista de IDs o un predicado sobre cada registro
+Selector = Union[List[Union[int, str]], Callable[[Dict[str, Any]], bool]]
+
+
+class UniqueConstraintError(ValueError):
+    """Se lanza cuando una escritura duplicaría un valor de un campo único"""
+
+    def __init__(self, field: str, value: Any):
+        self.field = field
+        self.value = value
+        super().__init__(f"Ya existe un registro con {field} = {value!r}")
+
+
+class HashIndex:
+    """Índice hash secundario: valor del campo -> conjunto de IDs"""
+
+    def __init__(self, field: str):
+        self.field = field
+        self._entries: Dict[Hashable, Set[str]] = {}
+
+    def clear(self):
+        """Vacía el índice"""
+        self._entries.clear()
+
+    def add(self, record_id: str, record: Dict[str, Any]):
+        """Indexa un registro"""
+        value = record.get(self.field)
+        if isinstance(value, Hashable):
+            self._entries.setdefault(value, set()).add(record_id)
+
+    def remove(self, record_id: str, record: Dict[str, Any]):
+        """Quita un registro del índice"""
+        value = record.get(self.field)
+        if not isinstance(value, Hashable):
+            return
+        ids = self._entries.get(value)
+        if ids is not None:
+            ids.discard(record_id)
+            if not ids:
+                del self._entries[value]
+
+    def lookup(self, value: Any) -> Set[str]:
+        """Devuelve los IDs de los registros cuyo campo es igual al valor"""
+        return self._entries.get(value, set())
+
+
+class UniqueIndex(HashIndex):
+    """Índice hash que además exige que cada valor pertenezca a un solo registro"""
+
+    def conflicts(self, record_id: str, record: Dict[str, Any]) -> bool:
+        """Indica si otro registro ya ocupa el valor del campo"""
+        value = record.get(self.field)
+        # Los valores vacíos no participan en la restricción
+        if value is None or not isinstance(value, Hashable):
+            return False
+        return bool(self.lookup(value) - {record_id})
+
+
+# Límites de SortedIndex.span: prefijo inferior, prefijo superior y si cada uno se incluye
+RangeBounds = Tuple[Optional[Tuple[Any, ...]], Optional[Tuple[Any, ...]], bool, bool]
+
+
+def sort_value(value: Any) -> Tuple[bool, Any]:
+    """Valor comparable de un campo: los vacíos se ordenan antes que cualquier otro"""
+    return (False, "") if value is None else (True, value)
+
+
+class SortedIndex:
+    """Índice ordenado por una clave compuesta de campos, con el ID como desempate"""
+
+    def __init__(self, fields: List[str]):
+        self.fields = tuple(fields)
+        self._keys: List[Tuple[Any, ...]] = []
+        self._key_by_id: Dict[str, Tuple[Any, ...]] = {}
+
+    def key(self, record_id: str, record: Dict[str, Any]) -> Tuple[Any, ...]:
+        """Clave de ordenación de un registro"""
+        return tuple(sort_value(record.get(field)) for field in self.fields) + (record_id,)
+
+    def clear(self):
+        """Vacía el índice"""
+        self._keys.clear()
+        self._key_by_id.clear()
+
+    def add(self, record_id: str, record: Dict[str, Any]):
+        """Indexa un registro"""
+        # Ante IDs duplicados prevalece el primero, como en el índice de clave primaria
+        if record_id in self._key_by_id:
+            return
+        key = self.key(record_id, record)
+        insort(self._keys, key)
+        self._key_by_id[record_id] = key
+
+    def remove(self, record_id: str, record: Dict[str, Any]):
+        """Quita un registro del índice"""
+        key = self._key_by_id.pop(record_id, None)
+        if key is None:
+            return
+        position = bisect_left(self._keys, key)
+        if position < len(self._keys) and self._keys[position] == key:
+            del self._keys[position]
+
+    def ids_after(self, key: Optional[Tuple[Any, ...]] = None) -> Iterator[str]:
+        """Recorre en orden los IDs cuya clave es estrictamente mayor que la dada"""
+        position = 0 if key is None else bisect_right(self._keys, key)
+        while position < len(self._keys):
+            yield self._keys[position][-1]
+            position += 1
+
+    def span(
+        self,
+        low: Optional[Tuple[Any, ...]] = None,
+        high: Optional[Tuple[Any, ...]] = None,
+        include_low: bool = True,
+        include_high: bool = True,
+    ) -> Tuple[int, int]:
+        """
+        Posiciones [inicio, fin) de las claves entre low y high, por búsqueda binaria. Los
+        límites son prefijos de valores de los campos, como ("2026-03-01",) o
+        ("2026-03-01", "10:00"), y se comparan con la clave recortada a su longitud. Las
+        claves sin valor en el primer campo quedan fuera, como en las comparaciones de rango.
+        """
+        keys = self._keys
+        # Los vacíos se ordenan primero: el rango empieza tras ellos
+        start = bisect_right(keys, (sort_value(None),), key=lambda key: key[:1])
+        if low is not None:
+            prefix = tuple(map(sort_value, low))
+            find = bisect_left if include_low else bisect_right
+            start = max(start, find(keys, prefix, key=lambda key: key[: len(prefix)]))
+        stop = len(keys)
+        if high is not None:
+            prefix = tuple(map(sort_value, high))
+            find = bisect_right if include_high else bisect_left
+            stop = find(keys, prefix, key=lambda key: key[: len(prefix)])
+        return start, max(start, stop)
+
+    def ids_between(
+        self,
+        low: Optional[Tuple[Any, ...]] = None,
+        high: Optional[Tuple[Any, ...]] = None,
+        include_low: bool = True,
+        include_high: bool = True,
+    ) -> Iterator[str]:
+        """Recorre en orden los IDs de las claves entre low y high (ver span)"""
+        start, stop = self.span(low, high, include_low, include_high)
+        for position in range(start, stop):
+            yield self._keys[position][-1]
+
+    def keys_after(
+        self,
+        key: Optional[Tuple[Any, ...]] = None,
+        bounds: Optional[RangeBounds] = None,
+        limit: Optional[int] = None,
+    ) -> List[Tuple[Any, ...]]:
+        """
+        Hasta 'limit' claves completas estrictamente mayores que 'key', solo entre los límites
+        dados (ver span) si los hay; con la última se retoma el recorrido por tramos
+        """
+        start, stop = (0, len(self._keys)) if bounds is None else self.span(*bounds)
+        if key is not None:
+            start = max(start, bisect_right(self._keys, key))
+        return self._keys[start : stop if limit is None else min(stop, start + limit)]
+
+    def encode_cursor(self, key: Tuple[Any, ...]) -> str:
+        """Convierte una clave en un cursor opaco para la paginación por clave"""
+        payload = json.dumps(list(key), ensure_ascii=False, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+    def decode_cursor(self, cursor: str) -> Tuple[Any, ...]:
+        """Recupera la clave de un cursor; lanza ValueError si no es válido"""
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        except (binascii.Error, UnicodeError, ValueError) as e:
+            raise ValueError("Cursor inválido") from e
+        if (
+            not isinstance(data, list)
+            or len(data) != len(self.fields) + 1
+            or not isinstance(data[-1], str)
+            or not all(isinstance(part, list) and len(part) == 2 for part in data[:-1])
+        ):
+            raise ValueError("Cursor inválido")
+        return tuple(tuple(part) for part in data[:-1]) + (data[-1],)
+
+
+class ViewIndex:
+    """Vista materializada: IDs agrupados por la partición que asigna una función, en orden"""
+
+    # Bajas acumuladas a partir de las que se descartan sus números de orden, si además
+    # superan a los registros vivos (como la compactación del formato log)
+    SHRINK_MIN_DEAD = 64
+
+    def __init__(self, partition: Callable[[Dict[str, Any]], Optional[Hashable]]):
+        # La función devuelve la partición del registro, o None si queda fuera de la vista
+        self.partition = partition
+        self._entries: Dict[Hashable, List[Tuple[int, str]]] = {}
+        # Orden de llegada de cada ID (el del archivo), estable ante modificaciones
+        self._sequence: Dict[str, int] = {}
+        self._next_sequence = 0
+        # IDs quitados que conservan su número de orden por si vuelven
+        self._removed: Set[str] = set()
+
+    def clear(self):
+        """Vacía la vista"""
+        self._entries.clear()
+        self._sequence.clear()
+        self._next_sequence = 0
+        self._removed.clear()
+
+    def add(self, record_id: str, record: Dict[str, Any]):
+        """Agrega un registro a su partición, si pertenece a la vista"""
+        sequence = self._sequence.get(record_id)
+        if sequence is None:
+            sequence = self._sequence[record_id] = self._next_sequence
+            self._next_sequence += 1
+        self._removed.discard(record_id)
+        key = self.partition(record)
+        if key is None:
+            return
+        entries = self._entries.setdefault(key, [])
+        entry = (sequence, record_id)
+        position = bisect_left(entries, entry)
+        if position == len(entries) or entries[position] != entry:
+            entries.insert(position, entry)
+
+    def remove(self, record_id: str, record: Dict[str, Any]):
+        """Quita un registro de su partición"""
+        key = self.partition(record)
+        sequence = self._sequence.get(record_id)
+        if sequence is not None:
+            self._removed.add(record_id)
+        entries = self._entries.get(key) if key is not None else None
+        if not entries or sequence is None:
+            return
+        position = bisect_left(entries, (sequence, record_id))
+        if position < len(entries) and entries[position] == (sequence, record_id):
+            del entries[position]
+            if not entries:
+                del self._entries[key]
+
+    def shrink(self):
+        """Descarta los números de orden de los IDs quitados cuando ya son mayoría"""
+        removed = self._removed
+        if len(removed) < self.SHRINK_MIN_DEAD or len(removed) <= len(self._sequence) // 2:
+            return
+        for record_id in removed:
+            del self._sequence[record_id]
+        removed.clear()
+
+    def size(self, keys: List[Hashable]) -> int:
+        """Cuenta los registros de las particiones dadas"""
+        return sum(len(self._entries.get(key, ())) for key in set(keys))
+
+    def ids(self, keys: List[Hashable]) -> Iterator[str]:
+        """Recorre en orden de archivo los IDs de las particiones dadas, mezclándolas"""
+        lists = [self._entries.get(key, []) for key in set(keys)]
+        for _, record_id in heapq.merge(*lists):
+            yield record_id
@@ -0,0 +1,130 @@
+"""
+Diario de escritura anticipada (WAL) y utilidades de durabilidad para CSVModel
+"""
+
+import json
+import os
+import shutil
+import threading
+import time
+from typing import Any, Dict, List
+
+
+# Niveles de durabilidad de las escrituras:
+# - none: se deja el vaciado de buffers al sistema operativo
+# - flush: se vacían los buffers de Python al cerrar cada escritura
+# - fsync: cada escritura hace fsync antes de confirmar
+# - group: los escritores concurrentes comparten un mismo fsync
+DURABILITY_LEVELS = ("none", "flush", "fsync", "group")
+
+
+def fsync_path(path: str):
+    """Fuerza a disco el contenido de un archivo ya escrito"""
+    fd = os.open(path, os.O_RDWR)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def copy_mode(source: str, path: str):
+    """Da a un archivo creado con mkstemp (solo legible por el propietario) los permisos del CSV"""
+    if os.path.exists(source):
+        shutil.copymode(source, path)
+    else:
+        os.chmod(path, 0o644)
+
+
+def fsync_directory(directory: str):
+    """Fuerza a disco la entrada de directorio tras un rename (solo POSIX)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class GroupCommitter:
+    """Agrupa los fsync de escritores concurrentes sobre un mismo archivo"""
+
+    def __init__(self, path: str, window: float = 0.002):
+        self.path = path
+        # Tiempo que el líder espera para sumar más escritores al mismo fsync
+        self.window = window
+        self._cond = threading.Condition()
+        self._requested = 0
+        self._synced = 0
+        self._syncing = False
+        self.fsync_count = 0
+
+    def ticket(self) -> int:
+        """Registra una escritura ya volcada al sistema operativo y devuelve su turno"""
+        with self._cond:
+            self._requested += 1
+            return self._requested
+
+    def wait(self, ticket: int):
+        """Bloquea hasta que un fsync cubra el turno dado"""
+        with self._cond:
+            while self._synced < ticket:
+                if self._syncing:
+                    self._cond.wait()
+                    continue
+                # Este escritor actúa como líder del siguiente grupo
+                self._syncing = True
+                self._cond.release()
+                try:
+                    if self.window:
+                        time.sleep(self.window)
+                    with self._cond:
+                        target = self._requested
+                    fsync_path(self.path)
+                finally:
+                    self._cond.acquire()
+                    self._syncing = False
+                    self._cond.notify_all()
+                self._synced = max(self._synced, target)
+                self.fsync_count += 1
+
+
+class Journal:
+    """Diario de operaciones en formato JSON por líneas que se repite al arrancar"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.entries = 0
+
+    def append(self, entries: List[Dict[str, Any]], sync: bool = False):
+        """Agrega operaciones al diario en una sola escritura"""
+        payload = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(payload)
+            file.flush()
+            if sync:
+                os.fsync(file.fileno())
+        self.entries += len(entries)
+
+    def read(self) -> List[Dict[str, Any]]:
+        """Lee las operaciones confirmadas, descartando una última línea incompleta"""
+        entries: List[Dict[str, Any]] = []
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                for line in file:
+                    if not line.endswith("\n"):
+                        break
+                    try:
+                        entries.append(json.loads(line))
+                    except json.JSONDecodeError:
+                        break
+        except FileNotFoundError:
+            pass
+        return entries
+
+    def truncate(self):
+        """Vacía el diario una vez que sus operaciones están en el archivo de datos"""
+        if os.path.exists(self.path):
+            with open(self.path, "w", encoding="utf-8"):
+                pass
+        self.entries = 0
@@ -0,0 +1,91 @@
+"""
+Cerrojos en memoria usados por CSVModel para servir peticiones desde varios hilos
+"""
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+
+class ReadWriteLock:
+    """Cerrojo lector/escritor reentrante con preferencia por los escritores"""
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: Optional[int] = None
+        self._writer_depth = 0
+        self._waiting_writers = 0
+        # Profundidad de lectura de cada hilo, para permitir lecturas anidadas
+        self._local = threading.local()
+
+    def acquire_read(self):
+        """Adquiere el cerrojo en modo compartido"""
+        depth = getattr(self._local, "depth", 0)
+        if depth:
+            self._local.depth = depth + 1
+            return
+        with self._cond:
+            if self._writer == threading.get_ident():
+                # Lectura dentro de una escritura del mismo hilo
+                self._local.counted = False
+            else:
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+                self._readers += 1
+                self._local.counted = True
+        self._local.depth = 1
+
+    def release_read(self):
+        """Libera el cerrojo compartido"""
+        self._local.depth -= 1
+        if self._local.depth or not self._local.counted:
+            return
+        with self._cond:
+            self._readers -= 1
+            if not self._readers:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        """Adquiere el cerrojo en modo exclusivo"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._writer_depth += 1
+                return
+            if getattr(self._local, "depth", 0):
+                raise RuntimeError("No se puede pasar de lectura a escritura sin soltar el cerrojo")
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+            self._writer = me
+            self._writer_depth = 1
+
+    def release_write(self):
+        """Libera el cerrojo exclusivo"""
+        with self._cond:
+            self._writer_depth -= 1
+            if not self._writer_depth:
+                self._writer = None
+                self._cond.notify_all()
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """Contexto de lectura compartida"""
+        self.acquire_read()
+        try:
+            yield
+        finally:
+            self.release_read()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """Contexto de escritura exclusiva"""
+        self.acquire_write()
+        try:
+            yield
+        finally:
+            self.release_write()
@@ -0,0 +1,248 @@
+"""
+Índice auxiliar de desplazamientos de filas para leer un CSV por posición o por ID sin parsearlo
+"""
+
+import csv
+import io
+import mmap
+import os
+import struct
+import tempfile
+import zlib
+from array import array
+from typing import List, Optional, Sequence, Tuple
+
+from db.journal import copy_mode
+
+# Cabecera del archivo auxiliar: marca, inodo y bytes del CSV cubiertos, crc32 de control
+# y número de filas. Le siguen n + 1 desplazamientos ('Q') y n números de fila ('I')
+# ordenados por ID. Se usa el orden de bytes de la máquina: el archivo es local
+HEADER = struct.Struct("=8sQQQQ")
+MAGIC = b"CSVOFF1\n"
+
+
+def scan_rows(data: mmap.mmap, start: int, end: int) -> Tuple[List[int], int]:
+    """
+    Desplazamientos de inicio de las filas completas entre start y end y el final de la
+    última. Un salto de línea dentro de comillas no termina la fila.
+    """
+    offsets: List[int] = []
+    row_start = position = start
+    quotes = 0
+    while position < end:
+        newline = data.find(b"\n", position, end)
+        if newline < 0:
+            break
+        quotes += data[position:newline].count(b'"')
+        position = newline + 1
+        if quotes % 2 == 0:
+            offsets.append(row_start)
+            row_start = position
+            quotes = 0
+    return offsets, row_start
+
+
+def parse_line(line: bytes) -> List[str]:
+    """Valores de una fila del CSV"""
+    return next(csv.reader(io.StringIO(line.decode("utf-8"), newline="")), [])
+
+
+class RowView:
+    """Filas de un CSV mapeado en memoria, accesibles por número de fila o por ID"""
+
+    def __init__(
+        self,
+        data: Optional[mmap.mmap],
+        header: List[str],
+        offsets: Sequence[int],
+        order: Sequence[int],
+        tail: Sequence[int],
+    ):
+        self.data = data
+        self.header = header
+        # Filas cubiertas por el archivo auxiliar y filas agregadas después
+        self._offsets = offsets
+        self._order = order
+        self._tail = tail
+        self._id_column = header.index("id") if "id" in header else None
+
+    def __enter__(self) -> "RowView":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Libera el mapeo del CSV; las filas ya deserializadas no dependen de él"""
+        if self.data is not None:
+            self.data.close()
+            self.data = None
+
+    def __len__(self) -> int:
+        return len(self._order) + len(self._tail) - 1 if self._tail else len(self._order)
+
+    def _span(self, row: int) -> Tuple[int, int]:
+        """Bytes que ocupa la fila dada"""
+        covered = len(self._order)
+        if row < covered:
+            return self._offsets[row], self._offsets[row + 1]
+        return self._tail[row - covered], self._tail[row - covered + 1]
+
+    def values(self, row: int) -> List[str]:
+        """Valores crudos de una fila"""
+        start, end = self._span(row)
+        return parse_line(self.data[start:end])
+
+    def record_id(self, row: int) -> str:
+        """ID de una fila"""
+        values = self.values(row)
+        if self._id_column is None or self._id_column >= len(values):
+            return ""
+        return values[self._id_column]
+
+    def find(self, record_id: str) -> Optional[int]:
+        """Número de la primera fila con el ID dado, por búsqueda binaria"""
+        order = self._order
+        low, high = 0, len(order)
+        while low < high:
+            middle = (low + high) // 2
+            if self.record_id(order[middle]) < record_id:
+                low = middle + 1
+            else:
+                high = middle
+        # Ante IDs repetidos el orden (ID, fila) deja primero la fila más antigua
+        if low < len(order) and self.record_id(order[low]) == record_id:
+            return order[low]
+        # Las filas agregadas tras construir el índice se recorren una a una
+        for row in range(len(order), len(self)):
+            if self.record_id(row) == record_id:
+                return row
+        return None
+
+
+class OffsetIndex:
+    """Desplazamientos de las filas de un CSV guardados en un archivo auxiliar mapeado"""
+
+    # Filas agregadas fuera del archivo auxiliar a partir de las que se reconstruye
+    REBUILD_ROWS = 1024
+
+    def __init__(self, path: str, source: str):
+        self.path = path
+        # CSV del que se copian los permisos del archivo auxiliar
+        self.source = source
+        self._inode: Optional[int] = None
+        self._covered = 0
+        self._crc = 0
+        self._header: List[str] = []
+        self._offsets: Sequence[int] = array("Q")
+        self._order: Sequence[int] = array("I")
+        # Inicios de las filas agregadas después de lo cubierto, más el final de la última
+        self._tail: List[int] = []
+
+    def view(self, data: Optional[mmap.mmap], size: int, inode: int) -> RowView:
+        """Vista de las filas completas de los primeros 'size' bytes del CSV mapeado"""
+        if data is None or not size:
+            return RowView(None, [], array("Q"), array("I"), [])
+        if not self._valid(data, size, inode) and not self._load(data, size, inode):
+            self._build(data, size, inode)
+        end = self._tail[-1] if self._tail else self._covered
+        if end < size:
+            starts, row_end = scan_rows(data, end, size)
+            if starts:
+                self._tail = (self._tail[:-1] if self._tail else []) + starts + [row_end]
+            if len(self._tail) > self.REBUILD_ROWS:
+                self._build(data, size, inode)
+        return RowView(data, self._header, self._offsets, self._order, list(self._tail))
+
+    def _check(self, data: mmap.mmap, covered: int, last_row: int) -> int:
+        """crc32 de la cabecera y la última fila cubiertas, para detectar otro archivo"""
+        header_end = data.find(b"\n", 0, covered) + 1
+        return zlib.crc32(data[last_row:covered], zlib.crc32(data[:header_end]))
+
+    def _valid(self, data: mmap.mmap, size: int, inode: int) -> bool:
+        """Indica si lo ya cargado describe un prefijo del archivo actual"""
+        # Las reescrituras renombran otro inodo y las altas solo agregan bytes al final;
+        # el crc descarta un inodo reutilizado por otro archivo
+        if self._inode != inode or self._covered > size:
+            return False
+        return self._check(data, self._covered, self._last_row()) == self._crc
+
+    def _last_row(self) -> int:
+        """Inicio de la última fila cubierta"""
+        return self._offsets[len(self._order) - 1] if len(self._order) else self._covered
+
+    def _load(self, data: mmap.mmap, size: int, inode: int) -> bool:
+        """Carga el archivo auxiliar si corresponde a un prefijo del CSV actual"""
+        try:
+            with open(self.path, "rb") as file:
+                index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return False
+        if len(index) < HEADER.size:
+            return False
+        magic, stored_inode, covered, check, rows = HEADER.unpack_from(index)
+        view = memoryview(index)[HEADER.size :]
+        if magic != MAGIC or stored_inode != inode or covered > size:
+            return False
+        if len(view) != 8 * (rows + 1) + 4 * rows:
+            return False
+        offsets = view[: 8 * (rows + 1)].cast("Q")
+        if self._check(data, covered, offsets[rows - 1] if rows else covered) != check:
+            return False
+        self._set(inode, covered, check, data, offsets, view[8 * (rows + 1) :].cast("I"))
+        return True
+
+    def _build(self, data: mmap.mmap, size: int, inode: int):
+        """Recorre el CSV completo y escribe de nuevo el archivo auxiliar"""
+        starts, covered = scan_rows(data, 0, size)
+        offsets = array("Q", starts[1:])
+        offsets.append(covered)
+        header_end = starts[1] if len(starts) > 1 else covered
+        header = parse_line(data[:header_end])
+        rows = len(offsets) - 1
+        id_column = header.index("id") if "id" in header else None
+
+        def row_id(row: int) -> str:
+            values = parse_line(data[offsets[row] : offsets[row + 1]])
+            if id_column is None or id_column >= len(values):
+                return ""
+            return values[id_column]
+
+        order = array("I", sorted(range(rows), key=lambda row: (row_id(row), row)))
+        check = self._check(data, covered, offsets[rows - 1] if rows else covered)
+        directory = os.path.dirname(self.path) or "."
+        fd, temp_path = tempfile.mkstemp(
+            prefix=f".{os.path.basename(self.path)}.", suffix=".tmp", dir=directory
+        )
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(HEADER.pack(MAGIC, inode, covered, check, rows))
+                file.write(offsets.tobytes())
+                file.write(order.tobytes())
+            copy_mode(self.source, temp_path)
+            # El índice se reconstruye desde el CSV si se pierde: no necesita fsync
+            os.replace(temp_path, self.path)
+        except OSError:
+            # Sin archivo auxiliar el índice queda solo en memoria
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self._set(inode, covered, check, data, offsets, order)
+
+    def _set(
+        self,
+        inode: int,
+        covered: int,
+        check: int,
+        data: mmap.mmap,
+        offsets: Sequence[int],
+        order: Sequence[int],
+    ):
+        """Publica un índice recién cargado o construido"""
+        header_end = offsets[0] if len(order) else covered
+        self._header = parse_line(data[:header_end])
+        self._inode = inode
+        self._covered = covered
+        self._crc = check
+        self._offsets = offsets
+        self._order = order
+        self._tail = []
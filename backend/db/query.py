@@ -0,0 +1,328 @@
+"""
+Consultas componibles sobre los modelos del ORM, planificadas contra sus índices
+"""
+
+import copy
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Callable, Dict, Hashable, Iterator, List, Mapping, Optional, Tuple
+from db.columnar import Condition
+from db.indexes import sort_value
+
+# Operadores de los filtros de where: campo=valor equivale a campo__eq=valor
+LOOKUPS = ("eq", "ne", "in", "nin", "gt", "gte", "lt", "lte")
+# Campo y sentido de cada criterio de orden: ("date", False) asc, ("date", True) desc
+Ordering = Tuple[str, bool]
+# Vista del modelo y particiones de ella a las que se limita una consulta
+ViewFilter = Tuple[str, List[Hashable]]
+
+
+def parse_lookup(key: str, value: Any) -> Condition:
+    """Convierte un argumento de where ('date__gte') en una condición (campo, operador, valor)"""
+    field, _, op = key.partition("__")
+    op = op or "eq"
+    if op not in LOOKUPS:
+        raise ValueError(f"Operador '{op}' no soportado")
+    if op in ("in", "nin"):
+        value = list(value)
+    return (field, op, value)
+
+
+def _test(op: str, target: Any) -> Callable[[Any], bool]:
+    """Comparación de Python de un operador; los valores vacíos no cumplen los rangos"""
+    if op == "eq":
+        return lambda value: value == target
+    if op == "ne":
+        return lambda value: value != target
+    if op == "in":
+        return lambda value: value in target
+    if op == "nin":
+        return lambda value: value not in target
+    compare = {
+        "gt": lambda v: v > target,
+        "gte": lambda v: v >= target,
+        "lt": lambda v: v < target,
+        "lte": lambda v: v <= target,
+    }[op]
+
+    def in_range(value: Any) -> bool:
+        try:
+            return value is not None and compare(value)
+        except TypeError:
+            # Tipos no comparables (por ejemplo una fecha vacía guardada como otro tipo)
+            return False
+
+    return in_range
+
+
+def compile_predicate(conditions: List[Condition]) -> Callable[[Mapping], bool]:
+    """Predicado que comprueba todas las condiciones sobre un registro"""
+    tests = [(field, _test(op, value)) for field, op, value in conditions]
+    return lambda record: all(test(record.get(field)) for field, test in tests)
+
+
+def sort_records(records: Iterator[Mapping], ordering: List[Ordering]) -> List[Mapping]:
+    """
+    Ordena registros por varios campos con sentidos independientes; los vacíos van primero
+    en orden ascendente y a igualdad desempata el ID, como en SortedIndex
+    """
+    result = sorted(records, key=lambda record: str(record.get("id")))
+    for field, descending in reversed(ordering):
+        result.sort(key=lambda record: sort_value(record.get(field)), reverse=descending)
+    return result
+
+
+class QueryPlan:
+    """Camino de acceso elegido para una consulta, sin ejecutarla todavía"""
+
+    def __init__(
+        self,
+        path: str,
+        fetch: Callable[[], Iterator[Mapping]],
+        residual: List[Condition],
+        ordered: bool = False,
+        sliced: bool = False,
+        count: Optional[Callable[[], int]] = None,
+        views: Optional[List[ViewFilter]] = None,
+        describe: Optional[Callable[[], Dict[str, Any]]] = None,
+        **details: Any,
+    ):
+        # Camino: primary_key, hash_index, view, columnar, sorted_range, sorted_index, scan o sql
+        self.path = path
+        # Recorre los registros candidatos guardados (sin copiar)
+        self.fetch = fetch
+        # Condiciones y vistas que el camino no resuelve y se comprueban en Python
+        self.residual = residual
+        self.views = views or []
+        # Si los candidatos ya llegan en el orden pedido, y ya con offset y limit aplicados
+        self.ordered = ordered
+        self.sliced = sliced
+        # Cuenta sin recorrer los registros, si el camino lo permite
+        self.count = count
+        self.details = details
+        # Detalles costosos de calcular que solo pide explain (por ejemplo los pasos de SQL)
+        self.describe = describe
+
+
+class Query:
+    """
+    Consulta componible sobre un modelo: where, in_view, filter, order_by, after, only, limit y
+    offset devuelven una consulta nueva, y all, first, count, paginate, page_after y explain la
+    ejecutan. El modelo elige el camino de acceso (_plan_query) según sus índices.
+    """
+
+    def __init__(self, model: Any):
+        self.model = model
+        self.conditions: List[Condition] = []
+        # Predicados de Python que no se pueden expresar como condiciones (por ejemplo un OR)
+        self.predicates: List[Callable[[Mapping], bool]] = []
+        self.views: List[ViewFilter] = []
+        self.ordering: List[Ordering] = []
+        # Índice ordenado y clave tras la que empieza la paginación por clave (ver after)
+        self.cursor: Optional[Tuple[str, Optional[Tuple[Any, ...]]]] = None
+        self.fields: Optional[List[str]] = None
+        self.offset_value = 0
+        self.limit_value: Optional[int] = None
+
+    def _clone(self) -> "Query":
+        """Copia de la consulta para encadenar sin modificar la original"""
+        clone = copy.copy(self)
+        clone.conditions = list(self.conditions)
+        clone.predicates = list(self.predicates)
+        clone.views = list(self.views)
+        clone.ordering = list(self.ordering)
+        return clone
+
+    def where(self, **lookups: Any) -> "Query":
+        """Agrega condiciones: campo=valor, campo__in=[...], campo__gte=valor..."""
+        clone = self._clone()
+        clone.conditions.extend(parse_lookup(key, value) for key, value in lookups.items())
+        return clone
+
+    def in_view(self, view_name: str, partitions: List[Hashable]) -> "Query":
+        """Se limita a los registros de las particiones dadas de una vista del modelo"""
+        if view_name not in self.model._views:
+            raise ValueError(f"Vista '{view_name}' no registrada")
+        clone = self._clone()
+        clone.views.append((view_name, list(partitions)))
+        return clone
+
+    def filter(self, predicate: Callable[[Mapping], bool]) -> "Query":
+        """
+        Agrega un predicado de Python sobre el registro guardado (que no debe modificar). Se
+        comprueba sobre los candidatos de las condiciones de where, que siguen usando índices.
+        """
+        clone = self._clone()
+        clone.predicates.append(predicate)
+        return clone
+
+    def order_by(self, *fields: str) -> "Query":
+        """Ordena por los campos dados; con '-' delante, en sentido descendente"""
+        clone = self._clone()
+        clone.ordering = [(field.lstrip("-"), field.startswith("-")) for field in fields]
+        return clone
+
+    def after(self, index_name: str, cursor: Optional[str] = None) -> "Query":
+        """
+        Paginación por clave: ordena por un índice ordenado (y el ID) y se limita a los registros
+        posteriores al cursor, el que devuelve page_after. Lanza ValueError si no es válido.
+        """
+        index = self.model._sorted_indexes.get(index_name)
+        if index is None:
+            raise ValueError(f"Índice ordenado '{index_name}' no registrado")
+        clone = self._clone()
+        clone.ordering = [(field, False) for field in index.fields]
+        clone.cursor = (index_name, index.decode_cursor(cursor) if cursor else None)
+        return clone
+
+    def only(self, *fields: str) -> "Query":
+        """Devuelve solo los campos dados de cada registro"""
+        clone = self._clone()
+        clone.fields = list(fields)
+        return clone
+
+    def limit(self, limit: Optional[int]) -> "Query":
+        """Devuelve como máximo 'limit' registros"""
+        clone = self._clone()
+        clone.limit_value = None if limit is None else max(limit, 0)
+        return clone
+
+    def offset(self, offset: int) -> "Query":
+        """Omite los primeros 'offset' registros"""
+        clone = self._clone()
+        clone.offset_value = max(offset, 0)
+        return clone
+
+    def _output(self, record: Mapping) -> Any:
+        """Registro para el llamador: proyectado con only o como lo devuelve el modelo"""
+        if self.fields is None:
+            return self.model._public(record)
+        return {field: record.get(field) for field in self.fields}
+
+    def _plan(self) -> QueryPlan:
+        """Plan del modelo; con predicados, offset y limit se aplican después de comprobarlos"""
+        if not self.predicates:
+            return self.model._plan_query(self)
+        unsliced = self._clone()
+        unsliced.offset_value, unsliced.limit_value = 0, None
+        plan = self.model._plan_query(unsliced)
+        plan.sliced = False
+        return plan
+
+    def _view_predicate(self, view_name: str, partitions: List[Hashable]) -> Callable:
+        """Predicado de pertenencia a las particiones dadas de una vista del modelo"""
+        partition, wanted = self.model._views[view_name].partition, set(partitions)
+        return lambda record: partition(record) in wanted
+
+    def _after_cursor(self, records: Iterator[Mapping]) -> Iterator[Mapping]:
+        """Registros cuya clave en el índice de after es posterior al cursor"""
+        index_name, after = self.cursor
+        index = self.model._sorted_indexes[index_name]
+        try:
+            for record in records:
+                if index.key(str(record.get("id")), record) > after:
+                    yield record
+        except TypeError as e:
+            # Clave del cursor de otro tipo que las guardadas
+            raise ValueError("Cursor inválido") from e
+
+    @contextmanager
+    def _results(self, plan: QueryPlan) -> Iterator[Iterator[Mapping]]:
+        """Registros de un plan tras filtrar, ordenar y recortar lo que el plan no resolvió"""
+        source = plan.fetch()
+        try:
+            records: Iterator[Mapping] = source
+            if plan.residual:
+                records = filter(compile_predicate(plan.residual), records)
+            for view_name, partitions in plan.views:
+                records = filter(self._view_predicate(view_name, partitions), records)
+            if self.cursor is not None and self.cursor[1] is not None:
+                records = self._after_cursor(records)
+            for predicate in self.predicates:
+                records = filter(predicate, records)
+            if self.ordering and not plan.ordered:
+                records = iter(sort_records(records, self.ordering))
+            if not plan.sliced and (self.offset_value or self.limit_value is not None):
+                stop = None if self.limit_value is None else self.offset_value + self.limit_value
+                records = islice(records, self.offset_value, stop)
+            yield records
+        finally:
+            # Los recorridos que tienen el archivo abierto lo cierran aunque se corten antes
+            close = getattr(source, "close", None)
+            if close is not None:
+                close()
+
+    def all(self) -> List[Any]:
+        """Ejecuta la consulta y devuelve los registros"""
+        with self._results(self._plan()) as records:
+            return [self._output(record) for record in records]
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self.all())
+
+    def first(self) -> Optional[Any]:
+        """Primer registro de la consulta, o None"""
+        found = self.limit(1).all()
+        return found[0] if found else None
+
+    def count(self) -> int:
+        """Cuenta los registros que cumplen las condiciones, sin aplicar offset ni limit"""
+        unsliced = self._clone()
+        unsliced.ordering, unsliced.offset_value, unsliced.limit_value = [], 0, None
+        plan = unsliced._plan()
+        exact = not plan.residual and not plan.views and self.cursor is None
+        if plan.count is not None and exact and not self.predicates:
+            return plan.count()
+        with unsliced._results(plan) as records:
+            return sum(1 for _ in records)
+
+    def paginate(self, page: int = 1, per_page: int = 10) -> Dict[str, Any]:
+        """Paginación de la consulta, con el mismo formato que paginate del modelo"""
+        total = self.count()
+        data = self.offset((page - 1) * per_page).limit(per_page).all()
+        return {
+            "data": data,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
+
+    def page_after(self, limit: int = 10) -> Tuple[List[Any], Optional[str]]:
+        """
+        Página de la paginación por clave (ver after): hasta 'limit' registros y el cursor de
+        la siguiente, o None si no hay más
+        """
+        if self.cursor is None:
+            raise ValueError("page_after requiere un índice ordenado (after)")
+        index = self.model._sorted_indexes[self.cursor[0]]
+        # Se lee un registro de más para saber si hay otra página
+        query = self.limit(limit + 1)
+        with query._results(query._plan()) as records:
+            found = list(records)
+        if len(found) <= limit:
+            return [self._output(record) for record in found], None
+        found = found[:limit]
+        last = found[-1]
+        cursor = index.encode_cursor(index.key(str(last.get("id")), last))
+        return [self._output(record) for record in found], cursor
+
+    def explain(self) -> Dict[str, Any]:
+        """Describe el camino de acceso elegido sin ejecutar la consulta"""
+        plan = self._plan()
+        if plan.ordered:
+            # Orden resuelto por el origen: un índice ordenado o el ORDER BY de SQL
+            order = ("sql" if plan.path == "sql" else "index") if self.ordering else None
+        else:
+            order = "sort" if self.ordering else None
+        return {
+            "path": plan.path,
+            **plan.details,
+            **(plan.describe() if plan.describe is not None else {}),
+            "residual": [list(condition) for condition in plan.residual],
+            "views": [view_name for view_name, _ in plan.views],
+            "predicates": len(self.predicates),
+            "order": order,
+            # Sin ordenar en memoria, el recorrido se detiene al completar offset + limit
+            "early_stop": self.limit_value is not None and order != "sort",
+        }
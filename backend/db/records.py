@@ -0,0 +1,100 @@
+"""
+Construcción y validación de registros a partir de los modelos Pydantic
+"""
+
+from collections.abc import Mapping
+from functools import lru_cache
+from typing import Any, Dict, Iterator, Tuple, Type, Union
+from pydantic import BaseModel
+
+
+def new_record(
+    model_class: Type[BaseModel], data: Union[Dict[str, Any], BaseModel], record_id: str
+) -> Dict[str, Any]:
+    """
+    Registro de un alta con el ID dado: una instancia del modelo ya validada (por ejemplo
+    por el decorador @validate) se usa tal cual; un diccionario se valida una vez
+    """
+    if isinstance(data, model_class):
+        record = data.model_dump()
+        record["id"] = record_id
+        return record
+    data["id"] = record_id
+    return model_class.model_validate(data).model_dump()
+
+
+def apply_changes(
+    model_class: Type[BaseModel], record: Dict[str, Any], data: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Aplica cambios a un registro guardado validando solo los campos que cambian: el
+    registro escrito por el propio ORM se reconstruye sin volver a validarlo
+    """
+    instance = model_class.model_construct(**record)
+    validator = model_class.__pydantic_validator__
+    for field, value in data.items():
+        # Como model_validate, los campos que no son del modelo se ignoran
+        if field in model_class.model_fields:
+            validator.validate_assignment(instance, field, value)
+    return instance.model_dump()
+
+
+def typed_record(model_class: Type[BaseModel], record: Dict[str, Any]) -> BaseModel:
+    """Instancia del modelo para un registro leído del disco, sin revalidarlo"""
+    return model_class.model_construct(**record)
+
+
+class CompactRecord(Mapping):
+    """
+    Registro de solo lectura guardado como una tupla de valores. Los nombres de los campos
+    y su posición son atributos de clase compartidos por todas las filas con las mismas
+    columnas, así cada fila ocupa una tupla y no un diccionario completo.
+    """
+
+    __slots__ = ("_values",)
+    _fields: Tuple[str, ...] = ()
+    _positions: Dict[str, int] = {}
+
+    def __init__(self, values: Tuple[Any, ...]):
+        self._values = values
+
+    def __getitem__(self, field: str) -> Any:
+        position = self._positions.get(field)
+        if position is None:
+            raise KeyError(field)
+        return self._values[position]
+
+    def get(self, field: str, default: Any = None) -> Any:
+        position = self._positions.get(field)
+        return default if position is None else self._values[position]
+
+    def __contains__(self, field: object) -> bool:
+        return field in self._positions
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __repr__(self) -> str:
+        return f"CompactRecord({self.as_dict()!r})"
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Copia del registro como diccionario"""
+        return dict(zip(self._fields, self._values))
+
+
+@lru_cache(maxsize=None)
+def record_class(fields: Tuple[str, ...]) -> Type[CompactRecord]:
+    """Clase de registro compacto para unas columnas dadas (una por esquema)"""
+    positions = {field: position for position, field in enumerate(fields)}
+    namespace = {"__slots__": (), "_fields": fields, "_positions": positions}
+    return type("Record", (CompactRecord,), namespace)
+
+
+def compact_record(record: Mapping) -> CompactRecord:
+    """Versión compacta de un registro"""
+    if isinstance(record, CompactRecord):
+        return record
+    return record_class(tuple(record))(tuple(record.values()))
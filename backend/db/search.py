@@ -0,0 +1,178 @@
+"""
+Índices de búsqueda de texto que CSVModel mantiene sobre su instantánea de registros
+"""
+
+import math
+import re
+import sys
+import unicodedata
+from bisect import bisect_left, insort
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+def fold_text(text: Any) -> str:
+    """Normaliza un texto para buscar: minúsculas y sin tildes ni diéresis"""
+    decomposed = unicodedata.normalize("NFKD", str(text or ""))
+    return "".join(c for c in decomposed if not unicodedata.combining(c)).casefold()
+
+
+def tokenize(text: Any) -> List[str]:
+    """Divide un texto normalizado en palabras"""
+    return _TOKEN_RE.findall(fold_text(text))
+
+
+class FullTextIndex:
+    """Índice invertido: palabra normalizada -> {ID: peso}, con búsqueda por prefijo"""
+
+    # Un término que solo coincide como prefijo puntúa menos que una palabra completa
+    PREFIX_FACTOR = 0.5
+
+    def __init__(self, fields: Dict[str, float]):
+        # Campos indexados y el peso de cada uno en la relevancia
+        self.fields = dict(fields)
+        self._postings: Dict[str, Dict[str, float]] = {}
+        # Vocabulario ordenado para encontrar las palabras que empiezan por un prefijo
+        self._terms: List[str] = []
+        self._documents = 0
+
+    def _weights(self, record: Dict[str, Any]) -> Dict[str, float]:
+        """Peso de cada palabra del registro según los campos donde aparece"""
+        weights: Dict[str, float] = {}
+        for field, weight in self.fields.items():
+            for term in tokenize(record.get(field)):
+                weights[term] = weights.get(term, 0.0) + weight
+        return weights
+
+    def clear(self):
+        """Vacía el índice"""
+        self._postings.clear()
+        self._terms.clear()
+        self._documents = 0
+
+    def add(self, record_id: str, record: Dict[str, Any]):
+        """Indexa las palabras de un registro"""
+        self._documents += 1
+        for term, weight in self._weights(record).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                insort(self._terms, term)
+            postings[record_id] = weight
+
+    def remove(self, record_id: str, record: Dict[str, Any]):
+        """Quita las palabras de un registro del índice"""
+        self._documents = max(self._documents - 1, 0)
+        for term in self._weights(record):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(record_id, None)
+            if not postings:
+                del self._postings[term]
+                del self._terms[bisect_left(self._terms, term)]
+
+    def _expand(self, term: str, prefix: bool) -> Iterator[Tuple[str, float]]:
+        """Palabras del vocabulario que coinciden con un término y su factor de relevancia"""
+        if term in self._postings:
+            yield term, 1.0
+        if not prefix:
+            return
+        position = bisect_left(self._terms, term)
+        while position < len(self._terms) and self._terms[position].startswith(term):
+            if self._terms[position] != term:
+                yield self._terms[position], self.PREFIX_FACTOR
+            position += 1
+
+    def search(self, query: str, prefix: bool = True) -> Dict[str, float]:
+        """Devuelve la puntuación de los registros que contienen todos los términos"""
+        scores: Dict[str, float] = {}
+        for i, term in enumerate(dict.fromkeys(tokenize(query))):
+            matches: Dict[str, float] = {}
+            for word, factor in self._expand(term, prefix):
+                postings = self._postings[word]
+                # Las palabras poco frecuentes pesan más (idf)
+                idf = math.log(1 + self._documents / len(postings))
+                for record_id, weight in postings.items():
+                    score = weight * idf * factor
+                    if score > matches.get(record_id, 0.0):
+                        matches[record_id] = score
+            if i == 0:
+                scores = matches
+            else:
+                scores = {rid: scores[rid] + s for rid, s in matches.items() if rid in scores}
+            if not scores:
+                break
+        return scores
+
+
+def trigrams(text: str) -> Set[str]:
+    """Conjunto de subcadenas de tres caracteres de un texto"""
+    return {text[i : i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Índice de trigramas para búsquedas por subcadena: trigrama -> IDs"""
+
+    def __init__(self, fields: List[str]):
+        self.fields = tuple(fields)
+        self._postings: Dict[str, Set[str]] = {}
+
+    def _trigrams(self, record: Dict[str, Any]) -> Set[str]:
+        """Trigramas de cada campo por separado, sin cruzar el límite entre campos"""
+        grams: Set[str] = set()
+        for field in self.fields:
+            grams |= trigrams(str(record.get(field) or "").lower())
+        return grams
+
+    def clear(self):
+        """Vacía el índice"""
+        self._postings.clear()
+
+    def add(self, record_id: str, record: Dict[str, Any]):
+        """Indexa los trigramas de un registro"""
+        for gram in self._trigrams(record):
+            self._postings.setdefault(gram, set()).add(record_id)
+
+    def remove(self, record_id: str, record: Dict[str, Any]):
+        """Quita los trigramas de un registro del índice"""
+        for gram in self._trigrams(record):
+            ids = self._postings.get(gram)
+            if ids is not None:
+                ids.discard(record_id)
+                if not ids:
+                    del self._postings[gram]
+
+    def candidates(self, text: str) -> Optional[Set[str]]:
+        """
+        IDs de los registros que contienen todos los trigramas del texto.
+        Devuelve None si el texto es demasiado corto para acotar la búsqueda.
+        """
+        grams = trigrams(text.lower())
+        if not grams:
+            return None
+        # Se intersecta empezando por el trigrama menos frecuente
+        postings = sorted((self._postings.get(gram, set()) for gram in grams), key=len)
+        result = set(postings[0])
+        for ids in postings[1:]:
+            if not result:
+                break
+            result &= ids
+        return result
+
+    def matches(self, record: Dict[str, Any], text: str) -> bool:
+        """Verificación final: el texto aparece tal cual en alguno de los campos"""
+        text = text.lower()
+        return any(text in str(record.get(field) or "").lower() for field in self.fields)
+
+    def memory_usage(self) -> Dict[str, int]:
+        """Tamaño aproximado del índice en memoria"""
+        size = sys.getsizeof(self._postings)
+        for gram, ids in self._postings.items():
+            size += sys.getsizeof(gram) + sys.getsizeof(ids)
+        return {
+            "trigrams": len(self._postings),
+            "postings": sum(len(ids) for ids in self._postings.values()),
+            "bytes": size,
+        }
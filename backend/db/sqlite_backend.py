@@ -0,0 +1,822 @@
+"""
+Backend SQLite para el ORM: misma API que CSVModel sobre una tabla de una base embebida
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import types
+from contextlib import contextmanager
+from itertools import islice
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    Type,
+    Union,
+    get_args,
+    get_origin,
+)
+from pydantic import BaseModel
+from libs.utils import generate_id
+from db.columnar import ColumnarIndex, Condition
+from db.indexes import Selector, SortedIndex, UniqueConstraintError, ViewIndex
+from db.locks import ReadWriteLock
+from db.query import Query, QueryPlan
+from db.records import apply_changes, new_record, typed_record
+from db.search import FullTextIndex, TrigramIndex
+from db.transaction import current_transaction
+
+# Ajuste de 'synchronous' de SQLite para cada nivel de durabilidad del ORM
+SYNCHRONOUS = {"none": "OFF", "flush": "NORMAL", "fsync": "FULL", "group": "FULL"}
+# Máximo de parámetros por consulta al buscar varios IDs
+MAX_VARIABLES = 500
+
+
+def _column_type(annotation: Any) -> str:
+    """Tipo de columna de SQLite para la anotación de un campo del modelo"""
+    # Optional[X], Union[X, None] y X | None se resuelven al tipo X
+    args = [arg for arg in get_args(annotation) if arg is not type(None)]
+    if get_origin(annotation) in (Union, types.UnionType) and len(args) == 1:
+        annotation = args[0]
+    if get_origin(annotation) is Literal:
+        return "TEXT"
+    if annotation is bool:
+        # Afinidad numérica: se guarda como 0/1 y se devuelve como bool
+        return "BOOLEAN"
+    if annotation is int:
+        return "INTEGER"
+    if annotation is float:
+        return "REAL"
+    if annotation in (list, dict) or get_origin(annotation) in (list, dict):
+        # Listas y diccionarios se guardan serializados como JSON
+        return "JSON"
+    # Cadenas y tipos que Pydantic vuelca como cadena (EmailStr, fechas...)
+    return "TEXT"
+
+
+class SQLiteModel:
+    """Modelo almacenado en una tabla de SQLite con la misma API que CSVModel"""
+
+    # Conexión por base de datos y por hilo, compartida por todos los modelos de esa base
+    # para que una transacción del ORM sobre varias tablas sea una sola transacción SQLite
+    _connections: Dict[str, threading.local] = {}
+    # Cerrojo de escritura por base de datos dentro del proceso
+    _database_locks: Dict[str, threading.RLock] = {}
+    # Cerrojo lector/escritor por tabla que protege los índices derivados en memoria
+    _table_locks: Dict[str, ReadWriteLock] = {}
+
+    def __init__(
+        self,
+        model_class: Type[BaseModel],
+        csv_file: str,
+        database: str = "db/data/app.db",
+        indexes: Optional[List[str]] = None,
+        unique: Optional[List[str]] = None,
+        durability: str = "flush",
+        sorted_indexes: Optional[Dict[str, List[str]]] = None,
+        views: Optional[Dict[str, Callable[[Dict[str, Any]], Optional[Hashable]]]] = None,
+        text_indexes: Optional[Dict[str, Dict[str, float]]] = None,
+        substring_indexes: Optional[List[List[str]]] = None,
+        typed: bool = False,
+        columnar: Optional[Dict[str, str]] = None,
+    ):
+        if durability not in SYNCHRONOUS:
+            raise ValueError(f"Nivel de durabilidad '{durability}' no soportado")
+        self.model_class = model_class
+        self.csv_file = csv_file
+        self.database = database
+        self.durability = durability
+        # Con typed=True las lecturas devuelven instancias del modelo en lugar de dicts
+        self.typed = typed
+        # La tabla toma el nombre del archivo CSV equivalente ("eventos.csv" -> eventos)
+        self.table = os.path.splitext(os.path.basename(csv_file))[0]
+        self.full_path = f"{database}#{self.table}"
+        self._fields = list(model_class.model_fields)
+        self._types = {
+            name: _column_type(field.annotation) for name, field in model_class.model_fields.items()
+        }
+        # Índices SQL: los declarados al registrar y los marcados en el propio modelo
+        self._unique = list(unique or []) + self._marked_fields("unique")
+        self._indexed = list(indexes or []) + self._marked_fields("index")
+
+        # Índices derivados en memoria, los mismos que usa CSVModel
+        self._sorted_indexes = {
+            name: SortedIndex(fields) for name, fields in (sorted_indexes or {}).items()
+        }
+        self._views = {name: ViewIndex(partition) for name, partition in (views or {}).items()}
+        self._text_indexes = {
+            name: FullTextIndex(fields) for name, fields in (text_indexes or {}).items()
+        }
+        self._substring_indexes = {
+            tuple(fields): TrigramIndex(fields) for fields in substring_indexes or []
+        }
+        self._columnar = ColumnarIndex(columnar) if columnar else None
+        # Versión de la tabla con la que se construyeron los índices derivados
+        self._derived_version: Optional[int] = None
+        self._rwlock = SQLiteModel._table_locks.setdefault(self.full_path, ReadWriteLock())
+        self._local = SQLiteModel._connections.setdefault(database, threading.local())
+        self._database_lock = SQLiteModel._database_locks.setdefault(database, threading.RLock())
+
+        # Sentencias preparadas: sqlite3 las compila una vez y las reutiliza desde su caché
+        columns = ", ".join(f'"{name}"' for name in self._fields)
+        self._select = f'SELECT rowid, {columns} FROM "{self.table}"'
+        self._insert = (
+            f'INSERT INTO "{self.table}" ({columns}) VALUES ({", ".join("?" * len(self._fields))})'
+        )
+        assignments = ", ".join(f'"{name}" = ?' for name in self._fields)
+        self._update = f'UPDATE "{self.table}" SET {assignments} WHERE rowid = ?'
+        self._ensure_table()
+
+    def _marked_fields(self, flag: str) -> List[str]:
+        """Campos del modelo marcados con json_schema_extra={flag: True}"""
+        return [
+            name
+            for name, field in self.model_class.model_fields.items()
+            if isinstance(field.json_schema_extra, dict) and field.json_schema_extra.get(flag)
+        ]
+
+    def _connection(self) -> sqlite3.Connection:
+        """Conexión del hilo actual a la base de datos"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            os.makedirs(os.path.dirname(self.database) or ".", exist_ok=True)
+            # Sin transacciones implícitas: las escrituras abren la suya con BEGIN IMMEDIATE
+            connection = sqlite3.connect(self.database, timeout=30, isolation_level=None)
+            # WAL permite lectores concurrentes mientras hay un escritor
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(f"PRAGMA synchronous={SYNCHRONOUS[self.durability]}")
+            self._local.connection = connection
+        return connection
+
+    def _ensure_table(self):
+        """Crea la tabla, sus columnas nuevas y sus índices si no existen"""
+        with self._write() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS _orm_versions (name TEXT PRIMARY KEY, version INTEGER)"
+            )
+            exists = connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (self.table,)
+            ).fetchone()
+            definitions = [
+                f'"{name}" {self._types[name]}' + (" PRIMARY KEY" if name == "id" else "")
+                for name in self._fields
+            ]
+            connection.execute(
+                f'CREATE TABLE IF NOT EXISTS "{self.table}" ({", ".join(definitions)})'
+            )
+            # Campos agregados al modelo después de crear la tabla
+            present = {row[1] for row in connection.execute(f'PRAGMA table_info("{self.table}")')}
+            for name in self._fields:
+                if name not in present:
+                    connection.execute(
+                        f'ALTER TABLE "{self.table}" ADD COLUMN "{name}" {self._types[name]}'
+                    )
+            for name in self._indexed:
+                connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS "idx_{self.table}_{name}" '
+                    f'ON "{self.table}" ("{name}")'
+                )
+            for name in self._unique:
+                connection.execute(
+                    f'CREATE UNIQUE INDEX IF NOT EXISTS "uq_{self.table}_{name}" '
+                    f'ON "{self.table}" ("{name}")'
+                )
+            # Los índices ordenados también en SQL: los rangos y ORDER BY de query() los usan
+            for name, index in self._sorted_indexes.items():
+                columns = ", ".join(f'"{field}"' for field in (*index.fields, "id"))
+                connection.execute(
+                    f'CREATE INDEX IF NOT EXISTS "sorted_{self.table}_{name}" '
+                    f'ON "{self.table}" ({columns})'
+                )
+            connection.execute(
+                "INSERT OR IGNORE INTO _orm_versions (name, version) VALUES (?, 0)", (self.table,)
+            )
+            if not exists:
+                self._import_csv(connection)
+
+    def _import_csv(self, connection: sqlite3.Connection):
+        """Copia a una tabla nueva los registros del CSV equivalente, si existe"""
+        from db.ORMcsv import CSVModel
+
+        if not os.path.exists(os.path.join("db/data", self.csv_file)):
+            return
+        for record in CSVModel(self.model_class, self.csv_file).iter_all():
+            connection.execute(self._insert, self._to_row(record))
+
+    # ====== Conversión de valores ======
+
+    def _to_row(self, record: Dict[str, Any]) -> List[Any]:
+        """Valores de las columnas de un registro"""
+        values: List[Any] = []
+        for name in self._fields:
+            value = record.get(name)
+            if value == "":
+                # Como en el CSV, una cadena vacía se guarda como valor ausente
+                value = None
+            elif value is not None and self._types[name] == "JSON":
+                value = json.dumps(value)
+            values.append(value)
+        return values
+
+    def _from_row(self, row: Tuple[Any, ...]) -> Dict[str, Any]:
+        """Registro a partir de una fila 'rowid, columnas...'"""
+        record: Dict[str, Any] = {}
+        for name, value in zip(self._fields, row[1:]):
+            if value is not None and self._types[name] == "JSON":
+                value = json.loads(value)
+            elif value is not None and self._types[name] == "BOOLEAN":
+                value = bool(value)
+            record[name] = value
+        return record
+
+    # ====== Escrituras ======
+
+    @contextmanager
+    def _write(self) -> Iterator[sqlite3.Connection]:
+        """Transacción de escritura sobre la tabla, o la de la transacción del ORM activa"""
+        transaction = current_transaction()
+        if transaction is not None:
+            # Dentro de una transacción del ORM se confirma al terminar la transacción
+            transaction.enlist(self)
+            transaction.stage(self)
+            connection = self._connection()
+            # Un punto de guardado deshace solo esta escritura si falla a medias
+            connection.execute("SAVEPOINT orm_write")
+            try:
+                yield connection
+                self._bump_version()
+            except BaseException:
+                connection.execute("ROLLBACK TO orm_write")
+                self._derived_version = None
+                raise
+            finally:
+                connection.execute("RELEASE orm_write")
+            return
+        with self._write_lock() as connection:
+            yield connection
+            self._bump_version()
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[sqlite3.Connection]:
+        """Abre una transacción de escritura, o se une a la ya abierta en la conexión del hilo"""
+        with self._database_lock, self._rwlock.write():
+            connection = self._connection()
+            owner = not connection.in_transaction
+            if owner:
+                connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                if owner and connection.in_transaction:
+                    connection.execute("ROLLBACK")
+                # Los índices derivados pudieron quedar con cambios deshechos
+                self._derived_version = None
+                raise
+            if owner and connection.in_transaction:
+                connection.execute("COMMIT")
+
+    def _bump_version(self):
+        """Anota un cambio en la tabla; los índices derivados al día avanzan con ella"""
+        connection = self._connection()
+        previous = self._table_version(connection)
+        connection.execute(
+            "UPDATE _orm_versions SET version = version + 1 WHERE name = ?", (self.table,)
+        )
+        if self._derived_version is not None and self._derived_version == previous:
+            self._derived_version = previous + 1
+        else:
+            self._derived_version = None
+
+    def _table_version(self, connection: sqlite3.Connection) -> int:
+        """Contador de cambios de la tabla, compartido por todos los procesos"""
+        row = connection.execute(
+            "SELECT version FROM _orm_versions WHERE name = ?", (self.table,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def _derived(self) -> List[Any]:
+        """Índices derivados en memoria que se actualizan con cada escritura"""
+        return [
+            *self._sorted_indexes.values(),
+            *self._views.values(),
+            *self._text_indexes.values(),
+            *self._substring_indexes.values(),
+            *([self._columnar] if self._columnar else []),
+        ]
+
+    def _derived_changes(
+        self, changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]]
+    ):
+        """Aplica cambios (anterior, nuevo) a los índices derivados si están al día"""
+        if self._derived_version is None or self._derived_version != self._table_version(
+            self._connection()
+        ):
+            # Otro proceso cambió la tabla: se reconstruirán en la próxima consulta
+            self._derived_version = None
+            return
+        for index in self._derived():
+            for previous, record in changes:
+                if previous is not None:
+                    index.remove(str(previous.get("id")), previous)
+                if record is not None:
+                    index.add(str(record.get("id")), record)
+
+    def _execute_unique(
+        self, connection: sqlite3.Connection, sql: str, params: List[Any], record: Dict[str, Any]
+    ):
+        """Ejecuta una escritura traduciendo las violaciones de unicidad a UniqueConstraintError"""
+        try:
+            connection.execute(sql, params)
+        except sqlite3.IntegrityError as e:
+            # Mensaje de SQLite: "UNIQUE constraint failed: tabla.campo"
+            message = str(e)
+            if not message.startswith("UNIQUE constraint failed"):
+                raise
+            field = message.rsplit(".", 1)[-1]
+            raise UniqueConstraintError(field, record.get(field)) from e
+
+    def create(self, data: Union[Dict[str, Any], BaseModel]) -> Dict[str, Any]:
+        """Crea un nuevo registro a partir de un dict o de una instancia ya validada"""
+        return self.create_many([data])[0]
+
+    def create_many(self, items: List[Union[Dict[str, Any], BaseModel]]) -> List[Dict[str, Any]]:
+        """Crea varios registros en una sola transacción"""
+        created: List[Dict[str, Any]] = []
+        for data in items:
+            # Generar ID automático como string y validar con Pydantic una sola vez
+            created.append(new_record(self.model_class, data, generate_id()))
+        if not created:
+            return []
+        with self._write() as connection:
+            for record in created:
+                self._execute_unique(connection, self._insert, self._to_row(record), record)
+            self._derived_changes([(None, self._normalize(record)) for record in created])
+        return [self._public(record) for record in created]
+
+    def _normalize(self, record: Dict[str, Any]) -> Dict[str, Any]:
+        """Registro tal como se leerá de la tabla"""
+        return self._from_row((None, *self._to_row(record)))
+
+    def _select_rows(
+        self, connection: sqlite3.Connection, selector: Selector
+    ) -> List[Tuple[Any, ...]]:
+        """Filas elegidas por IDs o por un predicado, en orden de inserción"""
+        if callable(selector):
+            rows = connection.execute(f"{self._select} ORDER BY rowid")
+            return [row for row in rows if selector(self._from_row(row))]
+        ids = list(dict.fromkeys(str(record_id) for record_id in selector))
+        rows: List[Tuple[Any, ...]] = []
+        for start in range(0, len(ids), MAX_VARIABLES):
+            chunk = ids[start : start + MAX_VARIABLES]
+            placeholders = ", ".join("?" * len(chunk))
+            rows.extend(
+                connection.execute(f"{self._select} WHERE id IN ({placeholders})", chunk)
+            )
+        return sorted(rows, key=lambda row: row[0])
+
+    def update_by_id(
+        self, record_id: Union[int, str], data: Dict[str, Any]
+    ) -> Optional[Dict[str, Any]]:
+        """Actualiza un registro por ID"""
+        updated = self.update_many([record_id], data)
+        return updated[0] if updated else None
+
+    def update_many(self, selector: Selector, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Aplica los mismos cambios a los registros elegidos en una sola transacción"""
+        with self._write() as connection:
+            updated: List[Dict[str, Any]] = []
+            changes: List[Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]] = []
+            for row in self._select_rows(connection, selector):
+                previous = self._from_row(row)
+                # Actualizar solo los campos proporcionados, validando únicamente esos
+                record = apply_changes(self.model_class, previous, data)
+                self._execute_unique(
+                    connection, self._update, [*self._to_row(record), row[0]], record
+                )
+                updated.append(record)
+                changes.append((previous, self._normalize(record)))
+            self._derived_changes(changes)
+        return [self._public(record) for record in updated]
+
+    def delete_by_id(self, record_id: Union[int, str]) -> bool:
+        """Elimina un registro por ID"""
+        return self.delete_many([record_id]) > 0
+
+    def delete_many(self, selector: Selector) -> int:
+        """Elimina los registros elegidos y devuelve cuántos borró"""
+        with self._write() as connection:
+            rows = self._select_rows(connection, selector)
+            connection.executemany(
+                f'DELETE FROM "{self.table}" WHERE rowid = ?', [(row[0],) for row in rows]
+            )
+            self._derived_changes([(self._from_row(row), None) for row in rows])
+        return len(rows)
+
+    # ====== Transacciones del ORM ======
+
+    def _prepare_commit(self, suffix: str) -> None:
+        """SQLite confirma su propia transacción: no hay archivo que preparar"""
+        return None
+
+    def _finish_transaction(self):
+        """Confirma la transacción SQLite abierta por la transacción del ORM"""
+        connection = self._connection()
+        if connection.in_transaction:
+            connection.execute("COMMIT")
+
+    def invalidate_cache(self):
+        """Descarta los cambios sin confirmar y los índices derivados"""
+        connection = self._connection()
+        if connection.in_transaction:
+            connection.execute("ROLLBACK")
+        self._derived_version = None
+
+    # ====== Lecturas ======
+
+    def _public(self, record: Dict[str, Any]) -> Any:
+        """Registro para el llamador: dict o, con typed=True, instancia del modelo"""
+        return typed_record(self.model_class, record) if self.typed else record
+
+    def iter_all(self) -> Iterator[Dict[str, Any]]:
+        """Recorre los registros uno a uno sin materializar la tabla completa"""
+        return map(self._public, self._iter_records())
+
+    def _iter_records(self) -> Iterator[Dict[str, Any]]:
+        """Recorre los registros como dicts, en orden de inserción"""
+        for row in self._connection().execute(f"{self._select} ORDER BY rowid"):
+            yield self._from_row(row)
+
+    def find_all(self) -> List[Dict[str, Any]]:
+        """Obtiene todos los registros"""
+        return list(self.iter_all())
+
+    def iter_where(self, predicate: Callable[[Dict[str, Any]], bool]) -> Iterator[Dict[str, Any]]:
+        """Recorre perezosamente los registros que cumplen el predicado"""
+        return (self._public(record) for record in self._iter_records() if predicate(record))
+
+    def find_where(
+        self, predicate: Callable[[Dict[str, Any]], bool], limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Busca registros que cumplen el predicado, deteniéndose tras los primeros 'limit'"""
+        return list(islice(self.iter_where(predicate), limit))
+
+    def find_by_id(self, record_id: Union[int, str]) -> Optional[Dict[str, Any]]:
+        """Busca un registro por ID"""
+        row = (
+            self._connection()
+            .execute(f"{self._select} WHERE id = ?", (str(record_id),))
+            .fetchone()
+        )
+        return self._public(self._from_row(row)) if row else None
+
+    def find_by_ids(self, record_ids: List[Union[int, str]]) -> Dict[str, Dict[str, Any]]:
+        """Busca varios registros por ID; los que no existen se omiten"""
+        found = self._records_by_ids(record_ids)
+        return {record_id: self._public(record) for record_id, record in found.items()}
+
+    def _records_by_ids(self, record_ids: List[Union[int, str]]) -> Dict[str, Dict[str, Any]]:
+        """Registros con los IDs dados, como dicts"""
+        rows = self._select_rows(self._connection(), record_ids)
+        return {str(row[1 + self._fields.index("id")]): self._from_row(row) for row in rows}
+
+    def find_by_field(self, field: str, value: Any) -> List[Dict[str, Any]]:
+        """Busca registros por un campo específico"""
+        if field not in self._types or isinstance(value, (dict, list)):
+            return list(self.iter_where(lambda r: r.get(field) == value))
+        if value is None:
+            sql, params = f'{self._select} WHERE "{field}" IS NULL ORDER BY rowid', ()
+        else:
+            sql, params = f'{self._select} WHERE "{field}" = ? ORDER BY rowid', (value,)
+        rows = self._connection().execute(sql, params)
+        return [self._public(self._from_row(row)) for row in rows]
+
+    def find_one_by_field(self, field: str, value: Any) -> Optional[Dict[str, Any]]:
+        """Busca un solo registro por un campo específico"""
+        results = self.find_by_field(field, value)
+        return results[0] if results else None
+
+    def count(self) -> int:
+        """Cuenta el total de registros"""
+        return self._connection().execute(f'SELECT COUNT(*) FROM "{self.table}"').fetchone()[0]
+
+    def paginate(self, page: int = 1, per_page: int = 10) -> Dict[str, Any]:
+        """Paginación de registros"""
+        total = self.count()
+        start = (page - 1) * per_page
+        end = start + per_page
+        rows = self._connection().execute(
+            f"{self._select} ORDER BY rowid LIMIT ? OFFSET ?",
+            (max(end, 0) - max(start, 0), max(start, 0)),
+        )
+        return {
+            "data": [self._public(self._from_row(row)) for row in rows],
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
+
+    # ====== Consultas componibles ======
+
+    def query(self) -> Query:
+        """Consulta componible sobre el modelo, compilada a SQL"""
+        return Query(self)
+
+    def _condition_sql(self, condition: Condition) -> Optional[Tuple[str, List[Any]]]:
+        """
+        Traduce una condición a SQL con la semántica de la comparación de Python: eq y ne
+        tratan NULL como un valor más. Devuelve None si debe evaluarse en Python.
+        """
+        field, op, value = condition
+        values = list(value) if op in ("in", "nin") else [value]
+        if self._types.get(field) in (None, "JSON"):
+            return None
+        if any(isinstance(item, (dict, list, set)) for item in values):
+            return None
+        column = f'"{field}"'
+        if op in ("eq", "ne"):
+            return f"{column} {'IS' if op == 'eq' else 'IS NOT'} ?", values
+        if op in ("in", "nin"):
+            present = [item for item in values if item is not None]
+            listed = f"({', '.join('?' * len(present))})"
+            if op == "in":
+                parts = [f"{column} IN {listed}"] if present else []
+                if None in values:
+                    parts.append(f"{column} IS NULL")
+                return (f"({' OR '.join(parts)})" if parts else "0"), present
+            # NOT IN con un NULL daría NULL: los vacíos se incluyen o excluyen explícitamente
+            parts = [f"{column} NOT IN {listed}"] if present else []
+            if None in values:
+                return " AND ".join([*parts, f"{column} IS NOT NULL"]), present
+            return (f"({column} IS NULL OR {parts[0]})" if parts else "1"), present
+        symbol = {"gt": ">", "gte": ">=", "lt": "<", "lte": "<="}[op]
+        # Como en Python, los vacíos no cumplen los rangos: NULL no compara
+        return f"{column} {symbol} ?", values
+
+    def _plan_query(self, query: Query) -> QueryPlan:
+        """
+        Compila la consulta a una sentencia SQL; lo que SQL no resuelve (condiciones sobre
+        campos JSON, vistas y cursores) queda como residuo
+        """
+        clauses: List[str] = []
+        params: List[Any] = []
+        residual: List[Condition] = []
+        for condition in query.conditions:
+            compiled = self._condition_sql(condition)
+            if compiled is None:
+                residual.append(condition)
+            else:
+                clauses.append(compiled[0])
+                params.extend(compiled[1])
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        # Vacíos primero en orden ascendente y desempate por ID, como sort_records
+        ordered = all(self._types.get(field) not in (None, "JSON") for field, _ in query.ordering)
+        if query.ordering and ordered:
+            keys = [f'"{field}"{" DESC" if desc else ""}' for field, desc in query.ordering]
+            order = f" ORDER BY {', '.join(keys)}, \"id\""
+        else:
+            order = " ORDER BY rowid"
+        sliced = ordered and not residual and not query.views and query.cursor is None
+        limit = ""
+        limit_params: List[Any] = []
+        if sliced and (query.offset_value or query.limit_value is not None):
+            limit = " LIMIT ? OFFSET ?"
+            limit_params = [-1 if query.limit_value is None else query.limit_value]
+            limit_params.append(query.offset_value)
+        sql = f"{self._select}{where}{order}{limit}"
+        sql_params = params + limit_params
+
+        def fetch() -> Iterator[Dict[str, Any]]:
+            for row in self._connection().execute(sql, sql_params):
+                yield self._from_row(row)
+
+        def count() -> int:
+            count_sql = f'SELECT COUNT(*) FROM "{self.table}"{where}'
+            return self._connection().execute(count_sql, params).fetchone()[0]
+
+        def describe() -> Dict[str, Any]:
+            steps = self._connection().execute(f"EXPLAIN QUERY PLAN {sql}", sql_params)
+            return {"steps": [step[-1] for step in steps]}
+
+        return QueryPlan(
+            "sql",
+            fetch,
+            residual,
+            ordered=ordered,
+            sliced=sliced,
+            count=count,
+            views=list(query.views),
+            describe=describe,
+            sql=sql,
+        )
+
+    # ====== Consultas sobre índices derivados ======
+
+    def _ensure_derived(self):
+        """Reconstruye los índices derivados si la tabla cambió desde que se construyeron"""
+        connection = self._connection()
+        if self._derived_version is not None and self._derived_version == self._table_version(
+            connection
+        ):
+            return
+        with self._rwlock.write():
+            # Versión y filas se leen en una misma transacción de lectura
+            owner = not connection.in_transaction
+            if owner:
+                connection.execute("BEGIN")
+            try:
+                version = self._table_version(connection)
+                indexes = self._derived()
+                for index in indexes:
+                    index.clear()
+                for row in connection.execute(f"{self._select} ORDER BY rowid"):
+                    record = self._from_row(row)
+                    for index in indexes:
+                        index.add(str(record.get("id")), record)
+            finally:
+                if owner:
+                    connection.execute("COMMIT")
+            self._derived_version = version
+
+    def _ordered(self, record_ids: List[str]) -> List[Dict[str, Any]]:
+        """Registros con los IDs dados, en el mismo orden"""
+        found = self._records_by_ids(record_ids)
+        return [found[record_id] for record_id in record_ids if record_id in found]
+
+    def find_after(
+        self,
+        index_name: str,
+        cursor: Optional[str] = None,
+        limit: int = 10,
+        predicate: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Paginación por clave: devuelve hasta 'limit' registros tras el cursor y el siguiente"""
+        if index_name not in self._sorted_indexes:
+            raise ValueError(f"Índice ordenado '{index_name}' no registrado")
+        index = self._sorted_indexes[index_name]
+        after = index.decode_cursor(cursor) if cursor else None
+
+        results: List[Dict[str, Any]] = []
+        self._ensure_derived()
+        with self._rwlock.read():
+            ids = index.ids_after(after)
+            try:
+                # Se leen lotes del tamaño de la página hasta tener un registro de más
+                while len(results) <= limit:
+                    batch = list(islice(ids, max(limit, 1)))
+                    if not batch:
+                        break
+                    for record in self._ordered(batch):
+                        if predicate is None or predicate(record):
+                            results.append(record)
+            except TypeError as e:
+                raise ValueError("Cursor inválido") from e
+
+        if len(results) <= limit:
+            return [self._public(record) for record in results], None
+        results = results[:limit]
+        last = results[-1]
+        cursor = index.encode_cursor(index.key(str(last.get("id")), last))
+        return [self._public(record) for record in results], cursor
+
+    def find_in_view(
+        self,
+        view_name: str,
+        partitions: List[Hashable],
+        offset: int = 0,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Obtiene en orden de inserción los registros de las particiones dadas de una vista"""
+        if view_name not in self._views:
+            raise ValueError(f"Vista '{view_name}' no registrada")
+        self._ensure_derived()
+        with self._rwlock.read():
+            return self._view_page(view_name, partitions, offset, limit)
+
+    def _view_page(
+        self, view_name: str, partitions: List[Hashable], offset: int, limit: Optional[int]
+    ) -> List[Dict[str, Any]]:
+        """Registros de una vista entre offset y offset + limit (con el cerrojo tomado)"""
+        stop = None if limit is None else max(offset + limit, 0)
+        ids = list(islice(self._views[view_name].ids(partitions), max(offset, 0), stop))
+        return [self._public(record) for record in self._ordered(ids)]
+
+    def paginate_view(
+        self, view_name: str, partitions: List[Hashable], page: int = 1, per_page: int = 10
+    ) -> Dict[str, Any]:
+        """Paginación sobre las particiones de una vista, con el mismo formato que paginate"""
+        if view_name not in self._views:
+            raise ValueError(f"Vista '{view_name}' no registrada")
+        self._ensure_derived()
+        with self._rwlock.read():
+            total = self._views[view_name].size(partitions)
+            data = self._view_page(view_name, partitions, (page - 1) * per_page, per_page)
+        return {
+            "data": data,
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
+
+    def _matching_ids(self, groups: List[List[Condition]]) -> List[str]:
+        """IDs que cumplen la consulta por columnas, en orden de inserción"""
+        if self._columnar is None:
+            raise ValueError("El modelo no tiene réplica por columnas")
+        self._ensure_derived()
+        with self._rwlock.read():
+            return self._columnar.select(groups)
+
+    def find_matching(
+        self, groups: List[List[Condition]], offset: int = 0, limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Registros que cumplen la consulta por columnas, como CSVModel.find_matching"""
+        stop = None if limit is None else max(offset + limit, 0)
+        ids = self._matching_ids(groups)[max(offset, 0) : stop]
+        return [self._public(record) for record in self._ordered(ids)]
+
+    def paginate_matching(
+        self, groups: List[List[Condition]], page: int = 1, per_page: int = 10
+    ) -> Dict[str, Any]:
+        """Paginación sobre find_matching, con el mismo formato que paginate"""
+        ids = self._matching_ids(groups)
+        total = len(ids)
+        start = (page - 1) * per_page
+        page_ids = ids[max(start, 0) : max(start + per_page, 0)]
+        return {
+            "data": [self._public(record) for record in self._ordered(page_ids)],
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
+
+    def _ranked_page(
+        self, rows: List[Tuple[Tuple[Any, ...], Any]], page: int, per_page: int
+    ) -> Dict[str, Any]:
+        """Página de filas ya ordenadas, con el mismo formato que paginate"""
+        total = len(rows)
+        start = (page - 1) * per_page
+        end = start + per_page
+        return {
+            "data": [
+                self._public(self._from_row(row)) for _, row in rows[max(start, 0) : max(end, 0)]
+            ],
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "pages": (total + per_page - 1) // per_page,
+        }
+
+    def search(
+        self, index_name: str, query: str, page: int = 1, per_page: int = 10
+    ) -> Dict[str, Any]:
+        """Búsqueda de texto ordenada por relevancia, con el mismo formato que paginate"""
+        if index_name not in self._text_indexes:
+            raise ValueError(f"Índice de texto '{index_name}' no registrado")
+        self._ensure_derived()
+        with self._rwlock.read():
+            scores = self._text_indexes[index_name].search(query)
+        rows = self._select_rows(self._connection(), list(scores))
+        id_column = 1 + self._fields.index("id")
+        # Mayor puntuación primero; a igualdad, el orden de inserción
+        ranked = sorted(((-scores[str(row[id_column])], row[0]), row) for row in rows)
+        return self._ranked_page(ranked, page, per_page)
+
+    def find_containing(
+        self, fields: List[str], text: str, page: int = 1, per_page: int = 10
+    ) -> Dict[str, Any]:
+        """Registros con el texto como subcadena (sin distinguir mayúsculas) en algún campo"""
+        index = self._substring_indexes.get(tuple(fields))
+        checker = index or TrigramIndex(fields)
+        candidates = None
+        if index is not None:
+            self._ensure_derived()
+            with self._rwlock.read():
+                candidates = index.candidates(text)
+        connection = self._connection()
+        if candidates is None:
+            # Sin índice, o con un texto de menos de tres caracteres, se recorre la tabla
+            rows = list(connection.execute(f"{self._select} ORDER BY rowid"))
+        else:
+            rows = self._select_rows(connection, list(candidates))
+        matches = [(row[0], row) for row in rows if checker.matches(self._from_row(row), text)]
+        return self._ranked_page(matches, page, per_page)
+
+    def index_stats(self) -> Dict[str, Dict[str, int]]:
+        """Tamaño en memoria de los índices de trigramas, por campos indexados"""
+        self._ensure_derived()
+        with self._rwlock.read():
+            return {
+                ",".join(fields): index.memory_usage()
+                for fields, index in self._substring_indexes.items()
+            }
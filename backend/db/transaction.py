@@ -0,0 +1,174 @@
+"""
+Transacciones que confirman juntas las escrituras sobre varios CSVModel
+"""
+
+import json
+import os
+import tempfile
+import threading
+from contextlib import ExitStack, contextmanager
+from typing import Any, Iterator, List, Optional, Tuple
+
+from db.journal import fsync_directory
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin cerrojos entre procesos
+    fcntl = None  # type: ignore
+
+# Marcador que indica que los archivos preparados de una transacción deben sustituir a
+# los originales; su existencia es el punto de confirmación
+COMMIT_MARKER = ".transaction.commit"
+# Sufijo de los archivos preparados por una transacción
+STAGED_SUFFIX = ".txn"
+# Cerrojo que serializa las confirmaciones y la recuperación entre procesos
+COMMIT_LOCK = ".transaction.lock"
+
+_local = threading.local()
+
+
+def current_transaction() -> Optional["Transaction"]:
+    """Transacción activa en el hilo actual, si la hay"""
+    return getattr(_local, "transaction", None)
+
+
+@contextmanager
+def _commit_lock(data_dir: str) -> Iterator[None]:
+    """Cerrojo exclusivo entre procesos para confirmar o recuperar transacciones"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(data_dir, exist_ok=True)
+    fd = os.open(os.path.join(data_dir, COMMIT_LOCK), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _roll_forward(data_dir: str) -> int:
+    """Sustituye los archivos listados en el marcador de confirmación y lo elimina"""
+    marker = os.path.join(data_dir, COMMIT_MARKER)
+    try:
+        with open(marker, "r", encoding="utf-8") as file:
+            files: List[Tuple[str, str]] = json.load(file)["files"]
+    except FileNotFoundError:
+        return 0
+    for staged, target in files:
+        # Tras una caída a mitad del renombrado, parte de los archivos ya están en su sitio
+        if os.path.exists(staged):
+            os.replace(staged, target)
+    fsync_directory(data_dir)
+    os.remove(marker)
+    return len(files)
+
+
+def recover_transactions(data_dir: str) -> int:
+    """
+    Completa al arrancar una transacción confirmada que quedó a medias y descarta los
+    archivos preparados de transacciones que no llegaron a confirmarse
+    """
+    if not os.path.isdir(data_dir):
+        return 0
+    with _commit_lock(data_dir):
+        recovered = _roll_forward(data_dir)
+        for name in os.listdir(data_dir):
+            if name.endswith(STAGED_SUFFIX):
+                os.remove(os.path.join(data_dir, name))
+    return recovered
+
+
+class Transaction:
+    """Agrupa las escrituras de un hilo sobre varios modelos y las confirma juntas"""
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        # Cerrojos exclusivos de los modelos alistados, retenidos hasta el final
+        self._locks = ExitStack()
+        self._models: List[Any] = []
+        self._staged: List[Any] = []
+
+    def enlist(self, model: Any):
+        """Bloquea el modelo en exclusiva hasta que la transacción termine"""
+        if any(m is model for m in self._models):
+            return
+        self._locks.enter_context(model._write_lock())
+        self._models.append(model)
+
+    def stage(self, model: Any):
+        """Anota un modelo cuya caché tiene cambios pendientes de escribir"""
+        if not any(m is model for m in self._staged):
+            self._staged.append(model)
+
+    def commit(self):
+        """Escribe los modelos modificados y los sustituye juntos"""
+        if not self._staged:
+            return
+        with _commit_lock(self.data_dir):
+            files: List[Tuple[str, str]] = []
+            try:
+                for model in self._staged:
+                    # Los modelos sobre archivos devuelven la versión preparada del archivo;
+                    # los que confirman por su cuenta (SQLite) no devuelven nada
+                    staged = model._prepare_commit(STAGED_SUFFIX)
+                    if staged is not None:
+                        files.append((staged, model.full_path))
+                if files:
+                    self._write_marker(files)
+            except Exception:
+                for staged, _ in files:
+                    if os.path.exists(staged):
+                        os.remove(staged)
+                raise
+            # Desde aquí la transacción está confirmada: si el proceso cae, la
+            # recuperación al arrancar termina de sustituir los archivos
+            _roll_forward(self.data_dir)
+        for model in self._staged:
+            model._finish_transaction()
+
+    def _write_marker(self, files: List[Tuple[str, str]]):
+        """Escribe el marcador de confirmación; se renombra para que exista completo o no exista"""
+        fd, temp_path = tempfile.mkstemp(prefix=".commit.", dir=self.data_dir)
+        with os.fdopen(fd, "w", encoding="utf-8") as file:
+            json.dump({"files": files}, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, os.path.join(self.data_dir, COMMIT_MARKER))
+        fsync_directory(self.data_dir)
+
+    def rollback(self):
+        """Descarta los cambios en memoria de los modelos alistados"""
+        for model in self._models:
+            model.invalidate_cache()
+
+    def close(self):
+        """Libera los cerrojos de los modelos alistados"""
+        self._locks.close()
+
+
+@contextmanager
+def open_transaction(data_dir: str, models: List[Any]) -> Iterator[Transaction]:
+    """Abre una transacción en el hilo actual, o se une a la que ya esté activa"""
+    active = current_transaction()
+    if active is not None:
+        # Las transacciones anidadas forman parte de la exterior
+        for model in models:
+            active.enlist(model)
+        yield active
+        return
+
+    current = Transaction(data_dir)
+    _local.transaction = current
+    try:
+        # Bloquear de entrada en un orden fijo evita bloqueos mutuos entre transacciones
+        for model in sorted(models, key=lambda m: m.full_path):
+            current.enlist(model)
+        yield current
+        current.commit()
+    except BaseException:
+        current.rollback()
+        raise
+    finally:
+        _local.transaction = None
+        current.close()
@@ -7,7 +7,7 @@ from libs.helpers import (
     ResponseType,
 )
 from models.usuario import Usuario
-from db.ORMcsv import orm
+from db.ORMcsv import UniqueConstraintError
 from db.database import get_user_model
 from flask import Blueprint, jsonify, request, Response
 from typing import Optional, Any
@@ -15,19 +15,18 @@ from typing import Optional, Any
 # Blueprint para autenticación
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/v1/auth")
 
-# Registrar modelos en el ORM
-orm.register_model("usuario", Usuario, "usuarios.csv")
+# Modelo de usuarios compartido con el resto de rutas: un solo registro y un solo juego
+# de índices únicos sobre usuarios.csv
+user_model = get_user_model()
 
 
 def find_user_by_email(email: str) -> Optional[dict[str, Any]]:
     """Busca un usuario por email en la base de datos CSV"""
-    user_model = get_user_model()
     return user_model.find_one_by_field("email", email)
 
 
 def find_user_by_username(username: str) -> Optional[dict[str, Any]]:
     """Busca un usuario por username en la base de datos CSV"""
-    user_model = get_user_model()
     return user_model.find_one_by_field("username", username)
 
 
@@ -116,8 +115,12 @@ def register(validated: Usuario) -> tuple[Response, int] | Response:
             "gener": validated.gener,
         }
 
-        user_model = get_user_model()
-        created_user = user_model.create(user_data)
+        try:
+            created_user = user_model.create(user_data)
+        except UniqueConstraintError as conflict:
+            # Otro registro concurrente ocupó el email o el username tras la comprobación previa
+            message = f"Ya existe un usuario con este {conflict.field}"
+            return jsonify({"type": ResponseType.ERROR, "message": message}), 400
 
         token_data: dict[str, Any] = {
             "id": created_user["id"],
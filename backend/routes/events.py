@@ -1,7 +1,9 @@
+from datetime import date
 from flask import Blueprint, jsonify, request, Response
 from typing import Any
+from db.database import EVENT_SEARCH_FIELDS, get_event_model, visibility_groups
 from db.ORMcsv import orm
-from models.evento import Evento, Category, Favorite
+from models.evento import Category, Evento, Favorite
 from libs.helpers import (
     validate,
     auth_required,
@@ -12,13 +14,15 @@ from libs.helpers import (
 # Blueprint para events
 events_bp = Blueprint("events", __name__, url_prefix="/api/v1/events")
 
-# Registrar modelos en el ORM
-orm.register_model("event", Evento, "eventos.csv")
+# Filtros por igualdad que admite el listado de eventos
+LIST_FILTERS = ["country", "city", "category_id"]
+
+# Registrar modelos en el ORM (eventos, con sus índices, en db/database.py)
 orm.register_model("category", Category, "categories.csv")
-orm.register_model("favorite", Favorite, "favorites.csv")
+orm.register_model("favorite", Favorite, "favorites.csv", indexes=["user_id", "event_id"])
 
 # Obtener instancias del ORM
-evento_model = orm.get_model("event")
+evento_model = get_event_model()
 category_model = orm.get_model("category")
 favorite_model = orm.get_model("favorite")
 
@@ -26,32 +30,33 @@ favorite_model = orm.get_model("favorite")
 # ====== FUNCIONES HELPER PARA SOFT DELETE ======
 
 
-def filter_active_events(
-    events: list[dict[str, Any]], include_archived: bool = False
-) -> list[dict[str, Any]]:
-    """
-    Filtrar eventos según su status (soft delete).
-    PRIORIDAD:
-    1. deleted -> NUNCA se muestra
-    2. archived -> Solo si include_archived=True
-    3. activo (sin status) -> Siempre se muestra
-    """
-    filtered_events: list[dict[str, Any]] = []
-    for event in events:
-        status: str | None = event.get("status")
-
-        # PRIORIDAD 1: Nunca mostrar eventos eliminados
-        if status == "deleted":
-            continue
-
-        # PRIORIDAD 2: Solo mostrar archivados si se solicita explícitamente
-        if status == "archived" and not include_archived:
-            continue
+def visible_partitions(
+    user_id: str | None, include_archived: bool = False
+) -> list[tuple[str, ...]]:
+    """Particiones de la vista de visibilidad que puede listar el usuario"""
+    states = ["active", "archived"] if include_archived else ["active"]
+    return [partition for partition, _ in visibility_groups(user_id, states)]
 
-        # PRIORIDAD 3: Mostrar eventos activos (sin status o con otro valor)
-        filtered_events.append(event)
 
-    return filtered_events
+def date_range_lookups(args: Any) -> dict[str, str]:
+    """
+    Condiciones de fecha del listado (date_from, date_to y upcoming=true) para where.
+    Lanza ValueError si una fecha no tiene formato YYYY-MM-DD.
+    """
+    lookups: dict[str, str] = {}
+    for param, lookup in (("date_from", "date__gte"), ("date_to", "date__lte")):
+        if args.get(param):
+            # Se comparan como texto con el índice ordenado: solo vale la forma YYYY-MM-DD
+            # exacta, no las demás que fromisoformat acepta (20240105, 2024-W01-1)
+            value = date.fromisoformat(args[param]).isoformat()
+            if value != args[param]:
+                raise ValueError(f"Fecha inválida: {args[param]!r}")
+            lookups[lookup] = value
+    if args.get("upcoming", "false").lower() == "true":
+        # Próximos: desde hoy, incluidos los eventos de hoy
+        today = date.today().isoformat()
+        lookups["date__gte"] = max(lookups.get("date__gte", today), today)
+    return lookups
 
 
 def get_event_with_status_check(
@@ -98,6 +103,36 @@ def get_events(user: dict[str, Any] | None) -> tuple[Response, int] | Response:
         in: query
         type: boolean
         description: Incluir eventos archivados en los resultados.
+      - name: cursor
+        in: query
+        type: string
+        description: >
+          Cursor opaco de paginación por clave (orden fecha, hora, id). Enviarlo vacío
+          para la primera página y luego el valor de pagination.next_cursor.
+      - name: country
+        in: query
+        type: string
+        description: Solo eventos de este país.
+      - name: city
+        in: query
+        type: string
+        description: Solo eventos de esta ciudad.
+      - name: category_id
+        in: query
+        type: string
+        description: Solo eventos de esta categoría.
+      - name: date_from
+        in: query
+        type: string
+        description: Solo eventos desde esta fecha (YYYY-MM-DD), ordenados por fecha y hora.
+      - name: date_to
+        in: query
+        type: string
+        description: Solo eventos hasta esta fecha (YYYY-MM-DD), ordenados por fecha y hora.
+      - name: upcoming
+        in: query
+        type: boolean
+        description: Solo eventos de hoy en adelante, ordenados por fecha y hora.
     responses:
       200:
         description: Una lista de eventos.
@@ -117,37 +152,63 @@ def get_events(user: dict[str, Any] | None) -> tuple[Response, int] | Response:
         page: int = request.args.get("page", 1, type=int)
         per_page: int = request.args.get("per_page", 100, type=int)
         include_archived: bool = request.args.get("include_archived", "false").lower() == "true"
+        user_id: str | None = user.get("id") if user else None
+        filters: dict[str, Any] = {
+            field: request.args[field] for field in LIST_FILTERS if request.args.get(field)
+        }
+        try:
+            date_range = date_range_lookups(request.args)
+        except ValueError:
+            return jsonify(
+                {"type": ResponseType.ERROR, "message": "Fecha inválida, use YYYY-MM-DD"}
+            ), 400
 
-        all_events: list[dict[str, Any]] = evento_model.find_all()
-        active_events: list[dict[str, Any]] = filter_active_events(
-            all_events, include_archived=include_archived
+        # Una sola consulta para todas las combinaciones: el planificador elige entre la vista
+        # de visibilidad (un anónimo nunca recorre eventos que no sean públicos), los índices
+        # de los filtros y el rango de fechas del índice (fecha, hora, id), el más selectivo
+        query = (
+            evento_model.query()
+            .in_view("visibility", visible_partitions(user_id, include_archived))
+            .where(**filters, **date_range)
         )
 
-        visible_events: list[dict[str, Any]] = []
-        user_id: str | None = user.get("id") if user else None
+        if "cursor" in request.args:
+            # Paginación por cursor: solo se leen los eventos posteriores al cursor
+            try:
+                page_events, next_cursor = query.after(
+                    "date", request.args.get("cursor") or None
+                ).page_after(max(per_page, 1))
+            except ValueError:
+                return jsonify({"type": ResponseType.ERROR, "message": "Cursor inválido"}), 400
 
-        for event in active_events:
-            if event.get("visibility") == "public":
-                visible_events.append(event)
-            elif user_id and str(event.get("user_id")) == str(user_id):
-                if event.get("visibility") in ["private", "only_me"]:
-                    visible_events.append(event)
+            return jsonify(
+                {
+                    "type": ResponseType.SUCCESS,
+                    "message": "Eventos obtenidos exitosamente",
+                    "data": page_events,
+                    "pagination": {
+                        "per_page": per_page,
+                        "next_cursor": next_cursor,
+                        "has_more": next_cursor is not None,
+                    },
+                }
+            )
 
-        total: int = len(visible_events)
-        start_idx: int = (page - 1) * per_page
-        end_idx: int = start_idx + per_page
-        paginated_events: list[dict[str, Any]] = visible_events[start_idx:end_idx]
+        if date_range:
+            # Con un rango de fechas el listado se ordena por fecha y hora
+            query = query.order_by("date", "time")
+        result: dict[str, Any] = query.paginate(page=page, per_page=per_page)
 
         return jsonify(
             {
                 "type": ResponseType.SUCCESS,
                 "message": "Eventos obtenidos exitosamente",
-                "data": paginated_events,
+                "data": result["data"],
                 "pagination": {
-                    "page": page,
-                    "per_page": per_page,
-                    "total": total,
-                    "pages": (total + per_page - 1) // per_page,
+                    "page": result["page"],
+                    "per_page": result["per_page"],
+                    "total": result["total"],
+                    "pages": result["pages"],
                 },
             }
         )
@@ -259,9 +320,8 @@ def create_event(validated: Evento, user: dict[str, Any]) -> tuple[Response, int
     """
     try:
         print("Creating event with data:", user["id"])
-        event_data = validated.model_dump()
-        event_data["user_id"] = str(user["id"])
-        new_event = evento_model.create(event_data)
+        # El decorador @validate ya validó el evento: el ORM no vuelve a validarlo
+        new_event = evento_model.create(validated.model_copy(update={"user_id": str(user["id"])}))
         return jsonify(
             {
                 "type": ResponseType.SUCCESS,
@@ -366,7 +426,7 @@ def delete_event(event_id: str, user: dict[str, Any]) -> tuple[Response, int] |
 def get_my_events(user: dict[str, Any]) -> tuple[Response, int] | Response:
     """Obtener eventos del usuario autenticado"""
     try:
-        user_events = evento_model.find_by_field("user_id", str(user["id"]))
+        user_events = evento_model.query().where(user_id=str(user["id"])).all()
         return jsonify(
             {
                 "type": ResponseType.SUCCESS,
@@ -383,34 +443,50 @@ def get_my_events(user: dict[str, Any]) -> tuple[Response, int] | Response:
 
 @events_bp.route("/search", methods=["GET"])
 def search_events() -> tuple[Response, int] | Response:
-    """Buscar eventos por título, descripción o ubicación"""
+    """
+    Buscar eventos por título, descripción o ubicación.
+    - mode=contains (por defecto): el texto aparece tal cual, sin distinguir mayúsculas,
+      en alguno de los campos; resultados en orden de creación
+    - mode=words: búsqueda por palabras que ignora tildes, acepta prefijos
+      ("conc" encuentra "concierto") y ordena por relevancia
+    Admite paginación con page y per_page.
+    """
     try:
         query: str = request.args.get("q", "").lower().strip()
         if not query:
             return jsonify(
                 {"type": ResponseType.WARNING, "message": "Parámetro de búsqueda requerido: q"}
             ), 400
+        page: int = request.args.get("page", 1, type=int)
+        per_page: int = request.args.get("per_page", 100, type=int)
+        mode: str = request.args.get("mode", "contains")
+        if mode not in ["contains", "words"]:
+            return jsonify(
+                {"type": ResponseType.WARNING, "message": "mode debe ser 'contains' o 'words'"}
+            ), 400
 
-        all_events: list[dict[str, Any]] = evento_model.find_all()
-        filtered_events: list[dict[str, Any]] = []
-
-        for event in all_events:
-            title: str = str(event.get("title") or "").lower()
-            description: str = str(event.get("description") or "").lower()
-            city: str = str(event.get("city") or "").lower()
-            country: str = str(event.get("country") or "").lower()
-
-            if query in title or query in description or query in city or query in country:
-                filtered_events.append(event)
+        result: dict[str, Any]
+        if mode == "words":
+            result = evento_model.search("search", query, page=page, per_page=per_page)
+        else:
+            result = evento_model.find_containing(
+                EVENT_SEARCH_FIELDS, query, page=page, per_page=per_page
+            )
 
-        total_found: int = len(filtered_events)
+        total_found: int = result["total"]
         return jsonify(
             {
                 "type": ResponseType.SUCCESS,
                 "message": f"Se encontraron {total_found} eventos para la búsqueda '{query}'",
-                "data": filtered_events,
+                "data": result["data"],
                 "total": total_found,
                 "query": query,
+                "pagination": {
+                    "page": result["page"],
+                    "per_page": result["per_page"],
+                    "total": total_found,
+                    "pages": result["pages"],
+                },
             }
         )
     except Exception as e:
@@ -423,7 +499,7 @@ def search_events() -> tuple[Response, int] | Response:
 def get_events_by_category(category_id: str) -> tuple[Response, int] | Response:
     """Obtener eventos por categoría"""
     try:
-        events = evento_model.find_by_field("category_id", str(category_id))
+        events = evento_model.query().where(category_id=str(category_id)).all()
         return jsonify(
             {
                 "type": ResponseType.SUCCESS,
@@ -443,7 +519,7 @@ def get_events_by_category(category_id: str) -> tuple[Response, int] | Response:
 def get_events_by_city(city: str) -> tuple[Response, int] | Response:
     """Obtener eventos por ciudad"""
     try:
-        events = evento_model.find_by_field("city", city)
+        events = evento_model.query().where(city=city).all()
         return jsonify(
             {
                 "type": ResponseType.SUCCESS,
@@ -463,7 +539,7 @@ def get_events_by_city(city: str) -> tuple[Response, int] | Response:
 def get_events_by_country(country: str) -> tuple[Response, int] | Response:
     """Obtener eventos por país"""
     try:
-        events = evento_model.find_by_field("country", country)
+        events = evento_model.query().where(country=country).all()
         return jsonify(
             {
                 "type": ResponseType.SUCCESS,
@@ -597,11 +673,11 @@ def get_user_favorites(user: dict[str, Any]) -> tuple[Response, int] | Response:
         user_favorites: list[dict[str, Any]] = favorite_model.find_by_field(
             "user_id", str(user["id"])
         )
-        favorite_events: list[dict[str, Any]] = []
-        for fav in user_favorites:
-            event: dict[str, Any] | None = evento_model.find_by_id(fav["event_id"])
-            if event:
-                favorite_events.append({"favorite_id": fav["id"], "event": event})
+        # Todos los eventos se resuelven en una sola búsqueda en lugar de uno por favorito
+        favorite_events: list[dict[str, Any]] = [
+            {"favorite_id": fav["id"], "event": event}
+            for fav, event in orm.join(user_favorites, "event_id", "event")
+        ]
 
         total_favorites: int = len(favorite_events)
         return jsonify(
@@ -743,12 +819,15 @@ def hard_delete_event(event_id: str, user: dict[str, Any]) -> tuple[Response, in
                 }
             ), 403
 
-        user_favorites: list[dict[str, Any]] = favorite_model.find_by_field("event_id", event_id)
-        favorites_count: int = len(user_favorites)
-        for fav in user_favorites:
-            favorite_model.delete_by_id(fav["id"])
-
-        success: bool = evento_model.delete_by_id(event_id)
+        # Favoritos y evento se borran juntos: un fallo a mitad no deja favoritos huérfanos
+        with orm.transaction("favorite", "event"):
+            user_favorites: list[dict[str, Any]] = favorite_model.find_by_field(
+                "event_id", event_id
+            )
+            favorites_count: int = favorite_model.delete_many(
+                [fav["id"] for fav in user_favorites]
+            )
+            success: bool = evento_model.delete_by_id(event_id)
         if success:
             return jsonify(
                 {
@@ -775,10 +854,9 @@ def hard_delete_event(event_id: str, user: dict[str, Any]) -> tuple[Response, in
 def get_deleted_events(user: dict[str, Any]) -> tuple[Response, int] | Response:
     """Obtener eventos eliminados (soft delete) del usuario actual - Solo propietario"""
     try:
-        user_events: list[dict[str, Any]] = evento_model.find_by_field("user_id", str(user["id"]))
-        deleted_events: list[dict[str, Any]] = [
-            e for e in user_events if e.get("status") == "deleted"
-        ]
+        deleted_events: list[dict[str, Any]] = (
+            evento_model.query().where(user_id=str(user["id"]), status="deleted").all()
+        )
         total_deleted: int = len(deleted_events)
         return jsonify(
             {
@@ -802,10 +880,9 @@ def get_deleted_events(user: dict[str, Any]) -> tuple[Response, int] | Response:
 def get_archived_events(user: dict[str, Any]) -> tuple[Response, int] | Response:
     """Obtener eventos archivados del usuario actual"""
     try:
-        user_events: list[dict[str, Any]] = evento_model.find_by_field("user_id", str(user["id"]))
-        archived_events: list[dict[str, Any]] = [
-            e for e in user_events if e.get("status") == "archived"
-        ]
+        archived_events: list[dict[str, Any]] = (
+            evento_model.query().where(user_id=str(user["id"]), status="archived").all()
+        )
         total_archived: int = len(archived_events)
         return jsonify(
             {
@@ -1,5 +1,6 @@
 from libs.helpers import auth_required, ResponseType
 from db.database import get_user_model, get_event_model
+from db.ORMcsv import UniqueConstraintError
 from flask import Blueprint, jsonify, request, Response
 from typing import Any
 
@@ -30,9 +31,9 @@ def user_stats():
 def get_users(user: dict[str, Any]) -> tuple[Response, int] | Response:
     if user.get("rol") != "admin":
         return jsonify({"type": ResponseType.DANGER, "message": "Acceso denegado"}), 403
-    users = user_model.find_all()
-    for u in users:
-        u.pop("password", None)
+    # La contraseña no se copia de los registros guardados
+    fields = [name for name in user_model.model_class.model_fields if name != "password"]
+    users = user_model.query().only(*fields).all()
     return jsonify(
         {
             "type": ResponseType.SUCCESS,
@@ -80,7 +81,11 @@ def update_user(user_id: str, user: dict[str, Any]) -> tuple[Response, int] | Re
     if not existing_user:
         return jsonify({"type": ResponseType.ERROR, "message": "Usuario no encontrado"}), 404
 
-    updated_user = user_model.update_by_id(user_id, data)
+    try:
+        updated_user = user_model.update_by_id(user_id, data)
+    except UniqueConstraintError as conflict:
+        message = f"Ya existe un usuario con este {conflict.field}"
+        return jsonify({"type": ResponseType.ERROR, "message": message}), 400
     if not updated_user:
         return jsonify(
             {"type": ResponseType.ERROR, "message": "Error al actualizar el usuario"}
@@ -1,9 +1,10 @@
 import unittest
 import json
 from factory import create_app
-from db.ORMcsv import orm
+from db.ORMcsv import orm, table_files
 from models.usuario import Usuario
 from libs.helpers import ResponseType
+from routes import auth, users
 import os
 
 
@@ -30,8 +31,8 @@ class AuthFlowTest(unittest.TestCase):
 
     def tearDown(self):
         """Limpia después de cada prueba."""
-        if os.path.exists(self.user_model.full_path):
-            os.remove(self.user_model.full_path)
+        for path in table_files(self.user_model.full_path):
+            os.remove(path)
 
     def test_01_register(self):
         """Prueba el registro de un nuevo usuario."""
@@ -158,6 +159,11 @@ class AuthFlowTest(unittest.TestCase):
         data = json.loads(response.data)
         self.assertEqual(data["type"], ResponseType.SUCCESS)
 
+    def test_09_single_user_model(self):
+        """Prueba que las rutas de auth y de usuarios comparten un mismo modelo registrado."""
+        self.assertIs(auth.user_model, self.user_model)
+        self.assertIs(users.user_model, self.user_model)
+
 
 if __name__ == "__main__":
     unittest.main()
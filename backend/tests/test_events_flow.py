@@ -1,7 +1,8 @@
 import unittest
 import json
+from datetime import date, timedelta
 from factory import create_app
-from db.ORMcsv import orm
+from db.ORMcsv import orm, table_files
 from libs.helpers import ResponseType
 import os
 
@@ -38,8 +39,17 @@ class EventsFlowTest(unittest.TestCase):
         for model_name in ["usuario", "event", "favorite", "category"]:
             if model_name in orm.models:
                 model = orm.get_model(model_name)
-                if os.path.exists(model.full_path):
-                    os.remove(model.full_path)
+                for path in table_files(model.full_path):
+                    os.remove(path)
+
+    def _post_event(self, event: dict):
+        """Crea un evento como el usuario de prueba."""
+        return self.client.post(
+            "/api/v1/events/",
+            data=json.dumps(event),
+            headers=self.auth_headers,
+            content_type="application/json",
+        )
 
     def test_01_create_event(self):
         """Prueba la creación de un nuevo evento."""
@@ -96,32 +106,43 @@ class EventsFlowTest(unittest.TestCase):
 
     def test_06_archive_and_restore_event(self):
         """Prueba el archivado y restauración de un evento."""
-        create_resp = self.client.post("/api/v1/events/", data=json.dumps(self.event_data), headers=self.auth_headers, content_type="application/json")
+        create_resp = self._post_event(self.event_data)
         event_id = json.loads(create_resp.data)["data"]["id"]
 
-        archive_resp = self.client.put(f"/api/v1/events/{event_id}/archive", headers=self.auth_headers)
+        archive_resp = self.client.put(
+            f"/api/v1/events/{event_id}/archive", headers=self.auth_headers
+        )
         self.assertEqual(archive_resp.status_code, 200)
         self.assertEqual(json.loads(archive_resp.data)["type"], ResponseType.SUCCESS)
 
-        restore_resp = self.client.put(f"/api/v1/events/{event_id}/restore", headers=self.auth_headers)
+        restore_resp = self.client.put(
+            f"/api/v1/events/{event_id}/restore", headers=self.auth_headers
+        )
         self.assertEqual(restore_resp.status_code, 200)
         self.assertEqual(json.loads(restore_resp.data)["type"], ResponseType.SUCCESS)
 
     def test_07_hard_delete_event(self):
         """Prueba el borrado físico (hard delete) de un evento."""
-        create_resp = self.client.post("/api/v1/events/", data=json.dumps(self.event_data), headers=self.auth_headers, content_type="application/json")
+        create_resp = self._post_event(self.event_data)
         event_id = json.loads(create_resp.data)["data"]["id"]
 
-        response = self.client.delete(f"/api/v1/events/{event_id}/hard-delete", headers=self.auth_headers)
+        response = self.client.delete(
+            f"/api/v1/events/{event_id}/hard-delete", headers=self.auth_headers
+        )
         self.assertEqual(response.status_code, 200)
         self.assertEqual(json.loads(response.data)["type"], ResponseType.SUCCESS)
 
     def test_08_favorites(self):
         """Prueba el flujo completo de favoritos."""
-        create_resp = self.client.post("/api/v1/events/", data=json.dumps(self.event_data), headers=self.auth_headers, content_type="application/json")
+        create_resp = self._post_event(self.event_data)
         event_id = json.loads(create_resp.data)["data"]["id"]
 
-        add_fav_resp = self.client.post("/api/v1/events/favorites", data=json.dumps({"event_id": event_id}), headers=self.auth_headers, content_type="application/json")
+        add_fav_resp = self.client.post(
+            "/api/v1/events/favorites",
+            data=json.dumps({"event_id": event_id}),
+            headers=self.auth_headers,
+            content_type="application/json",
+        )
         self.assertEqual(add_fav_resp.status_code, 201)
         self.assertEqual(json.loads(add_fav_resp.data)["type"], ResponseType.SUCCESS)
 
@@ -129,10 +150,114 @@ class EventsFlowTest(unittest.TestCase):
         self.assertEqual(get_fav_resp.status_code, 200)
         self.assertEqual(json.loads(get_fav_resp.data)["type"], ResponseType.SUCCESS)
 
-        del_fav_resp = self.client.delete(f"/api/v1/events/favorites/{event_id}", headers=self.auth_headers)
+        del_fav_resp = self.client.delete(
+            f"/api/v1/events/favorites/{event_id}", headers=self.auth_headers
+        )
         self.assertEqual(del_fav_resp.status_code, 200)
         self.assertEqual(json.loads(del_fav_resp.data)["type"], ResponseType.SUCCESS)
 
+    def test_09_cursor_pagination(self):
+        """Prueba la paginación por cursor ordenada por fecha."""
+        for day in ["2025-03-01", "2025-01-01", "2025-02-01"]:
+            event = dict(self.event_data, date=day)
+            self._post_event(event)
+
+        first = json.loads(self.client.get("/api/v1/events/?cursor=&per_page=2").data)
+        self.assertEqual([e["date"] for e in first["data"]], ["2025-01-01", "2025-02-01"])
+        self.assertTrue(first["pagination"]["has_more"])
+
+        cursor = first["pagination"]["next_cursor"]
+        second = json.loads(self.client.get(f"/api/v1/events/?cursor={cursor}&per_page=2").data)
+        self.assertEqual([e["date"] for e in second["data"]], ["2025-03-01"])
+        self.assertIsNone(second["pagination"]["next_cursor"])
+
+        invalid = self.client.get("/api/v1/events/?cursor=no-es-un-cursor")
+        self.assertEqual(invalid.status_code, 400)
+
+    def test_10_visibility_listing(self):
+        """Prueba que los eventos privados solo aparecen en el listado de su autor."""
+        for visibility in ["public", "private", "only_me"]:
+            event = dict(self.event_data, title=visibility, visibility=visibility)
+            self._post_event(event)
+
+        anonymous = json.loads(self.client.get("/api/v1/events/").data)
+        self.assertEqual([e["title"] for e in anonymous["data"]], ["public"])
+        own = json.loads(self.client.get("/api/v1/events/", headers=self.auth_headers).data)
+        self.assertEqual([e["title"] for e in own["data"]], ["public", "private", "only_me"])
+        self.assertEqual(own["pagination"]["total"], 3)
+
+    def test_11_search_modes(self):
+        """Prueba la búsqueda por subcadena y la búsqueda por palabras."""
+        event = dict(self.event_data, title="Concierto en Bogotá")
+        self._post_event(event)
+
+        contains = json.loads(self.client.get("/api/v1/events/search?q=ierto").data)
+        self.assertEqual(contains["total"], 1)
+        words = json.loads(self.client.get("/api/v1/events/search?q=bogota&mode=words").data)
+        self.assertEqual(words["total"], 1)
+        self.assertEqual(self.client.get("/api/v1/events/search?q=x&mode=otro").status_code, 400)
+
+    def test_12_listing_filters(self):
+        """Prueba que el listado combina visibilidad y filtros por país y ciudad."""
+        places = [
+            ("Chile", "Santiago", "public"),
+            ("Chile", "Santiago", "private"),
+            ("Perú", "Lima", "public"),
+        ]
+        for country, city, visibility in places:
+            event = dict(
+                self.event_data,
+                title=f"{city} {visibility}",
+                country=country,
+                city=city,
+                visibility=visibility,
+            )
+            self._post_event(event)
+
+        anonymous = json.loads(self.client.get("/api/v1/events/?country=Chile").data)
+        self.assertEqual([e["title"] for e in anonymous["data"]], ["Santiago public"])
+        own = json.loads(
+            self.client.get(
+                "/api/v1/events/?country=Chile&city=Santiago", headers=self.auth_headers
+            ).data
+        )
+        self.assertEqual([e["title"] for e in own["data"]], ["Santiago public", "Santiago private"])
+        self.assertEqual(own["pagination"]["total"], 2)
+        self.assertEqual(json.loads(self.client.get("/api/v1/events/?city=Quito").data)["data"], [])
+
+    def test_13_date_range_listing(self):
+        """Prueba el listado por rango de fechas y los próximos eventos, por fecha y hora."""
+        today = date.today()
+        days = [
+            ("past", -3, "10:00"),
+            ("late", 2, "20:00"),
+            ("early", 2, "08:00"),
+            ("far", 30, None),
+        ]
+        for title, offset, time in days:
+            event = dict(
+                self.event_data,
+                title=title,
+                date=(today + timedelta(days=offset)).isoformat(),
+                time=time,
+            )
+            self._post_event(event)
+
+        upcoming = json.loads(self.client.get("/api/v1/events/?upcoming=true").data)
+        self.assertEqual([e["title"] for e in upcoming["data"]], ["early", "late", "far"])
+        self.assertEqual(upcoming["pagination"]["total"], 3)
+        date_from = (today - timedelta(days=5)).isoformat()
+        window = f"date_from={date_from}&date_to={(today + timedelta(days=2)).isoformat()}"
+        ranged = json.loads(self.client.get(f"/api/v1/events/?{window}&per_page=2&page=2").data)
+        self.assertEqual([e["title"] for e in ranged["data"]], ["late"])
+        self.assertEqual(ranged["pagination"]["total"], 3)
+        for invalid in ["mañana", "2024-1-5", "05/01/2024", "20240105", "2024-W01-1"]:
+            for param in ["date_from", "date_to"]:
+                response = self.client.get(f"/api/v1/events/?{param}={invalid}")
+                self.assertEqual(response.status_code, 400, f"{param}={invalid}")
+        cursor_page = self.client.get("/api/v1/events/?cursor=&date_to=2024-1-5")
+        self.assertEqual(cursor_page.status_code, 400)
+
 
 if __name__ == "__main__":
     unittest.main()
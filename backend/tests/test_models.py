@@ -1,6 +1,8 @@
 import unittest
 from pydantic import ValidationError
 from models.usuario import Usuario
+from db.database import event_visibility_partition, visibility_groups
+from db.query import compile_predicate
 from models.evento import Evento, Category, Favorite
 
 
@@ -77,6 +79,24 @@ class TestModels(unittest.TestCase):
         except ValidationError as e:
             self.fail(f"La validación de Favorite falló inesperadamente: {e}")
 
+    def test_event_visibility_rules(self):
+        """Prueba que la partición de un evento coincide con las condiciones de su grupo."""
+        events = [
+            {"user_id": "u1", "visibility": visibility, "status": status}
+            for visibility in ["public", "private", "only_me"]
+            for status in ["active", "archived", "deleted", None]
+        ]
+        groups = visibility_groups("u1", ["active", "archived"])
+        for event in events:
+            matching = [key for key, conditions in groups if compile_predicate(conditions)(event)]
+            partition = event_visibility_partition(event)
+            self.assertEqual(matching, [partition] if partition else [])
+        self.assertEqual(
+            event_visibility_partition({"user_id": "u1", "visibility": "private"}),
+            ("owner", "u1", "active"),
+        )
+        self.assertIsNone(event_visibility_partition({"visibility": "private", "status": "active"}))
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -1,7 +1,7 @@
 import unittest
 import json
 from factory import create_app
-from db.ORMcsv import orm
+from db.ORMcsv import orm, table_files
 import os
 
 
@@ -37,8 +37,8 @@ class MultiUserInteractionTest(unittest.TestCase):
         for model_name in ["usuario", "event", "favorite"]:
             if model_name in orm.models:
                 model = orm.get_model(model_name)
-                if os.path.exists(model.full_path):
-                    os.remove(model.full_path)
+                for path in table_files(model.full_path):
+                    os.remove(path)
 
     def test_interaction_flow(self):
         # 1. Alice crea un evento público
@@ -1,8 +1,15 @@
 import unittest
 import os
 import csv
-from pydantic import BaseModel
-from db.ORMcsv import CSVModel, ORMManager
+import json
+from pydantic import BaseModel, ValidationError
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Literal, Optional
+from unittest import mock
+from db.codecs import RowCodec
+from db.ORMcsv import CSVModel, ORMManager, UniqueConstraintError, table_files
+from db.transaction import COMMIT_LOCK, COMMIT_MARKER, recover_transactions
 
 
 # Modelo Pydantic de prueba
@@ -12,6 +19,45 @@ class TestModel(BaseModel):
     value: int
 
 
+# Modelo con un campo opcional para las restricciones de unicidad
+class UniqueTestModel(BaseModel):
+    id: str
+    name: Optional[str] = None
+    value: int
+
+
+# Modelo con campos de distintos tipos para los decodificadores por columna
+class CodecTestModel(BaseModel):
+    id: str
+    name: str
+    value: Optional[int] = None
+    kind: Literal["a", "b"]
+    tags: Optional[List[str]] = None
+
+
+# Modelo con campos categóricos y una fecha para la réplica por columnas
+class ColumnarTestModel(BaseModel):
+    id: str
+    name: str
+    kind: str
+    date: Optional[str] = None
+
+
+def remove_table(full_path: str):
+    """Elimina un CSV de prueba con todos sus archivos auxiliares y temporales."""
+    for path in table_files(full_path):
+        os.remove(path)
+
+
+def _update_rows_in_process(csv_file: str, ids: list, rounds: int):
+    """Actualiza repetidamente las filas dadas desde otro proceso."""
+    model = CSVModel(TestModel, csv_file)
+    for value in range(1, rounds + 1):
+        for record_id in ids:
+            model.update_by_id(record_id, {"value": value})
+        model.create({"name": "from-process", "value": value})
+
+
 class TestCSVModel(unittest.TestCase):
     def setUp(self):
         """Configura un entorno de prueba limpio antes de cada test."""
@@ -31,8 +77,7 @@ class TestCSVModel(unittest.TestCase):
 
     def tearDown(self):
         """Limpia el entorno de prueba después de cada test."""
-        if os.path.exists(self.full_path):
-            os.remove(self.full_path)
+        remove_table(self.full_path)
 
     def test_01_file_creation(self):
         """Prueba que el archivo CSV se crea con los encabezados correctos."""
@@ -115,10 +160,898 @@ class TestCSVModel(unittest.TestCase):
         not_deleted = self.model.delete_by_id("non-existent-id")
         self.assertFalse(not_deleted)
 
+    def test_08_cache_avoids_reparsing(self):
+        """Prueba que las lecturas repetidas no vuelven a parsear el CSV."""
+        self.model.create({"name": "Cached", "value": 1})
+        self.model.find_all()
+
+        calls = []
+        original = self.model._read_records
+        self.model._read_records = lambda: calls.append(1) or original()
+        self.model.find_all()
+        self.model.find_by_field("name", "Cached")
+        self.assertEqual(self.model.count(), 1)
+        self.assertEqual(calls, [])
+
+    def test_09_cache_detects_external_changes(self):
+        """Prueba que la caché se invalida cuando otra instancia modifica el archivo."""
+        created = self.model.create({"name": "Shared", "value": 1})
+        self.assertEqual(len(self.model.find_all()), 1)
+
+        other = CSVModel(TestModel, self.csv_file)
+        other.update_by_id(created["id"], {"value": 2})
+        other.create({"name": "Another", "value": 3})
+
+        self.assertEqual(self.model.find_by_id(created["id"])["value"], 2)
+        self.assertEqual(len(self.model.find_all()), 2)
+
+    def test_10_returned_records_are_copies(self):
+        """Prueba que modificar un resultado no altera la caché."""
+        created = self.model.create({"name": "Original", "value": 1})
+        found = self.model.find_by_id(created["id"])
+        found["name"] = "Mutated"
+        self.model.find_all()[0].pop("name")
+
+        self.assertEqual(self.model.find_by_id(created["id"])["name"], "Original")
+
+    def test_11_id_index_stays_consistent(self):
+        """Prueba que el índice por ID sigue siendo válido tras crear, actualizar y eliminar."""
+        created = [self.model.create({"name": f"Record {i}", "value": i}) for i in range(5)]
+
+        self.assertTrue(self.model.delete_by_id(created[1]["id"]))
+        self.model.update_by_id(created[3]["id"], {"value": 30})
+        extra = self.model.create({"name": "Extra", "value": 5})
+
+        self.assertIsNone(self.model.find_by_id(created[1]["id"]))
+        self.assertEqual(self.model.find_by_id(created[3]["id"])["value"], 30)
+        for record in created[2:] + [extra]:
+            self.assertEqual(self.model.find_by_id(record["id"])["id"], record["id"])
+        self.assertIsNone(self.model.update_by_id(created[1]["id"], {"value": 1}))
+        self.assertFalse(self.model.delete_by_id(created[1]["id"]))
+
+    def test_12_secondary_index(self):
+        """Prueba que find_by_field usa el índice y lo mantiene al escribir."""
+        model = CSVModel(TestModel, self.csv_file, indexes=["name"])
+        first = model.create({"name": "A", "value": 1})
+        model.create({"name": "B", "value": 2})
+        third = model.create({"name": "A", "value": 3})
+
+        self.assertEqual([r["value"] for r in model.find_by_field("name", "A")], [1, 3])
+
+        model.update_by_id(first["id"], {"name": "B"})
+        model.delete_by_id(third["id"])
+        model.create({"name": "A", "value": 4})
+
+        self.assertEqual([r["value"] for r in model.find_by_field("name", "A")], [4])
+        self.assertEqual([r["value"] for r in model.find_by_field("name", "B")], [1, 2])
+        self.assertEqual(model.find_by_field("name", "C"), [])
+        self.assertEqual(model.find_one_by_field("name", "B")["value"], 1)
+
+        # Una escritura externa obliga a reconstruir el índice
+        self.model.create({"name": "A", "value": 5})
+        self.assertEqual([r["value"] for r in model.find_by_field("name", "A")], [4, 5])
+
+    def test_13_unique_index(self):
+        """Prueba que los campos únicos rechazan duplicados al crear y al actualizar."""
+        model = CSVModel(UniqueTestModel, self.csv_file, unique=["name"])
+        first = model.create({"name": "taken", "value": 1})
+        second = model.create({"name": "free", "value": 2})
+        model.create({"value": 3})
+        model.create({"value": 4})
+
+        with self.assertRaises(UniqueConstraintError) as ctx:
+            model.create({"name": "taken", "value": 5})
+        self.assertEqual(ctx.exception.field, "name")
+        with self.assertRaises(UniqueConstraintError):
+            model.update_by_id(second["id"], {"name": "taken"})
+
+        self.assertEqual(model.update_by_id(first["id"], {"value": 10})["value"], 10)
+        self.assertEqual(model.find_one_by_field("name", "taken")["id"], first["id"])
+        self.assertEqual(model.count(), 4)
+
+    def test_14_unique_index_concurrent_create(self):
+        """Prueba que dos altas concurrentes con el mismo valor no pasan ambas."""
+        model = CSVModel(UniqueTestModel, self.csv_file, unique=["name"])
+
+        def register(_: int) -> bool:
+            try:
+                model.create({"name": "race", "value": 1})
+                return True
+            except UniqueConstraintError:
+                return False
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(register, range(16)))
+
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(len(model.find_by_field("name", "race")), 1)
+
+    def _data_rows(self) -> int:
+        with open(self.full_path, "r", newline="") as f:
+            return sum(1 for _ in csv.reader(f)) - 1
+
+    def test_15_log_storage_appends_changes(self):
+        """Prueba que el modo log agrega versiones y lápidas sin reescribir el archivo."""
+        os.remove(self.full_path)
+        model = CSVModel(TestModel, self.csv_file, storage="log")
+        first = model.create({"name": "First", "value": 1})
+        second = model.create({"name": "Second", "value": 2})
+        model.update_by_id(first["id"], {"value": 10})
+        model.delete_by_id(second["id"])
+        model.create({"name": "Third", "value": 3})
+
+        self.assertEqual(self._data_rows(), 5)
+        self.assertEqual([r["value"] for r in model.find_all()], [10, 3])
+
+        # Una instancia nueva resuelve la última versión de cada registro
+        fresh = CSVModel(TestModel, self.csv_file)
+        self.assertEqual([r["value"] for r in fresh.find_all()], [10, 3])
+        self.assertIsNone(fresh.find_by_id(second["id"]))
+
+        self.assertAlmostEqual(model.garbage_ratio(), 3 / 5)
+        self.assertEqual(model.compact(), 3)
+        self.assertEqual(self._data_rows(), 2)
+        self.assertEqual([r["value"] for r in fresh.find_all()], [10, 3])
+
+    def test_16_log_storage_migrates_and_compacts_in_background(self):
+        """Prueba la migración desde formato tabla y la compactación automática."""
+        created = self.model.create({"name": "Legacy", "value": 1})
+        model = CSVModel(TestModel, self.csv_file, storage="log", compact_ratio=0.5)
+        with open(self.full_path, "r") as f:
+            self.assertIn(CSVModel.LOG_OP_FIELD, next(csv.reader(f)))
+        self.assertEqual(model.find_by_id(created["id"])["name"], "Legacy")
+
+        for i in range(CSVModel.COMPACT_MIN_ROWS):
+            model.update_by_id(created["id"], {"value": i})
+        thread = model._compaction_thread
+        self.assertIsNotNone(thread)
+        thread.join(timeout=5)
+
+        self.assertLess(self._data_rows(), CSVModel.COMPACT_MIN_ROWS)
+        self.assertEqual(model.find_by_id(created["id"])["value"], CSVModel.COMPACT_MIN_ROWS - 1)
+
+        # Compactar con un modelo en formato tabla devuelve el archivo a ese formato
+        CSVModel(TestModel, self.csv_file).compact()
+        with open(self.full_path, "r") as f:
+            self.assertNotIn(CSVModel.LOG_OP_FIELD, next(csv.reader(f)))
+        self.assertEqual(self._data_rows(), 1)
+
+    def test_17_invalid_storage_mode(self):
+        """Prueba que un modo de almacenamiento desconocido se rechaza."""
+        with self.assertRaises(ValueError):
+            CSVModel(TestModel, self.csv_file, storage="unknown")
+
+    def _leftover_files(self) -> list:
+        return [
+            name for name in os.listdir(self.db_dir)
+            if (name.startswith(self.csv_file) or name.startswith(f".{self.csv_file}"))
+            and not name.endswith(".lock")
+        ]
+
+    def test_18_atomic_rewrite(self):
+        """Prueba que las reescrituras sustituyen el archivo sin dejar temporales."""
+        created = self.model.create({"name": "Atomic", "value": 1})
+        inode = os.stat(self.full_path).st_ino
+        self.model.update_by_id(created["id"], {"value": 2})
+
+        self.assertNotEqual(os.stat(self.full_path).st_ino, inode)
+        self.assertEqual(self._leftover_files(), [self.csv_file])
+        self.assertEqual(CSVModel(TestModel, self.csv_file).find_all()[0]["value"], 2)
+
+    def test_19_partial_row_is_ignored(self):
+        """Prueba que una fila a medio escribir al final del archivo no se lee."""
+        self.model.create({"name": "Complete", "value": 1})
+        with open(self.full_path, "a", newline="") as f:
+            f.write("abc,Incompl")
+
+        records = CSVModel(TestModel, self.csv_file).find_all()
+        self.assertEqual([r["name"] for r in records], ["Complete"])
+
+    def test_20_journal_replay(self):
+        """Prueba que las operaciones del diario se aplican al arrancar tras una caída."""
+        journal_path = self.full_path + ".journal"
+        kept = self.model.create({"name": "Kept", "value": 1})
+        removed = self.model.create({"name": "Removed", "value": 2})
+
+        # Simular operaciones confirmadas en el diario que no llegaron al CSV
+        entries = [
+            {"op": "put", "row": {"id": kept["id"], "name": "Kept", "value": "5"}},
+            {"op": "put", "row": {"id": "new", "name": "New", "value": "3"}},
+            {"op": "delete", "id": removed["id"]},
+        ]
+        with open(journal_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+            f.write('{"op": "put", "row"')
+
+        CSVModel._recovered_tables.discard(self.full_path)
+        model = CSVModel(TestModel, self.csv_file, journal=True)
+
+        records = [(r["name"], r["value"]) for r in model.find_all()]
+        self.assertEqual(records, [("Kept", 5), ("New", 3)])
+        self.assertEqual(os.path.getsize(journal_path), 0)
+
+        model.create({"name": "Journaled", "value": 4})
+        self.assertGreater(os.path.getsize(journal_path), 0)
+
+    def test_21_group_commit(self):
+        """Prueba que las escrituras concurrentes comparten fsync sin perder registros."""
+        model = CSVModel(TestModel, self.csv_file, durability="group")
+        committer = model._committer
+        committer.fsync_count = 0
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            list(pool.map(lambda i: model.create({"name": f"R{i}", "value": i}), range(40)))
+
+        self.assertEqual(CSVModel(TestModel, self.csv_file).count(), 40)
+        self.assertGreater(committer.fsync_count, 0)
+        self.assertLess(committer.fsync_count, 40)
+
+    def test_22_invalid_durability(self):
+        """Prueba que un nivel de durabilidad desconocido se rechaza."""
+        with self.assertRaises(ValueError):
+            CSVModel(TestModel, self.csv_file, durability="sometimes")
+
+    @unittest.skipUnless(
+        "fork" in multiprocessing.get_all_start_methods(), "requiere procesos con fork"
+    )
+    def test_23_multiprocess_writes_are_not_lost(self):
+        """Prueba que varios procesos escribiendo a la vez no pierden cambios."""
+        created = [self.model.create({"name": f"Row {i}", "value": 0}) for i in range(8)]
+        ids = [record["id"] for record in created]
+        context = multiprocessing.get_context("fork")
+        workers = [
+            context.Process(target=_update_rows_in_process, args=(self.csv_file, ids[i::4], 10))
+            for i in range(4)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(timeout=60)
+            self.assertEqual(worker.exitcode, 0)
+
+        records = self.model.find_all()
+        self.assertEqual(len(records), 8 + 4 * 10)
+        for record_id in ids:
+            self.assertEqual(self.model.find_by_id(record_id)["value"], 10)
+
+    def test_24_lock_metrics(self):
+        """Prueba que se contabilizan las adquisiciones de los cerrojos de archivo."""
+        created = self.model.create({"name": "Locked", "value": 1})
+        self.model.update_by_id(created["id"], {"value": 2})
+        CSVModel(TestModel, self.csv_file).find_all()
+
+        metrics = self.model.lock_metrics()
+        self.assertGreaterEqual(metrics["exclusive"]["acquired"], 2)
+        self.assertGreaterEqual(metrics["exclusive"]["wait_seconds"], 0.0)
+        self.assertIn("max_wait_seconds", metrics["shared"])
+
+    def test_25_iter_where_stops_early(self):
+        """Prueba que iter_where no deserializa más filas de las necesarias."""
+        for i in range(20):
+            self.model.create({"name": f"Row {i}", "value": i})
+        streaming = CSVModel(TestModel, self.csv_file, cache=False)
+
+        calls = []
+        original = streaming._parse_row
+        streaming._parse_row = lambda *row: calls.append(1) or original(*row)
+        first = next(streaming.iter_where(lambda r: r["value"] >= 3))
+        self.assertEqual(first["name"], "Row 3")
+        self.assertEqual(len(calls), 4)
+
+        self.assertEqual(len(streaming.find_where(lambda r: r["value"] % 2 == 0, limit=3)), 3)
+        self.assertEqual(
+            [r["value"] for r in self.model.iter_where(lambda r: r["value"] > 17)], [18, 19]
+        )
+
+    def test_26_no_cache_mode(self):
+        """Prueba que sin caché las lecturas van al disco y las escrituras no retienen filas."""
+        streaming = CSVModel(TestModel, self.csv_file, cache=False)
+        created = streaming.create({"name": "Stream", "value": 1})
+        self.assertIsNone(streaming._records)
+        streaming.update_by_id(created["id"], {"value": 2})
+        self.assertIsNone(streaming._records)
+        self.model.create({"name": "Other", "value": 3})
+
+        self.assertEqual(streaming.count(), 2)
+        self.assertEqual(streaming.find_by_id(created["id"])["value"], 2)
+        self.assertEqual(streaming.find_one_by_field("name", "Other")["value"], 3)
+        page = streaming.paginate(page=2, per_page=1)
+        self.assertEqual(page["total"], 2)
+        self.assertEqual([r["name"] for r in page["data"]], ["Other"])
+        self.assertTrue(streaming.delete_by_id(created["id"]))
+        self.assertEqual([r["name"] for r in streaming.find_all()], ["Other"])
+
+    def test_27_iterator_sees_consistent_snapshot(self):
+        """Prueba que un iterador en curso no se ve afectado por escrituras posteriores."""
+        for i in range(3):
+            self.model.create({"name": f"Row {i}", "value": i})
+        iterator = self.model.iter_all()
+        first = next(iterator)
+        self.model.delete_by_id(first["id"])
+        self.model.create({"name": "Late", "value": 9})
+        self.assertEqual([r["name"] for r in iterator], ["Row 1", "Row 2"])
+
+    def test_28_sorted_index_cursor(self):
+        """Prueba la paginación por clave sobre un índice ordenado."""
+        model = CSVModel(TestModel, self.csv_file, sorted_indexes={"value": ["value"]})
+        for value in [5, 1, 4, 2, 3]:
+            model.create({"name": f"Row {value}", "value": value})
+
+        page, cursor = model.find_after("value", limit=2)
+        self.assertEqual([r["value"] for r in page], [1, 2])
+        model.create({"name": "Early", "value": 0})
+        model.update_by_id(page[0]["id"], {"value": 6})
+        page, cursor = model.find_after("value", cursor=cursor, limit=2)
+        self.assertEqual([r["value"] for r in page], [3, 4])
+        page, cursor = model.find_after("value", cursor=cursor, limit=2)
+        self.assertEqual([r["value"] for r in page], [5, 6])
+        self.assertIsNone(cursor)
+
+        odd, _ = model.find_after("value", limit=10, predicate=lambda r: r["value"] % 2 == 1)
+        self.assertEqual([r["value"] for r in odd], [3, 5])
+        streaming = CSVModel(
+            TestModel, self.csv_file, cache=False, sorted_indexes={"value": ["value"]}
+        )
+        self.assertEqual(streaming.find_after("value", limit=3), model.find_after("value", limit=3))
+        with self.assertRaises(ValueError):
+            model.find_after("value", cursor="basura")
+
+    def test_29_materialized_view(self):
+        """Prueba que las vistas se mantienen al escribir y mezclan particiones en orden."""
+        views = {"parity": lambda r: r["value"] % 2 or None}
+        model = CSVModel(TestModel, self.csv_file, views=views)
+        created = [model.create({"name": f"Row {i}", "value": i}) for i in range(1, 7)]
+        self.assertEqual([r["value"] for r in model.find_in_view("parity", [1])], [1, 3, 5])
+
+        # Pasar a otra partición conserva la posición del registro en el archivo
+        model.update_by_id(created[1]["id"], {"value": 7})
+        model.delete_by_id(created[2]["id"])
+        self.assertEqual([r["value"] for r in model.find_in_view("parity", [1])], [1, 7, 5])
+
+        page = model.paginate_view("parity", [1], page=2, per_page=2)
+        self.assertEqual(page["total"], 3)
+        self.assertEqual([r["value"] for r in page["data"]], [5])
+        streaming = CSVModel(TestModel, self.csv_file, cache=False, views=views)
+        self.assertEqual(streaming.paginate_view("parity", [1], page=2, per_page=2), page)
+    def test_30_full_text_search(self):
+        """Prueba la búsqueda por palabras sin tildes, por prefijo y ordenada por relevancia."""
+        model = CSVModel(TestModel, self.csv_file, text_indexes={"text": {"name": 1.0}})
+        model.create({"name": "Concierto en Bogotá", "value": 1})
+        both = model.create({"name": "Concierto de rock y concierto de jazz", "value": 2})
+        model.create({"name": "Feria del libro", "value": 3})
+
+        result = model.search("text", "CONCIERTO bogota")
+        self.assertEqual([r["value"] for r in result["data"]], [1])
+        result = model.search("text", "conc")
+        self.assertEqual([r["value"] for r in result["data"]], [2, 1])
+        self.assertEqual(result["total"], 2)
+
+        model.update_by_id(both["id"], {"name": "Teatro"})
+        self.assertEqual(model.search("text", "concierto")["total"], 1)
+        self.assertEqual(model.search("text", "teat")["data"][0]["value"], 2)
+        self.assertEqual(model.search("text", "libro", page=2, per_page=1)["data"], [])
+        streaming = CSVModel(
+            TestModel, self.csv_file, cache=False, text_indexes={"text": {"name": 1.0}}
+        )
+        self.assertEqual(streaming.search("text", "con"), model.search("text", "con"))
+
+    def test_31_substring_index(self):
+        """Prueba que el índice de trigramas conserva la búsqueda exacta por subcadena."""
+        model = CSVModel(TestModel, self.csv_file, substring_indexes=[["name"]])
+        plain = CSVModel(TestModel, self.csv_file)
+        for name in ["Concierto Rock", "Rockabilly", "Teatro", "Feria de ROCK"]:
+            model.create({"name": name, "value": 1})
+
+        for text in ["rock", "ock", "ro", "cierto r", "zzz", "Bogotá"]:
+            self.assertEqual(
+                model.find_containing(["name"], text), plain.find_containing(["name"], text)
+            )
+        self.assertEqual(model.find_containing(["name"], "rock")["total"], 3)
+
+        calls = []
+        original = model._position
+        model._position = lambda record_id: calls.append(record_id) or original(record_id)
+        model.find_containing(["name"], "teatro")
+        self.assertEqual(len(calls), 1)
+        stats = model.index_stats()["name"]
+        self.assertGreater(stats["trigrams"], 0)
+        self.assertGreater(stats["bytes"], 0)
+
+    def test_32_find_by_ids(self):
+        """Prueba la búsqueda de varios IDs en una sola lectura."""
+        created = [self.model.create({"name": f"Row {i}", "value": i}) for i in range(3)]
+        ids = [created[0]["id"], created[2]["id"], "missing"]
+
+        found = self.model.find_by_ids(ids)
+        self.assertEqual(set(found), {created[0]["id"], created[2]["id"]})
+        self.assertEqual(found[created[2]["id"]]["value"], 2)
+        streaming = CSVModel(TestModel, self.csv_file, cache=False)
+        self.assertEqual(streaming.find_by_ids(ids), found)
+
+    def test_33_bulk_mutations(self):
+        """Prueba las altas, modificaciones y bajas en bloque con una sola escritura."""
+        writes = []
+        original = self.model._replace_file
+        self.model._replace_file = lambda records: writes.append(1) or original(records)
+
+        created = self.model.create_many([{"name": f"Row {i}", "value": i} for i in range(6)])
+        self.assertEqual(len(created), 6)
+        self.assertEqual(self._data_rows(), 6)
+
+        updated = self.model.update_many(lambda r: r["value"] % 2 == 0, {"name": "Even"})
+        self.assertEqual([r["value"] for r in updated], [0, 2, 4])
+        self.assertEqual(len(self.model.find_by_field("name", "Even")), 3)
+        deleted = self.model.delete_many([created[0]["id"], created[1]["id"], "missing"])
+        self.assertEqual(deleted, 2)
+        self.assertEqual(writes, [1, 1])
+
+        reloaded = CSVModel(TestModel, self.csv_file)
+        self.assertEqual([r["value"] for r in reloaded.find_all()], [2, 3, 4, 5])
+        self.assertEqual(self.model.delete_many(lambda r: False), 0)
+
+    def test_34_bulk_unique_violation_is_atomic(self):
+        """Prueba que un lote que viola una restricción única no aplica ningún cambio."""
+        model = CSVModel(UniqueTestModel, self.csv_file, unique=["name"])
+        first = model.create({"name": "a", "value": 1})
+        with self.assertRaises(UniqueConstraintError):
+            model.create_many([{"name": "b", "value": 2}, {"name": "b", "value": 3}])
+        model.create({"name": "c", "value": 3})
+        with self.assertRaises(UniqueConstraintError):
+            model.update_many(lambda r: True, {"name": "a"})
+
+        self.assertEqual([r["name"] for r in model.find_all()], ["a", "c"])
+        self.assertEqual(model.create({"name": "b", "value": 2})["name"], "b")
+        self.assertEqual(model.find_one_by_field("name", "a")["id"], first["id"])
+
+    def test_35_binary_snapshot_cold_start(self):
+        """Prueba que una carga en frío usa la instantánea y solo parsea las filas nuevas."""
+        self.model.SNAPSHOT_MIN_ROWS = 1
+        created = self.model.create_many([{"name": f"R{i}", "value": i} for i in range(5)])
+        self.model.invalidate_cache()
+        self.model.find_all()
+        self.assertTrue(os.path.exists(self.full_path + ".snapshot"))
+        # La instantánea hereda los permisos del CSV, no los 0600 de mkstemp
+        mode = os.stat(self.full_path).st_mode
+        self.assertEqual(os.stat(self.full_path + ".snapshot").st_mode, mode)
+
+        # Alta desde otro proceso: el prefijo ya conocido no se vuelve a parsear
+        CSVModel(TestModel, self.csv_file).create({"name": "Tail", "value": 9})
+        cold = CSVModel(TestModel, self.csv_file)
+        parsed = []
+        decode = RowCodec._values
+        counting = mock.patch.object(
+            RowCodec,
+            "_values",
+            autospec=True,
+            side_effect=lambda codec, values: parsed.append(values) or decode(codec, values),
+        )
+        counting.start()
+        self.addCleanup(counting.stop)
+        self.assertEqual(cold.find_all()[:5], created)
+        self.assertEqual(cold.count(), 6)
+        self.assertEqual(len(parsed), 1)
+
+        # Un archivo reescrito ya no coincide con la instantánea y se parsea completo
+        self.model.update_by_id(created[0]["id"], {"name": "Changed"})
+        parsed.clear()
+        cold.invalidate_cache()
+        self.assertEqual(cold.find_by_id(created[0]["id"])["name"], "Changed")
+        self.assertEqual(len(parsed), 6)
+
+        # Con la tabla reescribiéndose, la instantánea solo se guarda cada SNAPSHOT_RELOADS
+        # cargas en lugar de en cada recarga
+        cold.SNAPSHOT_MIN_ROWS = 1
+        with mock.patch("db.ORMcsv.write_snapshot") as write:
+            for i in range(CSVModel.SNAPSHOT_RELOADS):
+                self.model.update_by_id(created[1]["id"], {"value": i})
+                cold.invalidate_cache()
+                cold.find_all()
+        self.assertEqual(write.call_count, 1)
+
+    def test_36_offset_index_random_access(self):
+        """Prueba que sin caché find_by_id y paginate solo parsean las filas pedidas."""
+        model = CSVModel(TestModel, self.csv_file, cache=False)
+        created = model.create_many([{"name": f"R{i}", "value": i} for i in range(20)])
+        parsed = []
+        original = model._parse_row
+        model._parse_row = lambda *row: parsed.append(row) or original(*row)
+        views = []
+        row_view = model._row_view
+        model._row_view = lambda: views.append(row_view()) or views[-1]
+
+        self.assertEqual(model.find_by_id(created[13]["id"]), created[13])
+        self.assertIsNone(model.find_by_id("missing"))
+        page = model.paginate(page=3, per_page=5)
+        self.assertEqual(page["data"], created[10:15])
+        self.assertEqual((page["total"], page["pages"]), (20, 4))
+        self.assertEqual(len(parsed), 6)
+        self.assertTrue(os.path.exists(self.full_path + ".offsets"))
+        mode = os.stat(self.full_path).st_mode
+        self.assertEqual(os.stat(self.full_path + ".offsets").st_mode, mode)
+        # Cada lectura cierra el mapeo del archivo al terminar
+        self.assertEqual(len(views), 3)
+        self.assertTrue(all(rows.data is None for rows in views))
+
+        # Las altas de otra instancia se leen sin reconstruir el índice; las reescrituras,
+        # reconstruyéndolo
+        tail = CSVModel(TestModel, self.csv_file).create({"name": "Tail", "value": 99})
+        self.assertEqual(model.find_by_id(tail["id"])["name"], "Tail")
+        model.update_by_id(created[0]["id"], {"name": "Changed"})
+        model.delete_by_id(created[1]["id"])
+        self.assertEqual(model.find_by_id(created[0]["id"])["name"], "Changed")
+        self.assertEqual(set(model.find_by_ids([created[1]["id"], tail["id"]])), {tail["id"]})
+        self.assertEqual(model.count(), 20)
+
+    def test_37_compiled_field_codecs(self):
+        """Prueba que cada columna se decodifica según el tipo de su campo."""
+        model = CSVModel(CodecTestModel, "test_codecs.csv")
+        self.addCleanup(remove_table, model.full_path)
+        created = model.create({"name": "[draft]", "value": None, "kind": "a", "tags": ["x"]})
+        model.invalidate_cache()
+        found = model.find_by_id(created["id"])
+        self.assertEqual(found, created)
+        self.assertIs(found["kind"], "a")
+
+        # Un valor no numérico en un entero opcional se lee como None
+        with open(model.full_path, "a", newline="", encoding="utf-8") as f:
+            f.write("broken,plain,oops,b,\n")
+        self.assertEqual(
+            CSVModel(CodecTestModel, "test_codecs.csv", cache=False).find_by_id("broken"),
+            {"id": "broken", "name": "plain", "value": None, "kind": "b", "tags": None},
+        )
+
+    def test_38_single_validation_and_typed_reads(self):
+        """Prueba que una instancia validada no se revalida y que typed devuelve modelos."""
+        validate = TestModel.model_validate
+        with mock.patch.object(TestModel, "model_validate", side_effect=validate) as calls:
+            created = self.model.create(TestModel(id="", name="Model", value=1))
+            self.model.create({"name": "Dict", "value": 2})
+            updated = self.model.update_by_id(created["id"], {"value": "3", "unknown": 1})
+        self.assertEqual(calls.call_count, 1)
+        self.assertEqual(updated, {"id": created["id"], "name": "Model", "value": 3})
+        with self.assertRaises(ValidationError):
+            self.model.update_by_id(created["id"], {"value": "not a number"})
+
+        typed = CSVModel(TestModel, self.csv_file, typed=True)
+        found = typed.find_by_id(created["id"])
+        self.assertIsInstance(found, TestModel)
+        self.assertEqual(found.value, 3)
+        names = [r.name for r in typed.find_where(lambda r: r["value"] > 1)]
+        self.assertEqual(names, ["Model", "Dict"])
+
+    def test_39_compact_cached_rows(self):
+        """Prueba que la caché guarda filas compactas con valores compartidos y devuelve dicts."""
+        model = CSVModel(TestModel, self.csv_file, categorical=["name"])
+        model.SNAPSHOT_MIN_ROWS = 1
+
+        def santiago() -> str:
+            # Una cadena nueva en cada llamada, como las que produce el parser del CSV
+            return "".join(["Sant", "iago"])
+
+        created = model.create_many([{"name": santiago(), "value": i} for i in range(3)])
+        model.create({"name": santiago(), "value": 3})
+        records = model._load()
+        self.assertFalse(hasattr(records[0], "__dict__"))
+        self.assertEqual(len({id(record["name"]) for record in records}), 1)
+
+        found = model.find_by_id(created[1]["id"])
+        self.assertIs(type(found), dict)
+        self.assertEqual(found, created[1])
+        found["name"] = "Changed"
+        self.assertEqual(model.find_by_id(created[1]["id"])["name"], "Santiago")
+
+        # Las filas cargadas de la instantánea comparten los valores con las leídas del CSV
+        model.invalidate_cache()
+        CSVModel(TestModel, self.csv_file).create({"name": santiago(), "value": 4})
+        cold = CSVModel(TestModel, self.csv_file, categorical=["name"])
+        self.assertEqual(len({id(record["name"]) for record in cold._load()}), 1)
+        self.assertEqual(cold.count(), 5)
+        # Tras compactar, las reservas no retienen los valores de registros borrados
+        gone = cold.create({"name": "Temporal", "value": 5})
+        cold.delete_by_id(gone["id"])
+        cold.compact()
+        self.assertEqual(set(cold._pools["name"]), {"Santiago"})
+        uncached = CSVModel(TestModel, self.csv_file, categorical=["name"], cache=False)
+        self.assertEqual(uncached._pools, {})
+
+    def test_40_columnar_matching(self):
+        """Prueba los filtros sobre la réplica por columnas, con y sin NumPy y sin caché."""
+        columns = {"name": "category", "kind": "category", "date": "date"}
+        model = CSVModel(ColumnarTestModel, "test_columnar.csv", columnar=columns)
+        self.addCleanup(remove_table, model.full_path)
+        created = model.create_many(
+            [
+                {"name": "a", "kind": "x", "date": "2026-01-10"},
+                {"name": "b", "kind": "y", "date": "2026-02-10"},
+                {"name": "a", "kind": "y", "date": None},
+                {"name": "c", "kind": "x", "date": "2026-03-10"},
+            ]
+        )
+        model.update_by_id(created[1]["id"], {"name": "a"})
+        model.delete_by_id(created[3]["id"])
+        query = [
+            [("name", "eq", "a"), ("date", "gte", "2026-01-01"), ("date", "lt", "2026-02-11")],
+            [("kind", "in", ["y"]), ("name", "ne", "a")],
+        ]
+        expected = [created[0]["id"], created[1]["id"]]
+        uncached = CSVModel(ColumnarTestModel, "test_columnar.csv", cache=False, columnar=columns)
+
+        def check():
+            self.assertEqual([r["id"] for r in model.find_matching(query)], expected)
+            self.assertEqual([r["id"] for r in uncached.find_matching(query)], expected)
+            page = model.paginate_matching([[("kind", "nin", ["x"])]], page=2, per_page=1)
+            self.assertEqual([r["id"] for r in page["data"]], [created[2]["id"]])
+            self.assertEqual((page["total"], page["pages"]), (2, 2))
+            self.assertEqual(model.find_matching([[("name", "eq", "missing")]]), [])
+
+        check()
+        # Sin NumPy las mismas consultas recorren las columnas en Python
+        with mock.patch("db.columnar.numpy", None):
+            check()
+
+        with self.assertRaises(ValueError):
+            model.find_matching([[("kind", "gte", "x")]])
+        with self.assertRaises(ValueError):
+            model.find_matching([[("date", "gte", "no es una fecha")]])
+        with self.assertRaises(ValueError):
+            self.model.find_matching([[("name", "eq", "a")]])
+
+    def test_41_query_builder(self):
+        """Prueba las consultas componibles y el camino de acceso que elige cada una."""
+        columns = {"kind": "category", "date": "date"}
+        model = CSVModel(
+            ColumnarTestModel,
+            "test_columnar.csv",
+            indexes=["name"],
+            sorted_indexes={"date": ["date"]},
+            columnar=columns,
+        )
+        self.addCleanup(remove_table, model.full_path)
+        created = model.create_many(
+            [
+                {"name": "a", "kind": "x", "date": "2026-03-10"},
+                {"name": "b", "kind": "y", "date": "2026-01-10"},
+                {"name": "a", "kind": "y", "date": None},
+                {"name": "c", "kind": "x", "date": "2026-02-10"},
+            ]
+        )
+        ids = [record["id"] for record in created]
+        query = model.query()
+
+        def found(q):
+            return [record["id"] for record in q.all()]
+
+        by_id = query.where(id__in=[ids[3], ids[0], "missing"])
+        self.assertEqual(found(by_id), [ids[0], ids[3]])
+        self.assertEqual(by_id.explain()["path"], "primary_key")
+
+        by_name = query.where(name="a", kind="y")
+        self.assertEqual(found(by_name), [ids[2]])
+        plan = by_name.explain()
+        self.assertEqual((plan["path"], plan["index"]), ("hash_index", "name"))
+        self.assertEqual(plan["residual"], [["kind", "eq", "y"]])
+
+        by_columns = query.where(kind="x", date__ne="2026-02-10")
+        self.assertEqual(found(by_columns), [ids[0]])
+        self.assertEqual(by_columns.explain()["path"], "columnar")
+        self.assertEqual(by_columns.count(), 1)
+
+        # El orden del índice ordenado evita ordenar y permite cortar el recorrido
+        ordered = query.order_by("date").limit(2)
+        self.assertEqual(found(ordered), [ids[2], ids[1]])
+        plan = ordered.explain()
+        self.assertEqual((plan["path"], plan["order"]), ("sorted_index", "index"))
+        self.assertTrue(plan["early_stop"])
+
+        newest = query.where(name__ne="b").order_by("-date").offset(1)
+        self.assertEqual(found(newest), [ids[3], ids[2]])
+        self.assertEqual(newest.explain()["order"], "sort")
+
+        self.assertEqual(query.only("id", "name").first(), {"id": ids[0], "name": "a"})
+        page = query.where(name__in=["a", "c"]).paginate(page=2, per_page=2)
+        self.assertEqual(([r["id"] for r in page["data"]], page["total"]), ([ids[3]], 3))
+        # Sin caché todo se resuelve recorriendo el archivo, con los mismos resultados
+        uncached = CSVModel(ColumnarTestModel, "test_columnar.csv", cache=False)
+        self.assertEqual(found(uncached.query().where(kind="x", date__gte="2026-02-01")), ids[::3])
+        self.assertEqual(uncached.query().where(id=ids[1]).first()["name"], "b")
+        with self.assertRaises(ValueError):
+            query.where(name__like="a")
+
+    def test_42_sorted_range(self):
+        """Prueba los rangos por búsqueda binaria sobre un índice ordenado compuesto."""
+        model = CSVModel(
+            ColumnarTestModel,
+            "test_columnar.csv",
+            indexes=["kind"],
+            sorted_indexes={"date": ["date", "name"]},
+        )
+        self.addCleanup(remove_table, model.full_path)
+        rows = [("b", "2026-03-02"), ("a", "2026-03-02"), ("a", None), ("c", "2026-03-01")]
+        rows += [("d", "2026-03-05"), ("e", "2026-02-28")]
+        created = model.create_many([{"name": n, "kind": "x", "date": d} for n, d in rows])
+        ids = [record["id"] for record in created]
+        index = model._sorted_indexes["date"]
+        model._ensure_indexes()
+        # Los límites son prefijos de la clave; los registros sin fecha quedan fuera
+        march = index.ids_between(("2026-03-01",), ("2026-03-02",))
+        self.assertEqual(list(march), [ids[3], ids[1], ids[0]])
+        after_a = index.ids_between(("2026-03-02", "a"), None, include_low=False)
+        self.assertEqual(list(after_a), [ids[0], ids[4]])
+        self.assertEqual(index.span(None, ("2026-03-01",), include_high=False), (1, 2))
+
+        query = model.query().where(date__gte="2026-03-01", date__lt="2026-03-05")
+        ordered = query.order_by("date", "name")
+        self.assertEqual([r["id"] for r in ordered.all()], [ids[3], ids[1], ids[0]])
+        plan = ordered.explain()
+        self.assertEqual((plan["path"], plan["order"]), ("sorted_range", "index"))
+        self.assertEqual(plan["candidates"], 3)
+        self.assertEqual(ordered.offset(1).count(), 3)
+        # Sin ese orden, el rango devuelve los registros en orden de archivo
+        self.assertEqual([r["id"] for r in query.all()], [ids[0], ids[1], ids[3]])
+        after = model.query().where(date__gt="2026-03-02")
+        self.assertEqual([r["id"] for r in after.all()], [ids[4]])
+        visible = ordered.filter(lambda record: record["name"] != "a").limit(1)
+        self.assertEqual([r["id"] for r in visible.all()], [ids[3]])
+        self.assertEqual(visible.paginate(page=2, per_page=1)["total"], 2)
+        model.update_by_id(ids[1], {"date": "2026-03-06"})
+        self.assertEqual([r["name"] for r in ordered.all()], ["c", "b"])
+
+        # El recorrido del índice lee por tramos y no retiene el cerrojo entre registros
+        model.WALK_CHUNK = 2
+        walked = []
+        for record in model._sorted_walk(index):
+            walked.append(record["name"])
+            model.update_by_id(record["id"], {"kind": "y"})
+        self.assertEqual(walked, ["a", "e", "c", "b", "d", "a"])
+
+    def test_43_query_views_and_cursor(self):
+        """Prueba vistas, paginación por clave y valores normalizados en las consultas."""
+        views = {"kind": lambda record: record.get("kind")}
+        model = CSVModel(
+            ColumnarTestModel,
+            "test_columnar.csv",
+            indexes=["name"],
+            sorted_indexes={"date": ["date"]},
+            views=views,
+        )
+        self.addCleanup(remove_table, model.full_path)
+        rows = [("5", "x", "2026-03-02"), ("a", "y", "2026-03-01"), ("b", "x", "2026-03-01")]
+        rows += [("c", "x", "2026-03-03")]
+        created = model.create_many([{"name": n, "kind": k, "date": d} for n, k, d in rows])
+        ids = [record["id"] for record in created]
+        query = model.query().in_view("kind", ["x"])
+
+        page = query.paginate(page=2, per_page=2)
+        self.assertEqual(([r["id"] for r in page["data"]], page["total"]), ([ids[3]], 3))
+        self.assertEqual(query.explain()["path"], "view")
+        # Con un índice más selectivo la vista se comprueba sobre sus candidatos
+        plan = query.where(name="b").explain()
+        self.assertEqual((plan["path"], plan["views"]), ("hash_index", ["kind"]))
+        self.assertEqual(query.where(name__in=["a", "b"]).count(), 1)
+
+        first, cursor = query.after("date").page_after(2)
+        self.assertEqual([r["id"] for r in first], [ids[2], ids[0]])
+        rest, cursor = query.after("date", cursor).page_after(2)
+        self.assertEqual(([r["id"] for r in rest], cursor), ([ids[3]], None))
+        with self.assertRaises(ValueError):
+            query.after("date", "basura")
+
+        # Un rango de fechas acota el recorrido desde el cursor: no se leen claves posteriores
+        walked = []
+        sorted_walk = model._sorted_walk
+        model._sorted_walk = lambda *args: (walked.append(r) or r for r in sorted_walk(*args))
+        bounded = model.query().where(date__lte="2026-03-01").after("date")
+        first, cursor = bounded.page_after(1)
+        rest, cursor = bounded.after("date", cursor).page_after(1)
+        self.assertCountEqual([r["id"] for r in first + rest], [ids[1], ids[2]])
+        self.assertIsNone(cursor)
+        self.assertEqual({r["date"] for r in walked}, {"2026-03-01"})
+        self.assertTrue(bounded.explain()["bounded"])
+
+        # Los valores se comparan como quedarían guardados, por cualquier camino
+        uncached = CSVModel(ColumnarTestModel, "test_columnar.csv", cache=False, views=views)
+        for q in (model.query(), uncached.query()):
+            self.assertEqual([r["id"] for r in q.where(name=5).all()], [ids[0]])
+            self.assertEqual([r["id"] for r in q.where(name__in=[5, "c"]).all()], ids[::3])
+        self.assertEqual(uncached.query().in_view("kind", ["y"]).first()["id"], ids[1])
+
+    def test_44_recovery(self):
+        """Prueba que la recuperación no reescribe el CSV y limpia los temporales huérfanos."""
+        journal_path = self.full_path + ".journal"
+        created = self.model.create({"name": "Applied", "value": 1})
+        # Diario con operaciones que ya llegaron al CSV antes de la caída
+        entries = [
+            {"op": "put", "row": {"id": created["id"], "name": "Applied", "value": "1"}},
+            {"op": "delete", "id": "missing"},
+        ]
+        with open(journal_path, "w", encoding="utf-8") as f:
+            f.writelines(json.dumps(entry) + "\n" for entry in entries)
+        directory = os.path.dirname(self.full_path)
+        stale = os.path.join(directory, f".{self.csv_file}.abc_1234.tmp")
+        other = os.path.join(directory, f".{self.csv_file}.offsets.abc_1234.tmp")
+        for path in (stale, other):
+            with open(path, "w") as f:
+                f.write("id\n")
+        before = os.stat(self.full_path)
+
+        CSVModel._recovered_tables.discard(self.full_path)
+        model = CSVModel(TestModel, self.csv_file, journal=True)
+        self.assertEqual(os.stat(self.full_path).st_ino, before.st_ino)
+        self.assertEqual(os.path.getsize(journal_path), 0)
+        self.assertEqual(model.find_by_id(created["id"])["name"], "Applied")
+        self.assertFalse(os.path.exists(stale))
+        self.assertTrue(os.path.exists(other))
+
+    def test_45_uncached_writes_stream(self):
+        """Prueba que sin caché las escrituras recorren el archivo sin cargar la tabla."""
+
+        def no_full_read():
+            raise AssertionError("la escritura cargó la tabla completa")
+
+        for storage in ["table", "log"]:
+            with self.subTest(storage=storage):
+                remove_table(self.full_path)
+                CSVModel._recovered_tables.discard(self.full_path)
+                CSVModel(UniqueTestModel, self.csv_file, storage=storage)
+                model = CSVModel(
+                    UniqueTestModel, self.csv_file, cache=False, storage=storage, unique=["name"]
+                )
+                self.assertEqual(model._log_format, storage == "log")
+                self.assertIsNone(model._records)
+                model._read_records = no_full_read
+                first, second = model.create_many(
+                    [{"name": "A", "value": 1}, {"name": None, "value": 2}]
+                )
+                with self.assertRaises(UniqueConstraintError):
+                    model.create({"name": "A", "value": 3})
+                with self.assertRaises(UniqueConstraintError):
+                    model.create_many([{"name": "B", "value": 3}, {"name": "B", "value": 4}])
+                with self.assertRaises(UniqueConstraintError):
+                    model.update_by_id(second["id"], {"name": "A"})
+                # Conservar el propio valor no es un duplicado
+                self.assertEqual(model.update_by_id(first["id"], {"value": 5})["name"], "A")
+                self.assertEqual(model.update_many(lambda r: r["value"] == 2, {"value": 6}), [
+                    {**second, "value": 6}
+                ])
+                self.assertTrue(model.delete_by_id(first["id"]))
+                self.assertFalse(model.delete_by_id(first["id"]))
+                model.create({"name": "A", "value": 7})
+
+                cached = CSVModel(UniqueTestModel, self.csv_file, storage=storage)
+                found = sorted((r["name"] or "", r["value"]) for r in cached.find_all())
+                self.assertEqual(found, [("", 6), ("A", 7)])
+
+
+    def test_46_deleted_rows_are_reclaimed(self):
+        """Prueba que la vista y la réplica por columnas descartan las bajas acumuladas."""
+        views = {"parity": lambda r: r["value"] % 2}
+        model = CSVModel(TestModel, self.csv_file, views=views, columnar={"value": "category"})
+        created = model.create_many([{"name": f"R{i}", "value": i} for i in range(100)])
+        self.assertEqual(model.query().in_view("parity", [1]).count(), 50)
+        view, columnar = model._views["parity"], model._columnar
+
+        # Por debajo del umbral las bajas conservan su posición
+        model.delete_many([r["id"] for r in created[:10]])
+        self.assertEqual((len(view._sequence), len(columnar._ids)), (100, 100))
+
+        # Al superar a los vivos se descartan, sin alterar el orden de los demás
+        model.delete_many([r["id"] for r in created[10:70]])
+        model.update_by_id(created[75]["id"], {"value": 76})
+        self.assertEqual((len(view._sequence), len(columnar._ids)), (30, 30))
+        odd = [r["value"] for r in model.query().in_view("parity", [1]).all()]
+        self.assertEqual(odd, [v for v in range(71, 100, 2) if v != 75])
+        even = [r["name"] for r in model.find_matching([[("value", "eq", 76)]])]
+        self.assertEqual(even, ["R75", "R76"])
+        self.assertEqual(model.create({"name": "New", "value": 1})["name"], "New")
+        self.assertEqual(model.query().in_view("parity", [1]).all()[-1]["name"], "New")
+
 
 class TestORMManager(unittest.TestCase):
     def setUp(self):
         self.orm = ORMManager()
+        self.addCleanup(remove_table, os.path.join(self.orm.data_dir, "test.csv"))
+        commit_lock = os.path.join(self.orm.data_dir, COMMIT_LOCK)
+        self.addCleanup(lambda: os.path.exists(commit_lock) and os.remove(commit_lock))
 
     def test_register_and_get_model(self):
         """Prueba el registro y obtención de un modelo."""
@@ -126,11 +1059,105 @@ class TestORMManager(unittest.TestCase):
         model_instance = self.orm.get_model("test")
         self.assertIsInstance(model_instance, CSVModel)
 
+    def test_register_model_with_indexes(self):
+        """Prueba que los índices declarados llegan al modelo registrado."""
+        self.orm.register_model("indexed", TestModel, "test.csv", indexes=["name"])
+        model_instance = self.orm.get_model("indexed")
+        self.assertEqual(list(model_instance._indexes), ["name"])
+
+    def test_storage_defaults_to_table(self):
+        """Prueba que el formato log solo se usa si se pide con ORM_STORAGE o al registrar."""
+        self.orm.register_model("test", TestModel, "test.csv")
+        self.assertEqual(self.orm.get_model("test").storage, "table")
+        with mock.patch.dict(os.environ, {"ORM_STORAGE": "log"}):
+            orm_manager = ORMManager()
+        orm_manager.register_model("test", TestModel, "test.csv")
+        self.assertEqual(orm_manager.get_model("test").storage, "log")
+
     def test_get_unregistered_model(self):
         """Prueba que obtener un modelo no registrado lanza un error."""
         with self.assertRaises(ValueError):
             self.orm.get_model("unregistered")
 
 
+    def test_join(self):
+        """Prueba que join resuelve los registros relacionados de otro modelo."""
+        self.orm.register_model("parent", TestModel, "test_join.csv")
+        parent_model = self.orm.get_model("parent")
+        self.addCleanup(remove_table, parent_model.full_path)
+        parent = parent_model.create({"name": "Parent", "value": 1})
+        children = [{"id": "a", "parent_id": parent["id"]}, {"id": "b", "parent_id": "missing"}]
+
+        pairs = self.orm.join(children, "parent_id", "parent")
+        self.assertEqual([(c["id"], p["name"]) for c, p in pairs], [("a", "Parent")])
+        pairs = self.orm.join(children, "parent_id", "parent", inner=False)
+        self.assertEqual([p and p["name"] for _, p in pairs], ["Parent", None])
+
+
+    def _transaction_models(self):
+        """Registra dos modelos sobre archivos vacíos para las pruebas de transacciones."""
+        for name in ["parent", "child"]:
+            path = os.path.join(self.orm.data_dir, f"test_tx_{name}.csv")
+            if os.path.exists(path):
+                os.remove(path)
+            self.orm.register_model(name, TestModel, f"test_tx_{name}.csv")
+            self.addCleanup(remove_table, path)
+        return self.orm.get_model("parent"), self.orm.get_model("child")
+
+    def test_transaction_commits_all_models(self):
+        """Prueba que una transacción escribe cada archivo una sola vez al confirmar."""
+        parent, child = self._transaction_models()
+        kept = parent.create({"name": "Kept", "value": 0})
+        replaced = []
+        for model in (parent, child):
+            original = model._replace_file
+            model._replace_file = lambda records, o=original: replaced.append(1) or o(records)
+
+        with self.orm.transaction("parent", "child"):
+            created = parent.create({"name": "Parent", "value": 1})
+            child.create_many([{"name": "Child", "value": i} for i in range(3)])
+            child.update_many(lambda r: True, {"name": "Updated"})
+            parent.delete_by_id(kept["id"])
+            # Dentro de la transacción se ven los cambios propios
+            self.assertEqual(parent.find_by_id(created["id"])["name"], "Parent")
+            self.assertEqual(CSVModel(TestModel, "test_tx_parent.csv").count(), 1)
+
+        self.assertEqual(replaced, [])
+        self.assertEqual(CSVModel(TestModel, "test_tx_parent.csv").find_all(), [created])
+        names = [r["name"] for r in CSVModel(TestModel, "test_tx_child.csv").find_all()]
+        self.assertEqual(names, ["Updated"] * 3)
+        self.assertFalse(os.path.exists(os.path.join(self.orm.data_dir, COMMIT_MARKER)))
+
+    def test_transaction_rolls_back_on_error(self):
+        """Prueba que un error dentro de la transacción no deja cambios."""
+        parent, child = self._transaction_models()
+        parent.create({"name": "Before", "value": 0})
+
+        with self.assertRaises(RuntimeError):
+            with self.orm.transaction():
+                parent.create({"name": "Lost", "value": 1})
+                child.create({"name": "Lost", "value": 1})
+                raise RuntimeError("fallo a mitad")
+
+        self.assertEqual([r["name"] for r in parent.find_all()], ["Before"])
+        self.assertEqual(child.find_all(), [])
+
+    def test_recover_committed_transaction(self):
+        """Prueba que al arrancar se completa una transacción con marcador de confirmación."""
+        parent, _ = self._transaction_models()
+        parent.create({"name": "Old", "value": 0})
+        staged = parent._stage_file([{"id": "1", "name": "New", "value": 1}], ".txn")
+        # Archivo preparado por una transacción que no llegó a confirmarse
+        orphan = CSVModel(TestModel, "test_tx_child.csv")._stage_file([], ".txn")
+        marker = os.path.join(self.orm.data_dir, COMMIT_MARKER)
+        with open(marker, "w", encoding="utf-8") as f:
+            json.dump({"files": [[staged, parent.full_path]]}, f)
+
+        self.assertEqual(recover_transactions(self.orm.data_dir), 1)
+        self.assertFalse(os.path.exists(marker))
+        self.assertFalse(os.path.exists(orphan))
+        self.assertEqual([r["name"] for r in parent.find_all()], ["New"])
+
+
 if __name__ == "__main__":
     unittest.main()
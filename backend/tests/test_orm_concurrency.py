@@ -0,0 +1,134 @@
+import unittest
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import BaseModel
+from db.ORMcsv import CSVModel, table_files
+from db.locks import ReadWriteLock
+
+
+# Modelo Pydantic de prueba
+class CounterModel(BaseModel):
+    id: str
+    owner: str
+    value: int
+
+
+class TestReadWriteLock(unittest.TestCase):
+    def test_readers_run_in_parallel(self):
+        """Prueba que varios lectores pueden tener el cerrojo a la vez."""
+        lock = ReadWriteLock()
+        inside = []
+        barrier = threading.Barrier(3, timeout=5)
+
+        def reader():
+            with lock.read():
+                inside.append(1)
+                barrier.wait()
+
+        threads = [threading.Thread(target=reader) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertEqual(len(inside), 3)
+
+    def test_writer_excludes_readers(self):
+        """Prueba que un escritor no convive con lectores."""
+        lock = ReadWriteLock()
+        events = []
+        lock.acquire_write()
+
+        def reader():
+            with lock.read():
+                events.append("read")
+
+        thread = threading.Thread(target=reader)
+        thread.start()
+        time.sleep(0.05)
+        events.append("write-done")
+        lock.release_write()
+        thread.join(timeout=5)
+        self.assertEqual(events, ["write-done", "read"])
+
+    def test_reentrancy(self):
+        """Prueba las lecturas anidadas y la lectura dentro de una escritura."""
+        lock = ReadWriteLock()
+        with lock.write():
+            with lock.write():
+                with lock.read():
+                    pass
+        with lock.read():
+            with lock.read():
+                pass
+            with self.assertRaises(RuntimeError):
+                lock.acquire_write()
+        with lock.write():
+            pass
+
+
+class TestCSVModelThreads(unittest.TestCase):
+    def setUp(self):
+        """Configura un archivo CSV limpio para cada prueba."""
+        self.db_dir = "db/data"
+        self.csv_file = "test_concurrency.csv"
+        self.full_path = os.path.join(self.db_dir, self.csv_file)
+        os.makedirs(self.db_dir, exist_ok=True)
+        if os.path.exists(self.full_path):
+            os.remove(self.full_path)
+
+    def tearDown(self):
+        """Elimina el archivo CSV de prueba y sus archivos auxiliares."""
+        for path in table_files(self.full_path):
+            os.remove(path)
+
+    def _hammer(self, storage: str):
+        model = CSVModel(CounterModel, self.csv_file, indexes=["owner"], storage=storage)
+        seeded = [model.create({"owner": f"w{i % 4}", "value": 0}) for i in range(16)]
+        # Cada propietario elimina dos de sus cuatro registros iniciales
+        victims = {record["id"] for i, record in enumerate(seeded) if (i // 4) % 2 == 0}
+
+        def worker(n: int):
+            owner = f"w{n}"
+            mine = [r for r in seeded if r["owner"] == owner]
+            created = []
+            for round_ in range(1, 11):
+                for record in mine:
+                    if record["id"] not in victims:
+                        model.update_by_id(record["id"], {"value": round_})
+                created.append(model.create({"owner": owner, "value": -round_})["id"])
+                model.find_by_field("owner", owner)
+                model.find_all()
+            for record in mine:
+                if record["id"] in victims:
+                    self.assertTrue(model.delete_by_id(record["id"]))
+            return created
+
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            created = [rid for ids in pool.map(worker, range(4)) for rid in ids]
+
+        for reader in (model, CSVModel(CounterModel, self.csv_file)):
+            self.assertEqual(reader.count(), 8 + len(created))
+            for record in seeded:
+                found = reader.find_by_id(record["id"])
+                if record["id"] in victims:
+                    self.assertIsNone(found)
+                else:
+                    self.assertEqual(found["value"], 10)
+            for record_id in created:
+                self.assertIsNotNone(reader.find_by_id(record_id))
+            for n in range(4):
+                self.assertEqual(len(reader.find_by_field("owner", f"w{n}")), 2 + 10)
+
+    def test_concurrent_writes_table_storage(self):
+        """Prueba que no se pierden escrituras concurrentes en modo tabla."""
+        self._hammer("table")
+
+    def test_concurrent_writes_log_storage(self):
+        """Prueba que no se pierden escrituras concurrentes en modo log."""
+        self._hammer("log")
+
+
+if __name__ == "__main__":
+    unittest.main()
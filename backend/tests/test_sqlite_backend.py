@@ -0,0 +1,219 @@
+import unittest
+import os
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from db.ORMcsv import CSVModel, ORMManager, UniqueConstraintError, table_files
+from db.sqlite_backend import SQLiteModel, _column_type
+
+
+# Modelo Pydantic de prueba
+class TestModel(BaseModel):
+    id: str
+    name: Optional[str] = Field(default=None, json_schema_extra={"unique": True})
+    value: int
+    active: bool = True
+    tags: List[str] = []
+
+
+def remove_table(full_path: str):
+    """Elimina un CSV de prueba con todos sus archivos auxiliares."""
+    for path in table_files(full_path):
+        os.remove(path)
+
+
+class TestSQLiteModel(unittest.TestCase):
+    def setUp(self):
+        """Configura una base de datos de prueba vacía antes de cada test."""
+        self.database = "db/data/test_sqlite.db"
+        self._remove_database()
+        self.model = SQLiteModel(
+            TestModel,
+            "test_sqlite.csv",
+            database=self.database,
+            indexes=["value"],
+            sorted_indexes={"value": ["value"]},
+            text_indexes={"name": {"name": 1}},
+            substring_indexes=[["name"]],
+        )
+
+    def tearDown(self):
+        """Cierra la conexión y elimina la base de datos de prueba."""
+        self._remove_database()
+
+    def _remove_database(self):
+        local = SQLiteModel._connections.pop(self.database, None)
+        if local is not None and getattr(local, "connection", None) is not None:
+            local.connection.close()
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists(self.database + suffix):
+                os.remove(self.database + suffix)
+
+    def test_01_crud(self):
+        """Prueba crear, buscar, actualizar y eliminar con la misma API que CSVModel."""
+        created = self.model.create({"name": "One", "value": 1, "tags": ["a", "b"]})
+        self.assertEqual(self.model.find_by_id(created["id"]), created)
+        self.assertEqual(self.model.find_all(), [created])
+
+        updated = self.model.update_by_id(created["id"], {"value": 2, "active": False})
+        self.assertEqual(updated["value"], 2)
+        found = self.model.find_by_id(created["id"])
+        self.assertIs(found["active"], False)
+        self.assertEqual(found["tags"], ["a", "b"])
+
+        self.assertTrue(self.model.delete_by_id(created["id"]))
+        self.assertFalse(self.model.delete_by_id(created["id"]))
+        self.assertIsNone(self.model.update_by_id(created["id"], {"value": 3}))
+        self.assertEqual(self.model.count(), 0)
+
+    def test_02_find_by_field_and_paginate(self):
+        """Prueba las búsquedas por campo, incluido None, y la paginación en orden de alta."""
+        records = self.model.create_many(
+            [{"name": f"Item {i}", "value": i % 2} for i in range(5)]
+            + [{"name": None, "value": 9}]
+        )
+        self.assertEqual(len(self.model.find_by_field("value", 0)), 3)
+        self.assertEqual(self.model.find_one_by_field("name", None)["value"], 9)
+        self.assertIsNone(self.model.find_one_by_field("name", "missing"))
+
+        page = self.model.paginate(page=2, per_page=4)
+        self.assertEqual(page["data"], records[4:])
+        self.assertEqual((page["total"], page["pages"]), (6, 2))
+        self.assertEqual(self.model.find_where(lambda r: r["value"] == 1, limit=1), [records[1]])
+
+    def test_03_unique_constraint(self):
+        """Prueba que los campos marcados como únicos rechazan duplicados sin escribir nada."""
+        first = self.model.create({"name": "Same", "value": 1})
+        with self.assertRaises(UniqueConstraintError) as ctx:
+            self.model.create_many([{"name": "Other", "value": 2}, {"name": "Same", "value": 3}])
+        self.assertEqual(ctx.exception.field, "name")
+        self.assertEqual(self.model.find_all(), [first])
+
+        second = self.model.create({"name": "Second", "value": 2})
+        with self.assertRaises(UniqueConstraintError):
+            self.model.update_by_id(second["id"], {"name": "Same"})
+        self.assertEqual(self.model.find_by_id(second["id"])["name"], "Second")
+
+    def test_04_derived_indexes(self):
+        """Prueba la paginación por clave y las búsquedas de texto sobre la tabla."""
+        records = self.model.create_many(
+            [{"name": f"Concierto {i}", "value": 3 - i} for i in range(3)]
+        )
+        self.model.create({"name": "Teatro", "value": 10})
+
+        first, cursor = self.model.find_after("value", limit=2)
+        self.assertEqual([r["value"] for r in first], [1, 2])
+        rest, cursor = self.model.find_after("value", cursor, limit=2)
+        self.assertEqual([r["value"] for r in rest], [3, 10])
+        self.assertIsNone(cursor)
+
+        self.model.update_by_id(records[0]["id"], {"name": "Feria"})
+        self.assertEqual(self.model.search("name", "concierto")["total"], 2)
+        found = self.model.find_containing(["name"], "ERIA")
+        self.assertEqual([r["id"] for r in found["data"]], [records[0]["id"]])
+
+        # Un cambio hecho por otra instancia reconstruye los índices derivados
+        SQLiteModel(TestModel, "test_sqlite.csv", database=self.database).create(
+            {"name": "Concierto nuevo", "value": 0}
+        )
+        self.assertEqual(self.model.search("name", "concierto")["total"], 3)
+
+    def test_05_import_existing_csv(self):
+        """Prueba que una tabla nueva importa los registros del CSV equivalente."""
+        csv_model = CSVModel(TestModel, "test_sqlite_import.csv")
+        self.addCleanup(remove_table, csv_model.full_path)
+        created = csv_model.create({"name": "From CSV", "value": 7})
+        model = SQLiteModel(TestModel, "test_sqlite_import.csv", database=self.database)
+        self.assertEqual(model.find_by_id(created["id"])["name"], "From CSV")
+
+    def test_06_columnar_matching(self):
+        """Prueba los filtros por columnas sobre la tabla, en orden de inserción."""
+        model = SQLiteModel(
+            TestModel, "test_sqlite.csv", database=self.database, columnar={"value": "category"}
+        )
+        records = model.create_many([{"name": f"N{i}", "value": i % 3} for i in range(6)])
+        model.update_by_id(records[0]["id"], {"value": 1})
+        found = model.find_matching([[("value", "eq", 1)]])
+        self.assertEqual([r["name"] for r in found], ["N0", "N1", "N4"])
+        page = model.paginate_matching([[("value", "in", [1, 2])]], page=2, per_page=3)
+        self.assertEqual([r["name"] for r in page["data"]], ["N4", "N5"])
+        self.assertEqual(page["total"], 5)
+
+    def test_07_query_builder(self):
+        """Prueba que las consultas componibles se compilan a SQL con la semántica de Python."""
+        records = self.model.create_many(
+            [{"name": f"N{i}", "value": i % 3, "tags": ["t"] if i % 2 else []} for i in range(6)]
+        )
+        self.model.create({"name": None, "value": 9})
+        query = self.model.query()
+        newest = query.where(value__in=[1, 2], name__ne="N5").order_by("-value", "name")
+        self.assertEqual([r["name"] for r in newest.limit(3).all()], ["N2", "N1", "N4"])
+        self.assertEqual(newest.count(), 3)
+        plan = newest.limit(3).explain()
+        self.assertEqual((plan["path"], plan["order"], plan["residual"]), ("sql", "sql", []))
+        self.assertIn("LIMIT", plan["sql"])
+        self.assertTrue(any("idx_" in step for step in plan["steps"]))
+        # Los vacíos cumplen ne y nin como en Python; los campos JSON se filtran en Python
+        self.assertEqual(len(query.where(name__nin=["N0"]).all()), 6)
+        self.assertEqual(query.where(name=None).first()["value"], 9)
+        tagged = query.where(tags=["t"], value__gte=1)
+        self.assertEqual([r["id"] for r in tagged.all()], [records[1]["id"], records[5]["id"]])
+        self.assertEqual(tagged.explain()["residual"], [["tags", "eq", ["t"]]])
+
+    def test_08_sorted_index_in_sql(self):
+        """Prueba que los índices ordenados se crean en SQLite y sirven rangos ordenados."""
+        self.model.create_many([{"name": f"N{i}", "value": i} for i in range(5)])
+        in_range = self.model.query().where(value__gte=1, value__lt=4).order_by("value")
+        self.assertEqual([r["name"] for r in in_range.all()], ["N1", "N2", "N3"])
+        steps = in_range.explain()["steps"]
+        self.assertTrue(any("sorted_test_sqlite_value" in step for step in steps))
+
+    def test_09_column_types_from_union_syntax(self):
+        """Prueba que X | None se resuelve al mismo tipo de columna que Optional[X]."""
+        self.assertEqual(_column_type(int | None), _column_type(Optional[int]))
+        self.assertEqual(_column_type(int | None), "INTEGER")
+        self.assertEqual(_column_type(bool | None), "BOOLEAN")
+        self.assertEqual(_column_type(list[str] | None), "JSON")
+        self.assertEqual(_column_type(int | str), "TEXT")
+
+
+class TestSQLiteBackend(unittest.TestCase):
+    def setUp(self):
+        self.orm = ORMManager()
+        self.orm.database = "db/data/test_sqlite_orm.db"
+        self.addCleanup(self._remove_database)
+        for name in ["parent", "child"]:
+            self.orm.register_model(name, TestModel, f"test_tx_{name}.csv", backend="sqlite")
+
+    def _remove_database(self):
+        local = SQLiteModel._connections.pop(self.orm.database, None)
+        if local is not None and getattr(local, "connection", None) is not None:
+            local.connection.close()
+        for suffix in ["", "-wal", "-shm"]:
+            if os.path.exists(self.orm.database + suffix):
+                os.remove(self.orm.database + suffix)
+
+    def test_register_sqlite_backend(self):
+        """Prueba que register_model elige el motor pedido."""
+        self.assertIsInstance(self.orm.get_model("parent"), SQLiteModel)
+        with self.assertRaises(ValueError):
+            self.orm.register_model("other", TestModel, "test.csv", backend="mongo")
+
+    def test_transaction_commits_and_rolls_back(self):
+        """Prueba que las transacciones del ORM confirman o deshacen varias tablas juntas."""
+        parent, child = self.orm.get_model("parent"), self.orm.get_model("child")
+        with self.orm.transaction("parent", "child"):
+            created = parent.create({"name": "Parent", "value": 1})
+            child.create({"name": "Child", "value": 1})
+        self.assertEqual(parent.find_all(), [created])
+
+        with self.assertRaises(RuntimeError):
+            with self.orm.transaction("parent", "child"):
+                parent.delete_by_id(created["id"])
+                child.create({"name": "Lost", "value": 2})
+                raise RuntimeError("fallo a mitad")
+        self.assertEqual(parent.find_all(), [created])
+        self.assertEqual([r["name"] for r in child.find_all()], ["Child"])
+
+
+if __name__ == "__main__":
+    unittest.main()
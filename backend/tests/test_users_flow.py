@@ -1,7 +1,7 @@
 import unittest
 import json
 from factory import create_app
-from db.ORMcsv import orm
+from db.ORMcsv import orm, table_files
 from libs.helpers import ResponseType
 import os
 
@@ -33,8 +33,8 @@ class UsersFlowTest(unittest.TestCase):
         self.user_headers = {"Authorization": f"Bearer {self.user_token}"}
 
     def tearDown(self):
-        if os.path.exists(self.user_model.full_path):
-            os.remove(self.user_model.full_path)
+        for path in table_files(self.user_model.full_path):
+            os.remove(path)
 
     def test_01_get_all_users_as_admin(self):
         """Prueba que un admin puede obtener la lista de todos los usuarios."""